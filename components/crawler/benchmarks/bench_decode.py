@@ -0,0 +1,70 @@
+"""
+Microbenchmark of the per-record CPU cost of the callbacks chain.
+
+Compares the legacy path, where each of the CLI's default callbacks and the crawler
+decode the response with `Response.json()`, with a single `ResponseContext` decode.
+
+Usage:
+    python benchmarks/bench_decode.py [n_records]
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+from httpx import Response
+
+from crawler.callbacks.stopping import (
+    FailurePatienceStopper,
+    PublicationTimeRangeStopper,
+    TooManyRequestStopper,
+)
+from crawler.core import BaseCrawler
+from crawler.responses import ResponseContext, orjson
+
+
+PAYLOAD = Path(__file__).parents[1] / "tests" / "resources" / "payload_crawl.json"
+
+
+def build_responses(n_records: int) -> List[Response]:
+    payload = json.loads(PAYLOAD.read_text())
+    return [
+        Response(200, json={"video": {**payload["video"], "video_id": f"{i}1"}})
+        for i in range(n_records)
+    ]
+
+
+def legacy(responses: List[Response]) -> None:
+    callbacks = [TooManyRequestStopper(), FailurePatienceStopper(), PublicationTimeRangeStopper()]
+    for response in responses:
+        for callback in callbacks:
+            callback.after_response(response)
+        BaseCrawler.process(response.json()["video"], resource=BaseCrawler.VIDEO_BY_ID_RESOURCE)
+
+
+def decoded_once(responses: List[Response]) -> None:
+    callbacks = [TooManyRequestStopper(), FailurePatienceStopper(), PublicationTimeRangeStopper()]
+    for response in responses:
+        context = ResponseContext(response)
+        for callback in callbacks:
+            callback.on_response(context)
+        BaseCrawler.process(context.payload["video"], resource=BaseCrawler.VIDEO_BY_ID_RESOURCE)
+
+
+def measure(func: Callable[[List[Response]], None], n_records: int) -> float:
+    responses = build_responses(n_records)
+    start = time.process_time()
+    func(responses)
+    return (time.process_time() - start) / n_records * 1e6
+
+
+if __name__ == "__main__":
+    n_records = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    legacy_us = measure(legacy, n_records)
+    decoded_once_us = measure(decoded_once, n_records)
+    print(f"json backend:  {'orjson' if orjson else 'json'}")
+    print(f"legacy:        {legacy_us:8.2f} us/record")
+    print(f"decoded once:  {decoded_once_us:8.2f} us/record")
+    print(f"saved:         {legacy_us - decoded_once_us:8.2f} us/record")
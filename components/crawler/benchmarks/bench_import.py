@@ -0,0 +1,156 @@
+"""
+Start-up cost of the CLI commands: the `-X importtime` breakdown of a run of every command,
+by top-level package, and the wall time of the whole process.
+
+Every run is a fresh interpreter running the command to completion against an in-process
+mock of the api and thumbnails CDN built from the test fixtures, so the imports the command
+performs lazily are counted too. The exit code is 1 if any command imports for longer than
+`--budget-ms`.
+
+Usage:
+    python benchmarks/bench_import.py [--commands get,crawl] [--repeat 5] [--top 8]
+        [--budget-ms 400]
+"""
+
+import sys
+
+RESOURCES = "tests/resources"
+
+# Arguments of every measured command, "{tmp}" being a temporary directory
+COMMANDS = {
+    "help": ["--help"],
+    "get": ["get", "103576261"],
+    "search": ["search", "-n", "1"],
+    "crawl": ["crawl", "-o", "103576261", "-n", "3", "--no-progress"],
+    "crawl-parquet": [
+        "crawl",
+        "-o",
+        "103576261",
+        "-n",
+        "3",
+        "--no-progress",
+        "--output",
+        "{tmp}/videos.parquet",
+    ],
+    "crawl-async": ["crawl-async", "-o", "103576261", "-n", "3", "--no-progress"],
+    "crawl-enrich": [
+        "crawl-enrich",
+        "-o",
+        "103576261",
+        "-n",
+        "3",
+        "--no-progress",
+        "--thumbnails",
+        "{tmp}/t",
+    ],
+}
+
+
+def run_command(name: str) -> None:
+    """Run the command `name` against the mock api, in this interpreter"""
+    import json
+    import tempfile
+    from pathlib import Path
+
+    import httpx
+
+    from crawler.transport import HostPools
+
+    resources = Path(__file__).parents[1] / RESOURCES
+    video = json.loads((resources / "payload_crawl.json").read_bytes())["video"]
+    search = json.loads((resources / "payload_search.json").read_bytes())
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.host != "api.xyz.com":
+            return httpx.Response(200, content=b"\xff\xd8" * 1024)
+        params = request.url.params
+        if params.get("data") == "xyz.Videos.searchVideos":
+            return httpx.Response(200, json=search)
+        return httpx.Response(200, json={"video": {**video, "video_id": params["video_id"]}})
+
+    mock = httpx.MockTransport(handler)
+    HostPools.pool = lambda self, url: mock  # type: ignore[method-assign]
+    HostPools.apool = lambda self, url: mock  # type: ignore[method-assign]
+
+    from crawler.cli import app
+
+    with tempfile.TemporaryDirectory() as tmp:
+        args = [arg.replace("{tmp}", tmp) for arg in COMMANDS[name]]
+        try:
+            app(args, standalone_mode=False)
+        except SystemExit:
+            pass
+
+
+if __name__ == "__main__" and sys.argv[1:2] == ["--run"]:
+    # Child process: nothing else is imported before the command
+    run_command(sys.argv[2])
+    sys.exit(0)
+
+
+import argparse
+import os
+import subprocess
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+
+def parse_importtime(stderr: str) -> Counter:
+    """Microseconds spent importing every top-level package, from `-X importtime` lines"""
+    packages: Counter = Counter()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        if self_us.strip().isdigit():
+            packages[name.strip().split(".")[0]] += int(self_us)
+    return packages
+
+
+def measure(name: str) -> Tuple[Counter, float]:
+    """Import times by package and wall seconds of a run of the command `name`"""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(["src", os.environ.get("PYTHONPATH", "")])}
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", __file__, "--run", name],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    elapsed = time.perf_counter() - start
+    if process.returncode:
+        raise RuntimeError(f"{name} failed:\n{process.stderr[-2000:]}")
+    return parse_importtime(process.stderr), elapsed
+
+
+def report(name: str, runs: List[Tuple[Counter, float]], top: int) -> Dict[str, float]:
+    """Print the breakdown of the fastest run of `name`, returning its totals in ms"""
+    packages, elapsed = min(runs, key=lambda run: sum(run[0].values()))
+    total = sum(packages.values()) / 1000
+    print(f"{name:<14} imports {total:7.1f}ms  wall {elapsed * 1000:7.1f}ms")
+    for package, us in packages.most_common(top):
+        print(f"{'':<16}{package:<24} {us / 1000:7.1f}ms")
+    return {"imports_ms": total, "wall_ms": elapsed * 1000}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--commands", default=",".join(COMMANDS))
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per command, the best kept.")
+    parser.add_argument("--top", type=int, default=8, help="Packages listed per command.")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Maximum import time.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    over_budget = []
+    for name in args.commands.split(","):
+        totals = report(name, [measure(name) for _ in range(args.repeat)], args.top)
+        if args.budget_ms is not None and totals["imports_ms"] > args.budget_ms:
+            over_budget.append(f"{name}: {totals['imports_ms']:.1f}ms > {args.budget_ms}ms")
+    for message in over_budget:
+        print(f"OVER BUDGET {message}")
+    sys.exit(1 if over_budget else 0)
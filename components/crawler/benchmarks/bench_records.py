@@ -0,0 +1,39 @@
+"""
+Memory held per record, as dicts built by `BaseCrawler.process` or as `VideoRecord`s.
+
+Usage:
+    python benchmarks/bench_records.py [n_records]
+"""
+
+import json
+import sys
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict
+
+from crawler.core import BaseCrawler
+
+
+PAYLOAD = Path(__file__).parents[1] / "tests" / "resources" / "payload_crawl.json"
+RESOURCE = BaseCrawler.VIDEO_BY_ID_RESOURCE
+
+
+def measure(decode: Callable[[Dict], Any], n_records: int) -> float:
+    content = PAYLOAD.read_bytes()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    # Every record is decoded from its own payload, as when crawled
+    records = [decode(json.loads(content)["video"]) for _ in range(n_records)]
+    held = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    del records
+    return held / n_records
+
+
+if __name__ == "__main__":
+    n_records = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    dict_bytes = measure(lambda video: BaseCrawler.process(video, RESOURCE), n_records)
+    record_bytes = measure(lambda video: BaseCrawler.decode(video, RESOURCE), n_records)
+    print(f"dict:         {dict_bytes:8.0f} bytes/record")
+    print(f"VideoRecord:  {record_bytes:8.0f} bytes/record")
+    print(f"saved:        {1 - record_bytes / dict_bytes:8.1%}")
@@ -0,0 +1,237 @@
+"""
+Throughput of `Crawler`, `AsyncCrawler` and `aThumbnailsContent` against the local mock api,
+at a sweep of concurrencies: records/s, p50/p99 latency, peak RSS and CPU time per record.
+
+Every run has its own process, so peak RSS and CPU time are its own, and the mock api runs
+in another one. Results are written to a JSON file, and compared to a baseline file if given:
+the exit code is 1 if any run regressed by more than the tolerance.
+
+Usage:
+    python benchmarks/bench_throughput.py [--concurrency 1,10,50,100] [--n-videos 2000]
+        [--latency 0.02] [--missing 0.3] [--rate-limit 500] [--error-rate 0.01]
+        [--output results.json] [--baseline baseline.json] [--tolerance 0.1]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import httpx
+
+from mock_api import MockApiConfig, MockApiServer
+
+
+TARGETS = ("crawler", "async", "thumbnails")
+
+# Metrics compared to the baseline, and whether higher is better
+COMPARED = {"records_per_s": True, "p99_ms": False, "cpu_ms_per_record": False}
+
+
+class TimingTransport(httpx.HTTPTransport):
+    """HTTP transport recording the seconds until the response headers of every request"""
+
+    def __init__(self, latencies: List[float], **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.latencies = latencies
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        response = super().handle_request(request)
+        self.latencies.append(time.perf_counter() - start)
+        return response
+
+
+class AsyncTimingTransport(httpx.AsyncHTTPTransport):
+    """Asynchronous `TimingTransport`"""
+
+    def __init__(self, latencies: List[float], **kwargs: Any) -> None:
+        super().__init__(**kwargs)
+        self.latencies = latencies
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        response = await super().handle_async_request(request)
+        self.latencies.append(time.perf_counter() - start)
+        return response
+
+
+def prepare(
+    target: str, concurrency: int, n_videos: int, url: str, latencies: List[float]
+) -> Callable[[], int]:
+    """Crawl of `target` from the mock api at `url`, returning its number of records"""
+    from crawler.core import AsyncCrawler, Crawler
+    from crawler.thumbnails import aThumbnailsContent
+    from crawler.videos import VideoId, VideoIdAscendingGenerator
+
+    id_generator = VideoIdAscendingGenerator(seed=VideoId.from_numerical(1), limit=n_videos)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    if target == "crawler":
+        crawler = Crawler(typed=True, progress=False)
+        crawler.client = httpx.Client(
+            base_url=url, params=crawler.params, transport=TimingTransport(latencies)
+        )
+        return lambda: sum(1 for _ in crawler.iter_crawl(id_generator))
+
+    if target == "async":
+        crawler = AsyncCrawler(max_concurrency=concurrency, typed=True)
+        crawler.aclient = httpx.AsyncClient(
+            base_url=url,
+            params=crawler.params,
+            transport=AsyncTimingTransport(latencies, limits=limits),
+        )
+
+        async def count() -> int:
+            return sum([1 async for _ in crawler.iter_crawl(id_generator)])
+
+        return lambda: asyncio.run(count())
+
+    thumbnails = aThumbnailsContent(max_concurrency=concurrency, progress=False)
+    thumbnails.aclient = httpx.AsyncClient(transport=AsyncTimingTransport(latencies, limits=limits))
+    urls = [f"{url}/thumbs/{video_id}-0.jpg" for video_id in id_generator]
+    return lambda: len(thumbnails.download(urls))
+
+
+def run(target: str, concurrency: int, n_videos: int, url: str, results: Any) -> None:
+    """Measure a run, in its own process"""
+    latencies: List[float] = []
+    # Imports and setup are not measured
+    crawl = prepare(target, concurrency, n_videos, url, latencies)
+    start, start_cpu = time.perf_counter(), time.process_time()
+    n_records = crawl()
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - start_cpu
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else [0.0] * 99
+    results.put(
+        {
+            "target": target,
+            "concurrency": concurrency,
+            "records": n_records,
+            "requests": len(latencies),
+            "seconds": elapsed,
+            "records_per_s": n_records / elapsed,
+            "requests_per_s": len(latencies) / elapsed,
+            "p50_ms": quantiles[49] * 1000,
+            "p99_ms": quantiles[98] * 1000,
+            "cpu_s": cpu,
+            "cpu_ms_per_record": 1000 * cpu / max(n_records, 1),
+            # Kilobytes on Linux
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
+    )
+
+
+def sweep(
+    targets: List[str], concurrencies: List[int], n_videos: int, url: str
+) -> Dict[str, Dict[str, Any]]:
+    context = multiprocessing.get_context("spawn")
+    results: Dict[str, Dict[str, Any]] = {}
+    for target in targets:
+        # The sync crawler sends one request at a time
+        for concurrency in [1] if target == "crawler" else concurrencies:
+            queue = context.Queue()
+            process = context.Process(target=run, args=(target, concurrency, n_videos, url, queue))
+            process.start()
+            result = queue.get()
+            process.join()
+            results[f"{target}@{concurrency}"] = result
+            print(
+                f"{target:>10} @ {concurrency:<4} {result['records_per_s']:9.1f} records/s  "
+                f"p50 {result['p50_ms']:7.1f}ms  p99 {result['p99_ms']:7.1f}ms  "
+                f"cpu {result['cpu_ms_per_record']:6.3f}ms/record  "
+                f"rss {result['peak_rss_mb']:6.1f}MB"
+            )
+    return results
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float
+) -> List[str]:
+    """Regressions of `results` from `baseline` beyond `tolerance`, as messages"""
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old, new = baseline[key][metric], result[metric]
+            if not old:
+                continue
+            change = new / old - 1
+            worse = -change if higher_is_better else change
+            print(f"{key:>16} {metric:<18} {old:10.3f} -> {new:10.3f} ({change:+.1%})")
+            if worse > tolerance:
+                regressions.append(f"{key} {metric}: {old:.3f} -> {new:.3f} ({change:+.1%})")
+    return regressions
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--targets", default=",".join(TARGETS))
+    parser.add_argument("--concurrency", default="1,10,50,100")
+    parser.add_argument("--n-videos", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.02, help="Median latency in s.")
+    parser.add_argument("--latency-sigma", type=float, default=0.5)
+    parser.add_argument("--missing", type=float, default=0.3, help="Share of code 2002.")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Requests/s before 1005.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of 503.")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    config = MockApiConfig(
+        latency=args.latency,
+        latency_sigma=args.latency_sigma,
+        missing=args.missing,
+        rate_limit=args.rate_limit,
+        error_rate=args.error_rate,
+    )
+    with MockApiServer(config) as server:
+        results = sweep(
+            args.targets.split(","),
+            [int(c) for c in args.concurrency.split(",")],
+            args.n_videos,
+            server.url,
+        )
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "n_videos": args.n_videos,
+            "api": asdict(config),
+        },
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(report, indent=2))
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline["meta"]["api"] != report["meta"]["api"]:
+            print("Warning: the baseline was measured against another mock api configuration")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
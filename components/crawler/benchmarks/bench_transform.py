@@ -0,0 +1,64 @@
+"""
+Throughput of the record transformation into Arrow.
+
+Compares `BaseCrawler.process` once per record, followed by `RecordBatch.from_pylist`,
+with the batched `process_batch`, on payloads built from the crawl fixture.
+
+Usage:
+    python benchmarks/bench_transform.py [n_records] [batch_size]
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import pyarrow as pa
+
+from crawler.batch import process_batch
+from crawler.core import BaseCrawler
+from crawler.sinks import RECORD_SCHEMA
+
+
+PAYLOAD = Path(__file__).parents[1] / "tests" / "resources" / "payload_crawl.json"
+RESOURCE = BaseCrawler.VIDEO_BY_ID_RESOURCE
+
+
+def build_videos(n_records: int) -> List[Dict]:
+    video = json.loads(PAYLOAD.read_text())["video"]
+    return [
+        {
+            **video,
+            "video_id": f"{i}1",
+            "publish_date": f"2024-01-{i % 28 + 1:02d} 12:{i % 60:02d}:00",
+        }
+        for i in range(n_records)
+    ]
+
+
+def per_record(videos: List[Dict]) -> None:
+    records = [BaseCrawler.process(video, RESOURCE) for video in videos]
+    pa.RecordBatch.from_pylist(records, schema=RECORD_SCHEMA)
+
+
+def batched(videos: List[Dict]) -> None:
+    process_batch(videos, RESOURCE)
+
+
+def measure(func: Callable[[List[Dict]], None], n_records: int, batch_size: int) -> float:
+    videos = build_videos(n_records)
+    start = time.process_time()
+    for offset in range(0, n_records, batch_size):
+        func(videos[offset : offset + batch_size])
+    return n_records / (time.process_time() - start)
+
+
+if __name__ == "__main__":
+    n_records = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 10_000
+    per_record_rps = measure(per_record, n_records, batch_size)
+    batched_rps = measure(batched, n_records, batch_size)
+    print(f"per record:  {per_record_rps:12,.0f} records/s")
+    print(f"batched:     {batched_rps:12,.0f} records/s")
+    print(f"speedup:     {batched_rps / per_record_rps:12.1f}x")
@@ -0,0 +1,213 @@
+"""
+Local stand-in of `api.xyz.com` and of its thumbnails CDN, built from the test fixtures.
+
+Videos are the `payload_crawl.json` video under other ids, search pages repeat the videos of
+`payload_search.json`, thumbnails are `thumb_size` bytes. Latency, missing ids (code 2002),
+rate limiting (code 1005) and failures (503) are injected as configured, reproducibly:
+whether an id exists only depends on the id.
+
+Usage:
+    python benchmarks/mock_api.py [port]  # serves until interrupted
+
+    >>> server = MockApiServer(MockApiConfig(latency=0.05, missing=0.5)).start()
+    >>> crawler.aclient = httpx.AsyncClient(base_url=server.url, params=crawler.params)
+    >>> server.stop()
+"""
+
+import asyncio
+import copy
+import json
+import math
+import multiprocessing
+import random
+import sys
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlsplit
+
+
+RESOURCES = Path(__file__).parents[1] / "tests" / "resources"
+
+VIDEO_BY_ID_RESOURCE = "xyz.Videos.getVideoById"
+SEARCH_RESOURCE = "xyz.Videos.searchVideos"
+
+NOT_FOUND = json.dumps({"code": 2002, "message": "Video not found"}).encode()
+TOO_MANY_REQUESTS = json.dumps({"code": 1005, "message": "Too many requests"}).encode()
+NO_VIDEOS = json.dumps({"code": 2001, "message": "No videos found!"}).encode()
+
+
+@dataclass
+class MockApiConfig:
+    """
+    Behaviour of the mock api.
+
+    Args:
+        latency: Median seconds before answering a request (default = 0.02)
+        latency_sigma: Spread of the log-normal latency, 0 for a fixed latency (default = 0.5)
+        missing: Share of the ids answered "video not found", code 2002 (default = 0.3)
+        rate_limit: Requests per second answered before code 1005, None for no limit
+        error_rate: Share of the api requests failing with a 503 (default = 0)
+        thumb_size: Bytes of every thumbnail (default = 8192)
+        search_results: Number of videos found by a search (default = 1000)
+        page_size: Videos per search page (default = 20)
+        seed: Seed of the latency and failures (default = 0)
+    """
+
+    latency: float = 0.02
+    latency_sigma: float = 0.5
+    missing: float = 0.3
+    rate_limit: Optional[float] = None
+    error_rate: float = 0.0
+    thumb_size: int = 8192
+    search_results: int = 1000
+    page_size: int = 20
+    seed: int = 0
+
+
+class MockApi:
+    """Request handling of the mock api, as an asyncio server"""
+
+    def __init__(self, config: MockApiConfig) -> None:
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.video = json.loads((RESOURCES / "payload_crawl.json").read_bytes())["video"]
+        self.search_videos = json.loads((RESOURCES / "payload_search.json").read_bytes())["videos"]
+        self.thumbnail = bytes(self.random.getrandbits(8) for _ in range(config.thumb_size))
+        self.tokens = config.rate_limit or 0.0
+        self.updated_at = time.monotonic()
+        self.origin = ""
+
+    def exists(self, video_id: str) -> bool:
+        return zlib.crc32(video_id.encode()) % 10_000 >= self.config.missing * 10_000
+
+    def latency(self) -> float:
+        if self.config.latency_sigma <= 0:
+            return self.config.latency
+        return self.random.lognormvariate(math.log(self.config.latency), self.config.latency_sigma)
+
+    def rate_limited(self) -> bool:
+        rate = self.config.rate_limit
+        if not rate:
+            return False
+        now = time.monotonic()
+        self.tokens = min(rate, self.tokens + (now - self.updated_at) * rate)
+        self.updated_at = now
+        if self.tokens < 1:
+            return True
+        self.tokens -= 1
+        return False
+
+    def video_payload(self, video_id: str) -> Dict[str, Any]:
+        video = copy.deepcopy(self.video)
+        video["video_id"] = video_id
+        video["url"] = f"https://www.xyz.com/{video_id}"
+        for index, thumb in enumerate(video["thumbs"]):
+            thumb["src"] = f"{self.origin}/thumbs/{video_id}-{index}.jpg"
+        return video
+
+    def search_page(self, page: int) -> bytes:
+        first = (page - 1) * self.config.page_size
+        last = min(page * self.config.page_size, self.config.search_results)
+        if first >= last:
+            return NO_VIDEOS
+        videos = []
+        for number in range(first, last):
+            template = self.search_videos[number % len(self.search_videos)]
+            video = {**template["video"], "video_id": str(number + 1)}
+            videos.append({"video": video})
+        return json.dumps({"videos": videos}).encode()
+
+    async def respond(self, target: str) -> Tuple[int, str, bytes]:
+        """`(status, content type, body)` answering the GET of `target`"""
+        await asyncio.sleep(self.latency())
+        url = urlsplit(target)
+        if url.path.startswith("/thumbs/"):
+            return 200, "image/jpeg", self.thumbnail
+        if self.config.error_rate and self.random.random() < self.config.error_rate:
+            return 503, "text/plain", b"Service unavailable"
+        if self.rate_limited():
+            return 200, "application/json", TOO_MANY_REQUESTS
+
+        params = dict(parse_qsl(url.query))
+        if params.get("data") == SEARCH_RESOURCE:
+            return 200, "application/json", self.search_page(int(params.get("page", 1)))
+        video_id = params.get("video_id", "")
+        if not self.exists(video_id):
+            return 200, "application/json", NOT_FOUND
+        payload = {"video": self.video_payload(video_id)}
+        return 200, "application/json", json.dumps(payload).encode()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Serve the requests of a keep-alive HTTP/1.1 connection"""
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                _, target, _ = head.split(b"\r\n", 1)[0].decode().split(" ", 2)
+                status, content_type, body = await self.respond(target)
+                writer.write(
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                    f"Content-Type: {content_type}\r\n"
+                    f"Content-Length: {len(body)}\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, port: int = 0, ready: Any = None) -> None:
+        server = await asyncio.start_server(self.handle, "127.0.0.1", port, backlog=1024)
+        port = server.sockets[0].getsockname()[1]
+        self.origin = f"http://127.0.0.1:{port}"
+        if ready is not None:
+            ready.put(port)
+        async with server:
+            await server.serve_forever()
+
+
+def serve(config: MockApiConfig, port: int = 0, ready: Any = None) -> None:
+    try:
+        asyncio.run(MockApi(config).serve(port, ready))
+    except KeyboardInterrupt:
+        pass
+
+
+class MockApiServer:
+    """
+    The mock api, served by its own process so it does not compete with the measured crawler.
+
+    Args:
+        config: Behaviour of the mock api (default = MockApiConfig())
+    """
+
+    def __init__(self, config: Optional[MockApiConfig] = None) -> None:
+        self.config = config or MockApiConfig()
+        self.context = multiprocessing.get_context("spawn")
+        self.process: Any = None
+        self.url = ""
+
+    def start(self) -> "MockApiServer":
+        ready = self.context.Queue()
+        self.process = self.context.Process(target=serve, args=(self.config, 0, ready), daemon=True)
+        self.process.start()
+        self.url = f"http://127.0.0.1:{ready.get(timeout=30)}"
+        return self
+
+    def stop(self) -> None:
+        if self.process is not None:
+            self.process.terminate()
+            self.process.join()
+
+    def __enter__(self) -> "MockApiServer":
+        return self.start()
+
+    def __exit__(self, *args: Any) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    serve(MockApiConfig(), port=int(sys.argv[1]) if len(sys.argv) > 1 else 8000)
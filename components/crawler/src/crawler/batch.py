@@ -0,0 +1,154 @@
+from typing import Any, Callable, Dict, List, Sequence
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from crawler.core import BaseCrawler
+from crawler.records import RECORD_SCHEMA, RecordValidationError, parse_datetime
+
+
+# Publish dates as sent by the api, eg. "2024-01-01 12:00:00", formatted without parsing
+NAIVE_DATETIME_PATTERN = r"^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}$"
+
+
+def process_batch(
+    videos: Sequence[Dict[str, Any]], resource: str, schema: pa.Schema = RECORD_SCHEMA
+) -> pa.RecordBatch:
+    """
+    Batch counterpart of `BaseCrawler.process`: transform raw `video` payloads into columns.
+
+    Columns are built with pyarrow compute kernels rather than per record: publish dates are
+    validated and formatted in one pass, tags normalized over the flattened list of all tags.
+    Values the kernels cannot reproduce exactly, such as dates with an offset or non-ascii
+    tags, fall back to the per-record logic, so the output always matches `process`.
+    The crawlers do not use it, as they process records one at a time while responses
+    stream in: it is meant for callers holding many raw payloads at once.
+
+    Args:
+        videos: `video` payloads of the `resource` api
+        resource: Either `BaseCrawler.SEARCH_RESOURCE` or `BaseCrawler.VIDEO_BY_ID_RESOURCE`
+        schema: Arrow schema of the records (default = RECORD_SCHEMA)
+
+    Example:
+        >>> resource = BaseCrawler.VIDEO_BY_ID_RESOURCE
+        >>> batch = process_batch([payload["video"]], resource)
+        >>> batch.to_pylist() == [BaseCrawler.process(payload["video"], resource)]
+        True
+    """
+    published_on, published_at = publish_dates([video["publish_date"] for video in videos])
+    columns = {
+        "id": strings([video["video_id"] for video in videos]),
+        "published_on": published_on,
+        "published_at": published_at,
+        "title": strings([video["title"] for video in videos]),
+        "duration": pa.array([video["duration"] for video in videos], pa.string()),
+        "views": integers([video["views"] for video in videos], "views"),
+        "rating": floats([video["rating"] for video in videos], "rating"),
+        "ratings": integers([video["ratings"] for video in videos], "ratings"),
+        "thumbs": list_field([video["thumbs"] for video in videos], "src"),
+        "tags": tags([video["tags"] for video in videos], resource),
+        "url": strings([video["url"] for video in videos]),
+    }
+    return pa.RecordBatch.from_arrays([columns[name] for name in schema.names], schema=schema)
+
+
+def publish_dates(values: List[Any]) -> List[pa.Array]:
+    """`published_on` and `published_at` columns, as formatted by pendulum in UTC"""
+    dates = strings(values)
+    naive = pc.fill_null(pc.match_substring_regex(dates, NAIVE_DATETIME_PATTERN), False)
+    # Well formed but invalid dates, eg. "2024-02-30 12:00:00", are either not parsed or not
+    # formatted back as is, and are left to pendulum to reject
+    spaced = pc.replace_substring(dates, "T", " ")
+    parsed = pc.strptime(spaced, "%Y-%m-%d %H:%M:%S", "s", error_is_null=True)
+    valid = pc.equal(pc.strftime(parsed, "%Y-%m-%d %H:%M:%S"), spaced)
+    fast = pc.fill_null(pc.and_(naive, valid), False)
+
+    published_on = pc.utf8_slice_codeunits(dates, 0, 10)
+    published_at = pc.binary_join_element_wise(
+        published_on, pc.utf8_slice_codeunits(dates, 11, 19), "T"
+    )
+    published_at = pc.binary_join_element_wise(published_at, pa.scalar("Z"), "")
+    if pc.all(fast).as_py():
+        return [published_on, published_at]
+
+    on, at = published_on.to_pylist(), published_at.to_pylist()
+    for index, is_fast in enumerate(fast.to_pylist()):
+        if not is_fast:
+            try:
+                datetime = parse_datetime(values[index])
+            except ValueError as err:
+                raise RecordValidationError(
+                    "published_on", "publish_date", values[index], err
+                ) from err
+            on[index], at[index] = datetime.to_date_string(), datetime.to_iso8601_string()
+    return [pa.array(on, pa.string()), pa.array(at, pa.string())]
+
+
+def strings(values: List[Any]) -> pa.Array:
+    """String column, as `str(value)`"""
+    try:
+        return pa.array(values, pa.string())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([str(value) for value in values], pa.string())
+
+
+def integers(values: List[Any], name: str) -> pa.Array:
+    """int64 column `name`, as `int(value)`"""
+    return cast(values, pa.int64(), int, name)
+
+
+def floats(values: List[Any], name: str) -> pa.Array:
+    """float64 column `name`, as `float(value)`"""
+    return cast(values, pa.float64(), float, name)
+
+
+def cast(
+    values: List[Any], target: pa.DataType, convert: Callable[[Any], Any], name: str
+) -> pa.Array:
+    """Cast `values` with pyarrow when it agrees with `convert`, eg. numbers sent as strings"""
+    try:
+        array = pa.array(values)
+        if pa.types.is_string(array.type) and array.null_count == 0:
+            # Python also accepts surrounding whitespace and underscores, pyarrow does not
+            stripped = pc.utf8_trim_whitespace(array)
+            if pc.all(pc.equal(stripped, array)).as_py():
+                return pc.cast(array, target)
+        elif pa.types.is_integer(array.type) and array.null_count == 0:
+            return pc.cast(array, target)
+        elif pa.types.is_floating(array.type) and pc.all(pc.is_finite(array)).as_py():
+            # Truncated towards zero, as by `int`
+            return pc.cast(array, target, safe=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        pass
+    converted = []
+    for value in values:
+        try:
+            converted.append(convert(value))
+        except (TypeError, ValueError) as err:
+            raise RecordValidationError(name, name, value, err) from err
+    return pa.array(converted, target)
+
+
+def list_field(values: List[List[Dict[str, Any]]], name: str) -> pa.Array:
+    """list<string> column of the `name` field of lists of objects"""
+    lists = pa.array(values)
+    if not pa.types.is_list(lists.type) or pa.types.is_null(lists.type.value_type):
+        # No object at all: the lists are all empty
+        return pa.array(values, pa.list_(pa.string()))
+    return pa.ListArray.from_arrays(lists.offsets, pc.struct_field(lists.flatten(), name))
+
+
+def tags(values: List[List[Any]], resource: str) -> pa.Array:
+    """Tags column, normalized as `BaseCrawler.TAGS_PROCESSORS[resource]`"""
+    if resource == BaseCrawler.SEARCH_RESOURCE:
+        lists = list_field(values, "tag_name")
+    else:
+        lists = pa.array(values, pa.list_(pa.string()))
+    names = lists.flatten()
+
+    if pc.all(pc.string_is_ascii(names)).as_py() is not False:
+        normalized = pc.replace_substring(pc.ascii_lower(names), " ", "-")
+    else:
+        # Python lowercasing differs from utf8proc for a few characters
+        normalized = pa.array([name.lower().replace(" ", "-") for name in names.to_pylist()])
+    return pa.ListArray.from_arrays(lists.offsets, normalized)
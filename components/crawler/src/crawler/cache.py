@@ -0,0 +1,280 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+from urllib.parse import urlencode
+
+import httpx
+
+from crawler.responses import loads
+
+
+class ResponseCache:
+    """
+    On-disk cache of api responses, keyed by resource and query parameters.
+
+    Bodies are stored zlib-compressed under the SHA-256 of their content, so identical
+    responses, such as the many "video not found" ones, are stored once. A SQLite index maps
+    requests to bodies. Entries expire after the `ttl` of their resource, "video not found"
+    ones after `missing_ttl` at most, as the id may be published later. The least recently
+    used entries are evicted once the bodies take more than `max_size` bytes.
+
+    Args:
+        directory: Location of the cache, created if needed
+        max_size: Maximum size of the compressed bodies in bytes (default = 10GB)
+        ttl: Seconds entries of a resource stay fresh, eg. {"xyz.Videos.searchVideos": 3600}.
+            Resources not listed never expire (default = None).
+        missing_ttl: Seconds "video not found" (code 2002) entries stay fresh, None for ever
+            (default = 1 day)
+
+    Examples:
+        >>> cache = ResponseCache("cache/", ttl={Crawler.SEARCH_RESOURCE: 3600})
+        >>> crawler = Crawler(cache=cache)
+
+        >>> for params, content in cache.replay(Crawler.VIDEO_BY_ID_RESOURCE):
+        ...     print(params["video_id"])
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_size: int = 10 * 2**30,
+        ttl: Optional[Dict[str, float]] = None,
+        missing_ttl: Optional[float] = 24 * 3600,
+    ) -> None:
+        self.directory = Path(directory)
+        self.objects = self.directory / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self.ttl = ttl or {}
+        self.missing_ttl = missing_ttl
+        self.connection = sqlite3.connect(
+            str(self.directory / "index.sqlite"),
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, resource TEXT, "
+            "digest TEXT, status INTEGER, created_at REAL, accessed_at REAL, "
+            "missing INTEGER DEFAULT 0)"
+        )
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(entries)")]
+        if "missing" not in columns:
+            # Caches created before "video not found" entries expired
+            self.connection.execute("ALTER TABLE entries ADD COLUMN missing INTEGER DEFAULT 0")
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS bodies (digest TEXT PRIMARY KEY, size INTEGER)"
+        )
+        self.lock = threading.Lock()
+        self.size = self.connection.execute("SELECT TOTAL(size) FROM bodies").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(params: Dict[str, str]) -> str:
+        return urlencode(sorted(params.items()))
+
+    def path(self, digest: str) -> Path:
+        return self.objects / digest[:2] / f"{digest}.z"
+
+    def read(self, digest: str) -> bytes:
+        return zlib.decompress(self.path(digest).read_bytes())
+
+    def lookup(self, params: Dict[str, str]) -> Optional[Tuple[str, int]]:
+        """`(digest, status)` of the fresh cached response to `params`, None if none"""
+        row = self.connection.execute(
+            "SELECT resource, digest, status, created_at, missing FROM entries WHERE key = ?",
+            (self.key(params),),
+        ).fetchone()
+        if row is None:
+            return None
+        resource, digest, status, created_at, missing = row
+        ttls = [self.ttl.get(resource), self.missing_ttl if missing else None]
+        ttl = min((ttl for ttl in ttls if ttl is not None), default=None)
+        if ttl is not None and time.time() - created_at > ttl:
+            return None
+        return digest, status
+
+    def __contains__(self, params: Dict[str, str]) -> bool:
+        with self.lock:
+            return self.lookup(params) is not None
+
+    def get(self, params: Dict[str, str]) -> Optional[Tuple[int, bytes]]:
+        """`(status, content)` of the fresh cached response to `params`, None if none"""
+        with self.lock:
+            found = self.lookup(params)
+            if found is None:
+                self.misses += 1
+                return None
+            self.connection.execute(
+                "UPDATE entries SET accessed_at = ? WHERE key = ?", (time.time(), self.key(params))
+            )
+            self.hits += 1
+        try:
+            return found[1], self.read(found[0])
+        except FileNotFoundError:
+            # Evicted by another process meanwhile
+            return None
+
+    def store(self, params: Dict[str, str], status: int, content: bytes, payload: Any) -> None:
+        """Store the response to `params` if `cacheable`, from its decoded `payload`"""
+        if cacheable(status, payload):
+            missing = isinstance(payload, dict) and payload.get("code") == 2002
+            self.put(params, status, content, missing=missing)
+
+    def put(
+        self, params: Dict[str, str], status: int, content: bytes, missing: bool = False
+    ) -> None:
+        """
+        Store the response to `params`, then evict entries beyond `max_size`.
+        `missing` responses expire after `missing_ttl`.
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.path(digest)
+        with self.lock:
+            known = self.connection.execute(
+                "SELECT 1 FROM bodies WHERE digest = ?", (digest,)
+            ).fetchone()
+            if not known:
+                compressed = zlib.compress(content)
+                path.parent.mkdir(exist_ok=True)
+                tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+                tmp_path.write_bytes(compressed)
+                os.replace(tmp_path, path)
+                self.connection.execute(
+                    "INSERT OR IGNORE INTO bodies VALUES (?, ?)", (digest, len(compressed))
+                )
+                self.size += len(compressed)
+            now = time.time()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self.key(params), params.get("data"), digest, status, now, now, int(missing)),
+            )
+            if self.size > self.max_size:
+                self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries, and their orphaned bodies, below 90% of max_size"""
+        self.size = self.connection.execute("SELECT TOTAL(size) FROM bodies").fetchone()[0]
+        while self.size > 0.9 * self.max_size:
+            rows = self.connection.execute(
+                "SELECT key, digest FROM entries ORDER BY accessed_at LIMIT 256"
+            ).fetchall()
+            if not rows:
+                break
+            for key, digest in rows:
+                if self.size <= 0.9 * self.max_size:
+                    break
+                self.connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                if self.connection.execute(
+                    "SELECT 1 FROM entries WHERE digest = ?", (digest,)
+                ).fetchone():
+                    continue
+                size = self.connection.execute(
+                    "SELECT size FROM bodies WHERE digest = ?", (digest,)
+                ).fetchone()
+                self.connection.execute("DELETE FROM bodies WHERE digest = ?", (digest,))
+                self.path(digest).unlink(missing_ok=True)
+                self.size -= size[0] if size else 0
+
+    def replay(self, resource: str) -> Iterator[Tuple[Dict[str, str], bytes]]:
+        """
+        Every cached `(params, content)` of `resource`, in caching order, whatever their age.
+        Reads the disk only: use it to rebuild outputs without a single request.
+        """
+        rows = self.connection.execute(
+            "SELECT key, digest FROM entries WHERE resource = ? AND status = 200 ORDER BY rowid",
+            (resource,),
+        )
+        for key, digest in rows:
+            try:
+                content = self.read(digest)
+            except FileNotFoundError:
+                continue
+            yield dict(httpx.QueryParams(key)), content
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def cacheable(status: int, payload: Any) -> bool:
+    """Only successful responses are cached, not rate limited (code 1005) ones"""
+    return status == 200 and isinstance(payload, dict) and payload.get("code") != 1005
+
+
+class CachingTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    httpx transport answering from `cache` when it can, and caching the responses of
+    `transport` otherwise. Use it as the transport of both `Client` and `AsyncClient`.
+
+    Args:
+        cache: The response cache
+        transport: Transport sending requests on cache misses (default = HTTP transport)
+        store: Whether to cache the responses of `transport`. Crawlers store them themselves,
+            with the payload they decoded (default = True)
+    """
+
+    HEADERS = {"content-type": "application/json", "x-cache": "hit"}
+
+    def __init__(
+        self,
+        cache: ResponseCache,
+        transport: Optional[Union[httpx.BaseTransport, httpx.AsyncBaseTransport]] = None,
+        store: bool = True,
+    ) -> None:
+        self.cache = cache
+        self.transport = transport
+        self.store_responses = store
+
+    def cached(self, request: httpx.Request) -> Optional[httpx.Response]:
+        hit = self.cache.get(dict(request.url.params))
+        if hit is None:
+            return None
+        status, content = hit
+        return httpx.Response(status, headers=self.HEADERS, content=content, request=request)
+
+    def store(self, request: httpx.Request, response: httpx.Response) -> None:
+        if not self.store_responses:
+            return
+        try:
+            payload = loads(response.content)
+        except ValueError:
+            return
+        self.cache.store(dict(request.url.params), response.status_code, response.content, payload)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        response = self.cached(request)
+        if response is None:
+            self.transport = self.transport or httpx.HTTPTransport()
+            response = self.transport.handle_request(request)
+            response.read()
+            self.store(request, response)
+        return response
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        response = self.cached(request)
+        if response is None:
+            self.transport = self.transport or httpx.AsyncHTTPTransport()
+            response = await self.transport.handle_async_request(request)
+            await response.aread()
+            self.store(request, response)
+        return response
+
+    def close(self) -> None:
+        if self.transport:
+            self.transport.close()
+
+    async def aclose(self) -> None:
+        if self.transport:
+            await self.transport.aclose()
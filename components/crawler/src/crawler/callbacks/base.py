@@ -1,6 +1,18 @@
 from typing import Any
 from httpx import Response
 
+from crawler.responses import ResponseContext
+
 
 class CallBack:
+    # Whether responses must be seen in id order. On concurrent crawls, unordered callbacks
+    # are called as soon as a response completes, ordered ones once all prior ids are done.
+    ordered: bool = True
+    # Whether stopping the crawl must stop every shard of a sharded crawl, not only this one
+    shared: bool = False
+
+    def on_response(self, context: ResponseContext) -> Any:
+        """Called for every response. Defaults to `after_response` for backward compatibility."""
+        return self.after_response(context.response)
+
     def after_response(self, response: Response) -> Any: ...
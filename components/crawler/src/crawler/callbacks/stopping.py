@@ -5,6 +5,7 @@ from pendulum import DateTime
 import pendulum
 
 from crawler.callbacks.base import CallBack
+from crawler.responses import ResponseContext
 from crawler.utils import get_nested
 
 
@@ -24,9 +25,10 @@ class PublicationTimeRangeStopper(CallBack):
         self.end_datetime = end_datetime
 
     def after_response(self, response: Response) -> None:
-        payload = response.json()
+        self.on_response(ResponseContext(response, payload=response.json()))
 
-        datetime_string = get_nested(payload, ["video", "publish_date"])
+    def on_response(self, context: ResponseContext) -> None:
+        datetime_string = get_nested(context.payload, ["video", "publish_date"])
         if not datetime_string:
             return
 
@@ -44,8 +46,14 @@ class PublicationTimeRangeStopper(CallBack):
 
 
 class TooManyRequestStopper(CallBack):
+    ordered = False
+    shared = True
+
     def after_response(self, response: Response) -> Any:
-        payload = response.json()
+        return self.on_response(ResponseContext(response, payload=response.json()))
+
+    def on_response(self, context: ResponseContext) -> Any:
+        payload = context.payload
         if payload.get("code") == 1005:
             raise StopCrawlException(payload.get("message", "Too many requests."))
 
@@ -56,8 +64,10 @@ class FailurePatienceStopper(CallBack):
         self.consecutive_missing = 0
 
     def after_response(self, response: Response) -> None:
-        payload = response.json()
-        if payload.get("code"):
+        self.on_response(ResponseContext(response, payload=response.json()))
+
+    def on_response(self, context: ResponseContext) -> None:
+        if context.payload.get("code"):
             self.increment()
         else:
             self.reset()
@@ -0,0 +1,165 @@
+import sqlite3
+from typing import Any, Dict, List, Optional, Set
+
+from crawler.callbacks.base import CallBack
+from crawler.records import record_id
+from crawler.responses import ResponseContext
+from crawler.videos import (
+    VideoId,
+    VideoIdAscendingGenerator,
+    VideoIdDescendingGenerator,
+    VideoIdGenerator,
+)
+
+
+class CrawlJournal:
+    """
+    Crash-safe journal of a crawl over a `VideoIdAscendingGenerator`/`VideoIdDescendingGenerator`
+    range, stored in SQLite, to resume the crawl where it stopped.
+
+    It records the generator seed, direction and limit, and the completed positions in the
+    range, as a contiguous low watermark plus the few completed positions above it.
+    Marks are buffered in memory and written in a single transaction on `commit`.
+    Ids of videos are marked once the sink accepted their record, with `mark_record`, the
+    other ids as soon as they are crawled, with `CheckpointCallback`.
+
+    Args:
+        path: Location of the SQLite journal, created if needed
+        batch_size: Commit automatically every `batch_size` marks. If None, the owner of the
+            journal commits once the marked records are durably written (default = None).
+
+    Example:
+        >>> journal = CrawlJournal("crawl.sqlite")
+        >>> id_generator = journal.resume(VideoIdAscendingGenerator(VideoId("1231"), limit=1000))
+        >>> for video_id in id_generator:
+        ...     journal.mark(video_id)
+        >>> journal.commit()
+    """
+
+    def __init__(self, path: str, batch_size: Optional[int] = None) -> None:
+        self.path = path
+        self.batch_size = batch_size
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS crawl (seed TEXT, ascending INTEGER, "limit" INTEGER, '
+            "watermark INTEGER)"
+        )
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS completed (position INTEGER PRIMARY KEY)"
+        )
+        self.connection.commit()
+        self.seed: Optional[VideoId] = None
+        self.ascending = True
+        self.limit: Optional[int] = None
+        self.watermark = 0
+        self.completed: Set[int] = set()
+        self.pending: List[int] = []
+
+    def resume(self, generator: Optional[VideoIdAscendingGenerator] = None) -> "JournalGenerator":
+        """
+        Generator of the ids still outstanding in the journaled range.
+        If the journal is new, `generator` defines the range, otherwise the recorded range is used.
+        """
+        row = self.connection.execute(
+            'SELECT seed, ascending, "limit", watermark FROM crawl'
+        ).fetchone()
+        if row is None:
+            if generator is None:
+                raise ValueError(f"No crawl recorded in {self.path}, a generator is required.")
+            ascending = not isinstance(generator, VideoIdDescendingGenerator)
+            row = (str(generator.seed), int(ascending), generator.limit, 0)
+            self.connection.execute("INSERT INTO crawl VALUES (?, ?, ?, ?)", row)
+            self.connection.commit()
+
+        seed, ascending, self.limit, self.watermark = row
+        self.seed, self.ascending = VideoId(seed), bool(ascending)
+        self.completed = {
+            position for (position,) in self.connection.execute("SELECT position FROM completed")
+        }
+        return JournalGenerator(self)
+
+    def position(self, video_id: VideoId) -> int:
+        """Rank of `video_id` in the journaled range"""
+        assert self.seed is not None, "Journal must be resumed first."
+        if self.ascending:
+            return video_id.numerical_value - self.seed.numerical_value
+        return self.seed.numerical_value - video_id.numerical_value - 1
+
+    def mark(self, video_id: VideoId) -> None:
+        self.pending.append(self.position(video_id))
+        if self.batch_size and len(self.pending) >= self.batch_size:
+            self.commit()
+
+    def mark_record(self, record: Dict) -> None:
+        """Mark the id of `record`, eg. as an `on_write` callback of the sink"""
+        self.mark(VideoId(record_id(record)))
+
+    def commit(self) -> None:
+        if not self.pending:
+            return
+
+        self.completed.update(self.pending)
+        while self.watermark in self.completed:
+            self.completed.remove(self.watermark)
+            self.watermark += 1
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO completed VALUES (?)", ((p,) for p in self.pending)
+            )
+            self.connection.execute("DELETE FROM completed WHERE position < ?", (self.watermark,))
+            self.connection.execute("UPDATE crawl SET watermark = ?", (self.watermark,))
+        self.pending = []
+
+    def close(self) -> None:
+        self.commit()
+        self.connection.close()
+
+    def __enter__(self) -> "CrawlJournal":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class JournalGenerator(VideoIdGenerator):
+    """VideoIdGenerator over the ids of a journaled range that are not completed yet"""
+
+    def __init__(self, journal: CrawlJournal) -> None:
+        generator_class = (
+            VideoIdAscendingGenerator if journal.ascending else VideoIdDescendingGenerator
+        )
+        assert journal.seed is not None, "Journal must be resumed first."
+        self.generator = generator_class(seed=journal.seed, limit=journal.limit)
+        self.generator.count = journal.watermark
+        self.position = journal.watermark
+        self.completed = set(journal.completed)
+        self.limit = (
+            journal.limit - journal.watermark - len(journal.completed) if journal.limit else None
+        )
+
+    def __next__(self) -> VideoId:
+        while True:
+            video_id = next(self.generator)
+            self.position += 1
+            if self.position - 1 not in self.completed:
+                return video_id
+
+    def __len__(self):
+        return self.limit
+
+
+class CheckpointCallback(CallBack):
+    """
+    Mark every crawled id without a video in `journal`. Ids of videos are marked by the sink
+    once it accepted their record, so that an id whose record failed is crawled again.
+
+    Must be the last callback, so that ids stopping the crawl are not marked.
+    """
+
+    def __init__(self, journal: CrawlJournal) -> None:
+        self.journal = journal
+
+    def on_response(self, context: ResponseContext) -> Any:
+        if context.payload.get("code") == 2002:
+            self.journal.mark(VideoId(context.params["video_id"]))
@@ -1,28 +1,241 @@
 import asyncio
+import os
+import signal
+import sys
+from contextlib import ExitStack, contextmanager
+from typing import AsyncIterable, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
 import typer
 import rich
-import pandas as pd
 import pendulum
 
+from crawler.cache import ResponseCache
+from crawler.callbacks.base import CallBack
+from crawler.checkpoint import CheckpointCallback, CrawlJournal
 from crawler.callbacks.stopping import (
     PublicationTimeRangeStopper,
     TooManyRequestStopper,
     FailurePatienceStopper,
 )
+from crawler.concurrency import ConcurrencyStrategy, build_limiter
 from crawler.core import Crawler, AsyncCrawler
-from crawler.videos import VideoId, VideoIdAscendingGenerator, VideoIdDescendingGenerator
+from crawler.dataset import DatasetSink, compact_dataset
+from crawler.follow import Follower, Watermark
+from crawler.index import IdIndex, IndexCallback
+from crawler.metrics import Metrics, MetricsLog, MetricsServer
+from crawler.progress import atrack
+from crawler.ratelimit import RateLimiter, build_rate_limiter
+from crawler.retry import build_retry_policy
+from crawler.seek import PublicationDateSeeker
+from crawler.sinks import MONGODB_SCHEMES, MongoSink, ParquetPartsSink, ParquetSink, PrintSink, Sink
+from crawler.thumbnails import ThumbnailStore, aThumbnailsContent
+from crawler.transport import Connections
+from crawler.videos import (
+    VideoId,
+    VideoIdAscendingGenerator,
+    VideoIdDescendingGenerator,
+    VideoIdGenerator,
+    VideoIdSparseGenerator,
+)
 
 
 app = typer.Typer(add_completion=False)
 
 
+def build_callbacks(
+    since: Optional[str], until: Optional[str], failure_patience: int
+) -> List[CallBack]:
+    start_datetime = pendulum.parse(since) if since else None
+    end_datetime = pendulum.parse(until) if until else None
+
+    return [
+        TooManyRequestStopper(),
+        FailurePatienceStopper(patience=failure_patience),
+        PublicationTimeRangeStopper(start_datetime=start_datetime, end_datetime=end_datetime),
+    ]
+
+
+def open_journal(resume: Optional[str], output: Optional[str]) -> Optional[CrawlJournal]:
+    """Journal committed with each Parquet part written to `output`, every 1000 ids otherwise"""
+    return CrawlJournal(resume, batch_size=None if output else 1000) if resume else None
+
+
+def build_id_generator(
+    offset: Optional[str],
+    n_videos: Optional[int],
+    ascending: bool,
+    journal: Optional[CrawlJournal] = None,
+    seek: Optional[Callable[[], VideoIdGenerator]] = None,
+    sparse: bool = False,
+) -> VideoIdGenerator:
+    """Ids from `offset`, else from a journaled crawl, else from the range found by `seek`"""
+    if sparse and journal:
+        raise typer.BadParameter("--sparse cannot be combined with --resume.")
+    generator = None
+    if offset:
+        generator_class = VideoIdAscendingGenerator if ascending else VideoIdDescendingGenerator
+        generator = generator_class(seed=VideoId(offset), limit=n_videos)
+    elif journal:
+        try:
+            return journal.resume()
+        except ValueError:
+            pass
+
+    if generator is None and seek:
+        try:
+            generator = seek()
+        except ValueError as err:
+            raise typer.BadParameter(str(err))
+    if journal:
+        try:
+            return journal.resume(generator)
+        except ValueError as err:
+            raise typer.BadParameter(str(err))
+    if generator is None:
+        raise typer.BadParameter(
+            "--offset is required unless resuming a crawl or seeking --since/--until."
+        )
+    if sparse:
+        return VideoIdSparseGenerator(
+            seed=generator.seed,
+            limit=generator.limit,
+            ascending=not isinstance(generator, VideoIdDescendingGenerator),
+        )
+    return generator
+
+
+def build_seek(
+    since: Optional[str],
+    until: Optional[str],
+    ascending: bool,
+    rate_limiter: Optional[RateLimiter] = None,
+) -> Optional[Callable[[], VideoIdGenerator]]:
+    """Seek the ids published between `since` and `until`, if any is given"""
+    if not since and not until:
+        return None
+    start_datetime = pendulum.parse(since) if since else None
+    end_datetime = pendulum.parse(until) if until else None
+    seeker = PublicationDateSeeker(Crawler(rate_limiter=rate_limiter))
+    return lambda: seeker.generator(since=start_datetime, until=end_datetime, ascending=ascending)
+
+
+def open_sink(
+    output: Optional[str], journal: Optional[CrawlJournal] = None, partitioned: bool = False
+) -> Sink:
+    if partitioned and (not output or output.startswith(MONGODB_SCHEMES)):
+        raise typer.BadParameter("--partitioned requires an --output directory.")
+    if output and output.startswith(MONGODB_SCHEMES):
+        sink: Sink = MongoSink.from_uri(output)
+    elif partitioned:
+        sink = DatasetSink(output)
+    elif output and journal:
+        sink = ParquetPartsSink(output)
+    else:
+        sink = ParquetSink(output) if output else PrintSink()
+    if journal:
+        sink.on_write.append(journal.mark_record)
+        sink.on_commit.append(journal.commit)
+    return sink
+
+
+@contextmanager
+def crawl_session(
+    offset: Optional[str],
+    n_videos: Optional[int],
+    ascending: bool,
+    since: Optional[str],
+    until: Optional[str],
+    failure_patience: int,
+    output: Optional[str],
+    resume: Optional[str] = None,
+    index: Optional[str] = None,
+    recheck_missing_after: Optional[float] = None,
+    rate_limiter: Optional[RateLimiter] = None,
+    sparse: bool = False,
+    partitioned: bool = False,
+) -> Iterator[Tuple[List[CallBack], VideoIdGenerator, Sink]]:
+    """Callbacks, id generator and sink of a crawl, with its journal and index closed on exit"""
+    callbacks = build_callbacks(since, until, failure_patience)
+    journal = open_journal(resume, output)
+    id_index = IdIndex(index) if index else None
+    try:
+        seek = build_seek(since, until, ascending, rate_limiter)
+        id_generator = build_id_generator(offset, n_videos, ascending, journal, seek, sparse)
+        sink = open_sink(output, journal, partitioned)
+        if id_index:
+            on_skip = journal.mark if journal else None
+            id_generator = id_index.filter(
+                id_generator, missing_ttl=recheck_missing_after, on_skip=on_skip
+            )
+            index_callback = IndexCallback(id_index)
+            callbacks.append(index_callback)
+            sink.on_write.append(index_callback.mark_record)
+            sink.on_commit.append(index_callback.commit)
+        if journal:
+            callbacks.append(CheckpointCallback(journal))
+        yield callbacks, id_generator, sink
+    finally:
+        if journal:
+            journal.close()
+        if id_index:
+            id_index.close()
+
+
+def open_cache(
+    cache: Optional[str], cache_ttl: Optional[float], cache_size: int, resource: str
+) -> Optional[ResponseCache]:
+    """Response cache of `resource` responses, None if no `cache` directory"""
+    if not cache:
+        return None
+    ttl = {resource: cache_ttl} if cache_ttl is not None else None
+    return ResponseCache(cache, max_size=cache_size * 2**20, ttl=ttl)
+
+
+def replay_cache(cache: Optional[ResponseCache], resource: str, output: Optional[str]) -> None:
+    """Rebuild `output` from the cached responses of `resource`"""
+    if cache is None:
+        raise typer.BadParameter("--replay requires --cache.")
+    dump(Crawler(cache=cache, typed=True).iter_replay(resource), open_sink(output))
+
+
+@contextmanager
+def export_metrics(
+    port: Optional[int], log: Optional[str], interval: float
+) -> Iterator[Optional[Metrics]]:
+    """Metrics served on `port` and logged to `log` ("-" for stderr), None if neither"""
+    if port is None and not log:
+        yield None
+        return
+    metrics = Metrics()
+    with ExitStack() as stack:
+        if port is not None:
+            stack.enter_context(MetricsServer(metrics, port))
+        if log:
+            stream = sys.stderr if log == "-" else stack.enter_context(open(log, "a"))
+            stack.enter_context(MetricsLog(metrics, stream, interval=interval))
+        yield metrics
+
+
+def dump(records: Iterable[Dict], sink: Sink) -> None:
+    with sink:
+        for record in records:
+            sink.write(record)
+
+
+async def adump(records: AsyncIterable[Dict], sink: Sink) -> None:
+    async with sink:
+        async for record in records:
+            await sink.awrite(record)
+
+
 @app.command()
 def crawl(
     offset: str = typer.Option(
-        ...,
+        None,
         "-o",
         "--offset",
-        help="Reference id to start search from or to end search at, eg.: 102779211.",
+        help="Reference id to start search from or to end search at, eg.: 102779211. "
+        "If omitted, the ids published between --since and --until are seeked.",
     ),
     n_videos: int = typer.Option(1, "-n", "--n-videos", help="Number of id to search."),
     since: str = typer.Option(None, help="Minimum publication datetime of video."),
@@ -32,50 +245,147 @@ def crawl(
         "--ascending/--descending",
         help="Crawling order: starting offset --ascending by default / from offset --descending to be specified.",
     ),
-    output: str = typer.Option(None, help="Output location to dump results."),
+    output: str = typer.Option(
+        None, help="Output location to dump results, or a mongodb:// uri of a db.collection."
+    ),
+    partitioned: bool = typer.Option(
+        False,
+        help="Append to --output as a dataset partitioned by published_on, see compact.",
+    ),
     failure_patience: int = typer.Option(
         500, help="How many consecutive failures trigger crawling stop."
     ),
+    sparse: bool = typer.Option(
+        False, help="Stride over runs of missing ids instead of requesting each of them."
+    ),
+    resume: str = typer.Option(
+        None,
+        help="Journal file checkpointing the crawl, resumed from if it exists. "
+        "--output is then a directory of part files.",
+    ),
+    index: str = typer.Option(None, help="Index file of fetched and missing ids to skip."),
+    recheck_missing_after: float = typer.Option(
+        None, help="Seconds after which ids known missing in --index are requested again."
+    ),
+    rate: float = typer.Option(None, help="Maximum requests per second."),
+    burst: int = typer.Option(None, help="Maximum burst of requests allowed by --rate."),
+    rate_state: str = typer.Option(
+        None, help="SQLite file sharing the --rate budget between processes of the host."
+    ),
+    max_attempts: int = typer.Option(
+        5, help="Attempts per request on transport errors, 5xx and rate limits."
+    ),
+    retry_budget: float = typer.Option(
+        0.1, help="Retries allowed per request on average, over the whole crawl."
+    ),
+    metrics_port: int = typer.Option(None, help="Port serving Prometheus metrics on /metrics."),
+    metrics_log: str = typer.Option(
+        None, help="File appended with a JSON line of metrics periodically, - for stderr."
+    ),
+    metrics_interval: float = typer.Option(10.0, help="Seconds between lines of --metrics-log."),
+    progress: bool = typer.Option(
+        True, help="Show a progress bar. Disable it in headless containers."
+    ),
+    cache: str = typer.Option(
+        None, help="Directory caching api responses, answering repeated requests from disk."
+    ),
+    cache_ttl: float = typer.Option(
+        None, help="Seconds cached responses stay fresh. If omitted, they never expire."
+    ),
+    cache_size: int = typer.Option(10_240, help="Maximum size of --cache in MB."),
+    replay: bool = typer.Option(
+        False, help="Rebuild the output from every response in --cache, without any request."
+    ),
 ):
     """Crawl xyz API by id"""
-    start_datetime = pendulum.parse(since) if since else None
-    end_datetime = pendulum.parse(until) if until else None
-
-    callbacks = [
-        TooManyRequestStopper(),
-        FailurePatienceStopper(patience=failure_patience),
-        PublicationTimeRangeStopper(start_datetime=start_datetime, end_datetime=end_datetime),
-    ]
-
-    generator_class = VideoIdAscendingGenerator if ascending else VideoIdDescendingGenerator
-    id_generator = generator_class(seed=VideoId(offset), limit=n_videos)
-
-    crawler = Crawler(callbacks=callbacks)
-    results = crawler.crawl(id_generator=id_generator)
-
-    if output:
-        df = pd.DataFrame.from_records(results)
-        df.to_parquet(output)
-
-    else:
-        rich.print(results)
+    response_cache = open_cache(cache, cache_ttl, cache_size, Crawler.VIDEO_BY_ID_RESOURCE)
+    if replay:
+        return replay_cache(response_cache, Crawler.VIDEO_BY_ID_RESOURCE, output)
+    rate_limiter = build_rate_limiter(rate, burst, rate_state)
+    with (
+        crawl_session(
+            offset,
+            n_videos,
+            ascending,
+            since,
+            until,
+            failure_patience,
+            output,
+            resume=resume,
+            index=index,
+            recheck_missing_after=recheck_missing_after,
+            rate_limiter=rate_limiter,
+            sparse=sparse,
+            partitioned=partitioned,
+        ) as (callbacks, id_generator, sink),
+        export_metrics(metrics_port, metrics_log, metrics_interval) as metrics,
+    ):
+        crawler = Crawler(
+            callbacks=callbacks,
+            rate_limiter=rate_limiter,
+            typed=True,
+            cache=response_cache,
+            retry_policy=build_retry_policy(max_attempts, retry_budget),
+            metrics=metrics,
+            progress=progress,
+        )
+        dump(crawler.iter_crawl(id_generator=id_generator), sink)
 
 
 @app.command()
 def search(
-    n_pages: int = typer.Option(1, "-n", "--n-pages", help="Number of pages to search."),
-    output: str = typer.Option(None, help="Output location to dump results."),
+    n_pages: int = typer.Option(
+        1, "-n", "--n-pages", help="Maximum number of pages to search, 0 for every page."
+    ),
+    dedupe: bool = typer.Option(True, help="Skip videos already found on a previous page."),
+    output: str = typer.Option(
+        None, help="Output location to dump results, or a mongodb:// uri of a db.collection."
+    ),
+    partitioned: bool = typer.Option(
+        False,
+        help="Append to --output as a dataset partitioned by published_on, see compact.",
+    ),
+    rate: float = typer.Option(None, help="Maximum requests per second."),
+    burst: int = typer.Option(None, help="Maximum burst of requests allowed by --rate."),
+    rate_state: str = typer.Option(
+        None, help="SQLite file sharing the --rate budget between processes of the host."
+    ),
+    max_attempts: int = typer.Option(
+        5, help="Attempts per request on transport errors, 5xx and rate limits."
+    ),
+    retry_budget: float = typer.Option(
+        0.1, help="Retries allowed per request on average, over the whole crawl."
+    ),
+    metrics_port: int = typer.Option(None, help="Port serving Prometheus metrics on /metrics."),
+    metrics_log: str = typer.Option(
+        None, help="File appended with a JSON line of metrics periodically, - for stderr."
+    ),
+    metrics_interval: float = typer.Option(10.0, help="Seconds between lines of --metrics-log."),
+    cache: str = typer.Option(
+        None, help="Directory caching api responses, answering repeated requests from disk."
+    ),
+    cache_ttl: float = typer.Option(
+        None, help="Seconds cached responses stay fresh. If omitted, they never expire."
+    ),
+    cache_size: int = typer.Option(10_240, help="Maximum size of --cache in MB."),
+    replay: bool = typer.Option(
+        False, help="Rebuild the output from every response in --cache, without any request."
+    ),
 ):
     """Search xyz API by n_pages"""
-    crawler = Crawler()
-    results = crawler.search(n_pages=n_pages)
-
-    if output:
-        df = pd.DataFrame.from_records(results)
-        df.to_parquet(output)
-
-    else:
-        rich.print(results)
+    response_cache = open_cache(cache, cache_ttl, cache_size, Crawler.SEARCH_RESOURCE)
+    if replay:
+        return replay_cache(response_cache, Crawler.SEARCH_RESOURCE, output)
+    with export_metrics(metrics_port, metrics_log, metrics_interval) as metrics:
+        crawler = Crawler(
+            rate_limiter=build_rate_limiter(rate, burst, rate_state),
+            typed=True,
+            cache=response_cache,
+            retry_policy=build_retry_policy(max_attempts, retry_budget),
+            metrics=metrics,
+        )
+        records = crawler.iter_search(n_pages=n_pages or None, dedupe=dedupe)
+        dump(records, open_sink(output, partitioned=partitioned))
 
 
 @app.command()
@@ -88,49 +398,454 @@ def get(video_id: str):
 @app.command()
 def crawl_async(
     offset: str = typer.Option(
-        ...,
+        None,
         "-o",
         "--offset",
-        help="Reference id to start search from or to end search at, eg.: 102779211.",
+        help="Reference id to start search from or to end search at, eg.: 102779211. "
+        "If omitted, the ids published between --since and --until are seeked.",
     ),
     n_videos: int = typer.Option(1, "-n", "--n-videos", help="Number of id to search."),
+    since: str = typer.Option(None, help="Minimum publication datetime of video."),
+    until: str = typer.Option(None, help="Maximum publication datetime of video."),
     ascending: bool = typer.Option(
         True,
         "--ascending/--descending",
         help="Crawling order: starting offset --ascending by default / from offset --descending to be specified.",
     ),
-    output: str = typer.Option(None, help="Output location to dump results."),
+    output: str = typer.Option(
+        None, help="Output location to dump results, or a mongodb:// uri of a db.collection."
+    ),
+    partitioned: bool = typer.Option(
+        False,
+        help="Append to --output as a dataset partitioned by published_on, see compact.",
+    ),
+    failure_patience: int = typer.Option(
+        500, help="How many consecutive failures trigger crawling stop."
+    ),
+    sparse: bool = typer.Option(
+        False, help="Stride over runs of missing ids instead of requesting each of them."
+    ),
+    resume: str = typer.Option(
+        None,
+        help="Journal file checkpointing the crawl, resumed from if it exists. "
+        "--output is then a directory of part files.",
+    ),
+    index: str = typer.Option(None, help="Index file of fetched and missing ids to skip."),
+    recheck_missing_after: float = typer.Option(
+        None, help="Seconds after which ids known missing in --index are requested again."
+    ),
     max_concurrency: int = typer.Option(50, help="Maximum concurrent requests."),
+    concurrency: ConcurrencyStrategy = typer.Option(
+        ConcurrencyStrategy.static, help="How the number of concurrent requests is adjusted."
+    ),
+    rate: float = typer.Option(None, help="Maximum requests per second."),
+    burst: int = typer.Option(None, help="Maximum burst of requests allowed by --rate."),
+    rate_state: str = typer.Option(
+        None, help="SQLite file sharing the --rate budget between processes of the host."
+    ),
+    max_attempts: int = typer.Option(
+        5, help="Attempts per request on transport errors, 5xx and rate limits."
+    ),
+    retry_budget: float = typer.Option(
+        0.1, help="Retries allowed per request on average, over the whole crawl."
+    ),
+    metrics_port: int = typer.Option(None, help="Port serving Prometheus metrics on /metrics."),
+    metrics_log: str = typer.Option(
+        None, help="File appended with a JSON line of metrics periodically, - for stderr."
+    ),
+    metrics_interval: float = typer.Option(10.0, help="Seconds between lines of --metrics-log."),
+    progress: bool = typer.Option(
+        True, help="Show a progress bar. Disable it in headless containers."
+    ),
+    http2: bool = typer.Option(
+        False, help="Multiplex requests over HTTP/2 connections, requires h2."
+    ),
+    cache: str = typer.Option(
+        None, help="Directory caching api responses, answering repeated requests from disk."
+    ),
+    cache_ttl: float = typer.Option(
+        None, help="Seconds cached responses stay fresh. If omitted, they never expire."
+    ),
+    cache_size: int = typer.Option(10_240, help="Maximum size of --cache in MB."),
+    replay: bool = typer.Option(
+        False, help="Rebuild the output from every response in --cache, without any request."
+    ),
 ):
     """Crawl xyz API by id asynchronously"""
+    response_cache = open_cache(cache, cache_ttl, cache_size, Crawler.VIDEO_BY_ID_RESOURCE)
+    if replay:
+        return replay_cache(response_cache, Crawler.VIDEO_BY_ID_RESOURCE, output)
+    rate_limiter = build_rate_limiter(rate, burst, rate_state)
+    with (
+        crawl_session(
+            offset,
+            n_videos,
+            ascending,
+            since,
+            until,
+            failure_patience,
+            output,
+            resume=resume,
+            index=index,
+            recheck_missing_after=recheck_missing_after,
+            rate_limiter=rate_limiter,
+            sparse=sparse,
+            partitioned=partitioned,
+        ) as (callbacks, id_generator, sink),
+        export_metrics(metrics_port, metrics_log, metrics_interval) as metrics,
+    ):
+        limiter = build_limiter(concurrency, max_concurrency)
+        crawler = AsyncCrawler(
+            limiter=limiter,
+            callbacks=callbacks,
+            rate_limiter=rate_limiter,
+            typed=True,
+            cache=response_cache,
+            retry_policy=build_retry_policy(max_attempts, retry_budget),
+            metrics=metrics,
+            connections=Connections(http2=http2, metrics=metrics),
+        )
+        # Records are counted, without a total: ids missing or skipped produce none
+        records = atrack(crawler.iter_crawl(id_generator=id_generator), disable=not progress)
+        asyncio.run(adump(records, sink))
 
-    generator_class = VideoIdAscendingGenerator if ascending else VideoIdDescendingGenerator
-    id_generator = generator_class(seed=VideoId(offset), limit=n_videos)
 
-    crawler = AsyncCrawler(max_concurrency=max_concurrency)
-    results = asyncio.run(crawler.crawl(id_generator=id_generator))
+@app.command()
+def crawl_enrich(
+    thumbnails: str = typer.Option(
+        ..., help="Directory storing the thumbnails, shared across runs."
+    ),
+    offset: str = typer.Option(
+        None,
+        "-o",
+        "--offset",
+        help="Reference id to start search from or to end search at, eg.: 102779211. "
+        "If omitted, the ids published between --since and --until are seeked.",
+    ),
+    n_videos: int = typer.Option(1, "-n", "--n-videos", help="Number of id to search."),
+    since: str = typer.Option(None, help="Minimum publication datetime of video."),
+    until: str = typer.Option(None, help="Maximum publication datetime of video."),
+    ascending: bool = typer.Option(
+        True,
+        "--ascending/--descending",
+        help="Crawling order: starting offset --ascending by default / from offset --descending to be specified.",
+    ),
+    output: str = typer.Option(None, help="Output location to dump results."),
+    failure_patience: int = typer.Option(
+        500, help="How many consecutive failures trigger crawling stop."
+    ),
+    sparse: bool = typer.Option(
+        False, help="Stride over runs of missing ids instead of requesting each of them."
+    ),
+    base64: bool = typer.Option(
+        True, help="Attach the base64 content of the thumbnails besides their hash."
+    ),
+    queue_size: int = typer.Option(
+        100, help="Maximum number of records waiting between the crawl and the thumbnails."
+    ),
+    max_concurrency: int = typer.Option(50, help="Maximum concurrent requests."),
+    concurrency: ConcurrencyStrategy = typer.Option(
+        ConcurrencyStrategy.static, help="How the number of concurrent requests is adjusted."
+    ),
+    thumbnails_concurrency: int = typer.Option(50, help="Maximum concurrent thumbnail downloads."),
+    rate: float = typer.Option(None, help="Maximum requests per second."),
+    burst: int = typer.Option(None, help="Maximum burst of requests allowed by --rate."),
+    rate_state: str = typer.Option(
+        None, help="SQLite file sharing the --rate budget between processes of the host."
+    ),
+    max_attempts: int = typer.Option(
+        5, help="Attempts per request on transport errors, 5xx and rate limits."
+    ),
+    retry_budget: float = typer.Option(
+        0.1, help="Retries allowed per request on average, over the whole crawl."
+    ),
+    metrics_port: int = typer.Option(None, help="Port serving Prometheus metrics on /metrics."),
+    metrics_log: str = typer.Option(
+        None, help="File appended with a JSON line of metrics periodically, - for stderr."
+    ),
+    metrics_interval: float = typer.Option(10.0, help="Seconds between lines of --metrics-log."),
+    progress: bool = typer.Option(
+        True, help="Show a progress bar. Disable it in headless containers."
+    ),
+    http2: bool = typer.Option(
+        False, help="Multiplex requests over HTTP/2 connections, requires h2."
+    ),
+):
+    """Crawl xyz API by id asynchronously, downloading the thumbnails of records as they come"""
+    from crawler.pipeline import ENRICHED_SCHEMA, EnrichPipeline
 
-    if output:
-        df = pd.DataFrame.from_records(results)
-        df.to_parquet(output)
+    rate_limiter = build_rate_limiter(rate, burst, rate_state)
+    seek = build_seek(since, until, ascending, rate_limiter)
+    id_generator = build_id_generator(offset, n_videos, ascending, seek=seek, sparse=sparse)
+    with export_metrics(metrics_port, metrics_log, metrics_interval) as metrics:
+        # Api and thumbnails clients share their tuning and DNS cache
+        connections = Connections(http2=http2, metrics=metrics)
+        crawler = AsyncCrawler(
+            limiter=build_limiter(concurrency, max_concurrency),
+            callbacks=build_callbacks(since, until, failure_patience),
+            rate_limiter=rate_limiter,
+            typed=True,
+            retry_policy=build_retry_policy(max_attempts, retry_budget),
+            metrics=metrics,
+            connections=connections,
+        )
+        thumbnails_content = aThumbnailsContent(
+            max_concurrency=thumbnails_concurrency, metrics=metrics, connections=connections
+        )
+        pipeline = EnrichPipeline(
+            crawler,
+            thumbnails_content,
+            ThumbnailStore(thumbnails),
+            queue_size=queue_size,
+            base64=base64,
+        )
+        # Enriched records carry their thumbnails: smaller row groups bound the sink buffer
+        sink = (
+            ParquetSink(output, schema=ENRICHED_SCHEMA, row_group_size=1000)
+            if output
+            else PrintSink()
+        )
+        records = atrack(pipeline.run(id_generator), disable=not progress)
+        asyncio.run(adump(records, sink))
 
-    else:
-        rich.print(results)
+
+@app.command()
+def crawl_sharded(
+    output: str = typer.Option(..., help="Output location of the merged results."),
+    workers: int = typer.Option(
+        os.cpu_count(), "-w", "--workers", help="Number of worker processes."
+    ),
+    interleaved: bool = typer.Option(
+        False,
+        "--interleaved/--contiguous",
+        help="Deal ids to workers in turn, or split the range into contiguous shards.",
+    ),
+    offset: str = typer.Option(
+        None,
+        "-o",
+        "--offset",
+        help="Reference id to start search from or to end search at, eg.: 102779211. "
+        "If omitted, the ids published between --since and --until are seeked.",
+    ),
+    n_videos: int = typer.Option(1, "-n", "--n-videos", help="Number of id to search."),
+    since: str = typer.Option(None, help="Minimum publication datetime of video."),
+    until: str = typer.Option(None, help="Maximum publication datetime of video."),
+    ascending: bool = typer.Option(
+        True,
+        "--ascending/--descending",
+        help="Crawling order: starting offset --ascending by default / from offset --descending to be specified.",
+    ),
+    failure_patience: int = typer.Option(
+        500, help="How many consecutive failures of a worker trigger its stop."
+    ),
+    sparse: bool = typer.Option(
+        False, help="Stride over runs of missing ids instead of requesting each of them."
+    ),
+    max_concurrency: int = typer.Option(50, help="Maximum concurrent requests per worker."),
+    concurrency: ConcurrencyStrategy = typer.Option(
+        ConcurrencyStrategy.static, help="How the number of concurrent requests is adjusted."
+    ),
+    rate: float = typer.Option(None, help="Maximum requests per second, over all workers."),
+    burst: int = typer.Option(None, help="Maximum burst of requests allowed by --rate."),
+    rate_state: str = typer.Option(
+        None, help="SQLite file sharing the --rate budget between processes of the host."
+    ),
+    max_attempts: int = typer.Option(
+        5, help="Attempts per request on transport errors, 5xx and rate limits."
+    ),
+    retry_budget: float = typer.Option(
+        0.1, help="Retries allowed per request on average, over the whole crawl."
+    ),
+    progress: bool = typer.Option(
+        True, help="Show a progress bar. Disable it in headless containers."
+    ),
+):
+    """Crawl xyz API by id asynchronously, in parallel worker processes"""
+    from crawler.sharding import ShardedCrawl, split_range
+
+    seek = build_seek(since, until, ascending, build_rate_limiter(rate, burst, rate_state))
+    id_generator = build_id_generator(offset, n_videos, ascending, seek=seek)
+    try:
+        id_generators = split_range(id_generator, workers, interleaved=interleaved, sparse=sparse)
+    except ValueError as err:
+        raise typer.BadParameter(str(err))
+
+    crawl = ShardedCrawl(
+        id_generators,
+        output,
+        callbacks=build_callbacks(since, until, failure_patience),
+        max_concurrency=max_concurrency,
+        concurrency=concurrency,
+        rate=rate,
+        burst=burst,
+        rate_state=rate_state,
+        max_attempts=max_attempts,
+        retry_budget=retry_budget,
+        progress=progress,
+    )
+    n_records = crawl.run()
+    rich.print(f"{n_records} records written to {output}")
 
 
 @app.command()
 def search_async(
-    n_pages: int = typer.Option(1, "-n", "--n-pages", help="Number of pages to search."),
-    output: str = typer.Option(None, help="Output location to dump results."),
+    n_pages: int = typer.Option(
+        1, "-n", "--n-pages", help="Maximum number of pages to search, 0 for every page."
+    ),
+    dedupe: bool = typer.Option(True, help="Skip videos already found on a previous page."),
+    output: str = typer.Option(
+        None, help="Output location to dump results, or a mongodb:// uri of a db.collection."
+    ),
+    partitioned: bool = typer.Option(
+        False,
+        help="Append to --output as a dataset partitioned by published_on, see compact.",
+    ),
     max_concurrency: int = typer.Option(50, help="Maximum concurrent requests."),
+    concurrency: ConcurrencyStrategy = typer.Option(
+        ConcurrencyStrategy.static, help="How the number of concurrent requests is adjusted."
+    ),
+    rate: float = typer.Option(None, help="Maximum requests per second."),
+    burst: int = typer.Option(None, help="Maximum burst of requests allowed by --rate."),
+    rate_state: str = typer.Option(
+        None, help="SQLite file sharing the --rate budget between processes of the host."
+    ),
+    max_attempts: int = typer.Option(
+        5, help="Attempts per request on transport errors, 5xx and rate limits."
+    ),
+    retry_budget: float = typer.Option(
+        0.1, help="Retries allowed per request on average, over the whole crawl."
+    ),
+    metrics_port: int = typer.Option(None, help="Port serving Prometheus metrics on /metrics."),
+    metrics_log: str = typer.Option(
+        None, help="File appended with a JSON line of metrics periodically, - for stderr."
+    ),
+    metrics_interval: float = typer.Option(10.0, help="Seconds between lines of --metrics-log."),
+    progress: bool = typer.Option(
+        True, help="Show a progress bar. Disable it in headless containers."
+    ),
+    cache: str = typer.Option(
+        None, help="Directory caching api responses, answering repeated requests from disk."
+    ),
+    cache_ttl: float = typer.Option(
+        None, help="Seconds cached responses stay fresh. If omitted, they never expire."
+    ),
+    cache_size: int = typer.Option(10_240, help="Maximum size of --cache in MB."),
+    replay: bool = typer.Option(
+        False, help="Rebuild the output from every response in --cache, without any request."
+    ),
 ):
     """Search xyz API by n_pages asynchonously"""
-    crawler = AsyncCrawler(max_concurrency=max_concurrency)
-    results = asyncio.run(crawler.search(n_pages=n_pages))
+    response_cache = open_cache(cache, cache_ttl, cache_size, Crawler.SEARCH_RESOURCE)
+    if replay:
+        return replay_cache(response_cache, Crawler.SEARCH_RESOURCE, output)
+    with export_metrics(metrics_port, metrics_log, metrics_interval) as metrics:
+        crawler = AsyncCrawler(
+            limiter=build_limiter(concurrency, max_concurrency),
+            rate_limiter=build_rate_limiter(rate, burst, rate_state),
+            typed=True,
+            cache=response_cache,
+            retry_policy=build_retry_policy(max_attempts, retry_budget),
+            metrics=metrics,
+        )
+        records = atrack(
+            crawler.iter_search(n_pages=n_pages or None, dedupe=dedupe), disable=not progress
+        )
+        asyncio.run(adump(records, open_sink(output, partitioned=partitioned)))
 
-    if output:
-        df = pd.DataFrame.from_records(results)
-        df.to_parquet(output)
 
-    else:
-        rich.print(results)
+@app.command()
+def follow(
+    state: str = typer.Option(..., help="SQLite file persisting the high-watermark id."),
+    offset: str = typer.Option(
+        None,
+        "-o",
+        "--offset",
+        help="Newest known id to follow from, required until a watermark is persisted.",
+    ),
+    output: str = typer.Option(
+        None,
+        help="Directory of Parquet part files to append to, or a mongodb:// uri of a "
+        "db.collection. Records are printed if omitted.",
+    ),
+    partitioned: bool = typer.Option(
+        False,
+        help="Append to --output as a dataset partitioned by published_on, see compact.",
+    ),
+    lookahead: int = typer.Option(50, help="Number of ids probed above the newest video."),
+    min_interval: float = typer.Option(1.0, help="Seconds between polls finding videos."),
+    max_interval: float = typer.Option(30.0, help="Maximum seconds between empty polls."),
+    commit_interval: float = typer.Option(
+        60.0, help="Seconds between commits of the output and the watermark."
+    ),
+    max_concurrency: int = typer.Option(8, help="Maximum concurrent requests."),
+    http2: bool = typer.Option(
+        False, help="Multiplex requests over HTTP/2 connections, requires h2."
+    ),
+    rate: float = typer.Option(None, help="Maximum requests per second."),
+    burst: int = typer.Option(None, help="Maximum burst of requests allowed by --rate."),
+    rate_state: str = typer.Option(
+        None, help="SQLite file sharing the --rate budget between processes of the host."
+    ),
+    metrics_port: int = typer.Option(None, help="Port serving Prometheus metrics on /metrics."),
+    metrics_log: str = typer.Option(
+        None, help="File appended with a JSON line of metrics periodically, - for stderr."
+    ),
+    metrics_interval: float = typer.Option(10.0, help="Seconds between lines of --metrics-log."),
+):
+    """Follow the newest videos continuously, from the persisted high-watermark id"""
+    watermark = Watermark(state)
+    start = watermark.video_id or (VideoId(offset) if offset else None)
+    if start is None:
+        raise typer.BadParameter(f"No watermark in {state} yet, --offset is required.")
+    # Stop as on Ctrl-C in containers, committing the output and the watermark
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    with export_metrics(metrics_port, metrics_log, metrics_interval) as metrics:
+        crawler = AsyncCrawler(
+            max_concurrency=max_concurrency,
+            rate_limiter=build_rate_limiter(rate, burst, rate_state),
+            typed=True,
+            metrics=metrics,
+            # Connections stay open between polls
+            connections=Connections(
+                http2=http2, keepalive_expiry=2 * max_interval, metrics=metrics
+            ),
+        )
+        follower = Follower(
+            crawler,
+            start,
+            lookahead=lookahead,
+            min_interval=min_interval,
+            max_interval=max_interval,
+        )
+        if output and not partitioned and not output.startswith(MONGODB_SCHEMES):
+            sink: Sink = ParquetPartsSink(output)
+        else:
+            sink = open_sink(output, partitioned=partitioned)
+        try:
+            asyncio.run(follower.follow(sink, watermark, commit_interval=commit_interval))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watermark.close()
+
+
+@app.command()
+def compact(
+    dataset: str = typer.Argument(..., help="Directory of a --partitioned output."),
+    rows_per_file: int = typer.Option(1_000_000, help="Maximum number of rows per file."),
+    min_files: int = typer.Option(2, help="Number of files from which a day is compacted."),
+    since: str = typer.Option(None, help="First publication day to compact."),
+    until: str = typer.Option(None, help="Last publication day to compact."),
+):
+    """Merge the files of every day of a dataset, keeping the latest crawl of each video"""
+    compactions = compact_dataset(
+        dataset, rows_per_file=rows_per_file, min_files=min_files, since=since, until=until
+    )
+    files = sum(compaction.files for compaction in compactions)
+    compacted_files = sum(compaction.compacted_files for compaction in compactions)
+    duplicates = sum(compaction.rows - compaction.compacted_rows for compaction in compactions)
+    rich.print(
+        f"{len(compactions)} days compacted from {files} files into {compacted_files}, "
+        f"{duplicates} duplicates removed"
+    )
@@ -0,0 +1,219 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from enum import Enum
+from typing import AsyncIterator, List, Optional
+
+
+@dataclass
+class Slot:
+    """An acquired concurrency slot. Mark it dropped when the request was rate limited or failed."""
+
+    dropped: bool = False
+
+    def drop(self) -> None:
+        self.dropped = True
+
+
+class Limiter:
+    """
+    Base class for concurrency limiters: bounds in-flight requests to `limit`,
+    which strategies adjust at runtime from the outcome of each request.
+
+    Args:
+        initial_limit: Limit to start with
+        min_limit: Lower bound of the limit (default = 1)
+        max_limit: Upper bound of the limit (default = initial_limit)
+
+    Example:
+        >>> async with limiter.slot() as slot:
+        ...     response = await client.get(url)
+        ...     if response.status_code == 429:
+        ...         slot.drop()
+
+        >>> limiter.limit
+        42
+    """
+
+    def __init__(
+        self, initial_limit: int, min_limit: int = 1, max_limit: Optional[int] = None
+    ) -> None:
+        self.min_limit = min_limit
+        self.max_limit = max_limit or initial_limit
+        self.estimated_limit = float(initial_limit)
+        self.in_flight = 0
+        self._waiters: List[asyncio.Future] = []
+
+    @property
+    def limit(self) -> int:
+        return max(self.min_limit, min(self.max_limit, math.floor(self.estimated_limit)))
+
+    async def acquire(self) -> None:
+        while self.in_flight >= self.limit:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                # Woken up but cancelled before taking the slot: pass it on to the next waiter
+                if waiter.done() and not waiter.cancelled():
+                    self._waiters.remove(waiter)
+                    self._wake()
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self.in_flight += 1
+
+    def release(self, latency: float, dropped: bool = False) -> None:
+        self.in_flight -= 1
+        self.on_sample(latency, dropped)
+        self.estimated_limit = max(self.min_limit, min(self.max_limit, self.estimated_limit))
+        self._wake()
+
+    def on_sample(self, latency: float, dropped: bool) -> None:
+        """Update `estimated_limit` from a request outcome"""
+
+    def _wake(self) -> None:
+        available = self.limit - self.in_flight
+        for waiter in self._waiters:
+            if available <= 0:
+                break
+            if not waiter.done():
+                waiter.set_result(None)
+                available -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[Slot]:
+        await self.acquire()
+        slot = Slot()
+        start = time.perf_counter()
+        try:
+            yield slot
+        except Exception:
+            slot.drop()
+            raise
+        finally:
+            self.release(time.perf_counter() - start, slot.dropped)
+
+
+class StaticLimiter(Limiter):
+    """Fixed limit, equivalent to an `asyncio.Semaphore(limit)`"""
+
+    def __init__(self, limit: int) -> None:
+        super().__init__(initial_limit=limit, min_limit=limit, max_limit=limit)
+
+
+class AIMDLimiter(Limiter):
+    """
+    Additive increase / multiplicative decrease, as TCP congestion control.
+
+    The limit grows by one for every `limit` successful requests, and is multiplied
+    by `backoff_ratio` on every dropped request or request slower than `timeout`.
+
+    Args:
+        initial_limit: Limit to start with (default = 10)
+        min_limit: Lower bound of the limit (default = 1)
+        max_limit: Upper bound of the limit (default = 200)
+        backoff_ratio: Multiplicative decrease factor (default = 0.9)
+        timeout: Latency in seconds above which a request counts as dropped (default = None)
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        backoff_ratio: float = 0.9,
+        timeout: Optional[float] = None,
+    ) -> None:
+        super().__init__(initial_limit=initial_limit, min_limit=min_limit, max_limit=max_limit)
+        self.backoff_ratio = backoff_ratio
+        self.timeout = timeout
+
+    def on_sample(self, latency: float, dropped: bool) -> None:
+        if dropped or (self.timeout and latency > self.timeout):
+            self.estimated_limit *= self.backoff_ratio
+        elif 2 * self.in_flight >= self.limit:
+            self.estimated_limit += 1 / self.estimated_limit
+
+
+class GradientLimiter(Limiter):
+    """
+    Latency gradient limiter, after Netflix's concurrency-limits Gradient2.
+
+    Compares a short-term to a long-term exponential average of the latency: while
+    they match, the limit grows by about sqrt(limit); as requests start queuing
+    server side and short-term latency rises, the limit shrinks proportionally.
+
+    Args:
+        initial_limit: Limit to start with (default = 10)
+        min_limit: Lower bound of the limit (default = 1)
+        max_limit: Upper bound of the limit (default = 200)
+        smoothing: Weight of a new estimate in the limit (default = 0.2)
+        tolerance: Tolerated short-term latency increase before shrinking (default = 1.5)
+        short_window: Number of samples of the short-term average (default = 10)
+        long_window: Number of samples of the long-term average (default = 600)
+        backoff_ratio: Multiplicative decrease factor on dropped requests (default = 0.9)
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 10,
+        min_limit: int = 1,
+        max_limit: int = 200,
+        smoothing: float = 0.2,
+        tolerance: float = 1.5,
+        short_window: int = 10,
+        long_window: int = 600,
+        backoff_ratio: float = 0.9,
+    ) -> None:
+        super().__init__(initial_limit=initial_limit, min_limit=min_limit, max_limit=max_limit)
+        self.smoothing = smoothing
+        self.tolerance = tolerance
+        self.short_factor = 2 / (short_window + 1)
+        self.long_factor = 2 / (long_window + 1)
+        self.backoff_ratio = backoff_ratio
+        self.short_latency: Optional[float] = None
+        self.long_latency: Optional[float] = None
+
+    def on_sample(self, latency: float, dropped: bool) -> None:
+        if dropped:
+            self.estimated_limit *= self.backoff_ratio
+            return
+
+        latency = max(latency, 1e-6)
+        if self.short_latency is None or self.long_latency is None:
+            self.short_latency = self.long_latency = latency
+            return
+        self.short_latency += self.short_factor * (latency - self.short_latency)
+        self.long_latency += self.long_factor * (latency - self.long_latency)
+
+        # Let the long-term average recover quickly after a latency spike
+        if self.long_latency / self.short_latency > 2:
+            self.long_latency *= 0.95
+
+        # Application limited: the limit is not the bottleneck, do not grow it
+        if 2 * self.in_flight < self.estimated_limit:
+            return
+
+        gradient = max(0.5, min(1.0, self.tolerance * self.long_latency / self.short_latency))
+        new_limit = self.estimated_limit * gradient + math.sqrt(self.estimated_limit)
+        self.estimated_limit += self.smoothing * (new_limit - self.estimated_limit)
+
+
+class ConcurrencyStrategy(str, Enum):
+    static = "static"
+    aimd = "aimd"
+    gradient = "gradient"
+
+
+def build_limiter(strategy: ConcurrencyStrategy, max_concurrency: int) -> Limiter:
+    """Limiter for `strategy`, never exceeding `max_concurrency` in-flight requests"""
+    if strategy == ConcurrencyStrategy.aimd:
+        return AIMDLimiter(initial_limit=min(10, max_concurrency), max_limit=max_concurrency)
+    if strategy == ConcurrencyStrategy.gradient:
+        return GradientLimiter(initial_limit=min(10, max_concurrency), max_limit=max_concurrency)
+    return StaticLimiter(max_concurrency)
@@ -1,14 +1,32 @@
-import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+import time
+from contextlib import aclosing, nullcontext
+from typing import (
+    Any,
+    AsyncIterator,
+    ContextManager,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Union,
+)
 
 from httpx import AsyncClient, Client
-from tenacity import retry, wait_exponential
-from rich.progress import track
-import pendulum
-
+from crawler.cache import ResponseCache
 from crawler.callbacks.base import CallBack
 from crawler.callbacks.stopping import StopCrawlException
+from crawler.concurrency import Limiter, StaticLimiter
+from crawler.metrics import Metrics
+from crawler.pool import WorkerPool
+from crawler.progress import atrack
+from crawler.ratelimit import RateLimiter, parse_retry_after
+from crawler.records import VideoRecord
+from crawler.responses import ResponseContext, loads
+from crawler.retry import RetryPolicy, classify
+from crawler.search import SearchPagination, search_pages
+from crawler.transport import Connections
 from crawler.videos import VideoIdGenerator
 
 from .transforms import preprocess_crawl_tags, preprocess_search_tags
@@ -22,9 +40,32 @@ class BaseCrawler:
         VIDEO_BY_ID_RESOURCE: preprocess_crawl_tags,
     }
 
-    def __init__(self, callbacks: Optional[List[CallBack]] = None, thumbsize: str = "big"):
+    def __init__(
+        self,
+        callbacks: Optional[List[CallBack]] = None,
+        thumbsize: str = "big",
+        rate_limiter: Optional[RateLimiter] = None,
+        typed: bool = False,
+        cache: Optional[ResponseCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        metrics: Optional[Metrics] = None,
+        connections: Optional[Connections] = None,
+        max_connections: Optional[int] = None,
+    ):
         self.callbacks = callbacks or []
         self.thumbsize = thumbsize
+        self.rate_limiter = rate_limiter
+        self.typed = typed
+        self.cache = cache
+        self.connections = connections or Connections(metrics=metrics)
+        # Responses are cached in `observe`, from the payload decoded once by their context
+        self.transport = self.connections.transport(
+            "api", max_connections, cache=cache, store=False
+        )
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.metrics = metrics
+        if metrics:
+            metrics.watch(self.retry_policy)
         self.params = {
             "output": "json",
             "thumbsize": thumbsize,
@@ -34,77 +75,180 @@ class BaseCrawler:
 
     def crawl(self, id_generator: VideoIdGenerator) -> List[Dict]: ...
 
+    def cached(self, params: Optional[Dict[str, Any]]) -> bool:
+        """Whether the request of `params` is answered by the cache, without using the rate"""
+        return self.cache is not None and {**self.params, **(params or {})} in self.cache
+
+    def measure(self) -> ContextManager:
+        """Count a request in flight in `metrics`, if any"""
+        return self.metrics.measure("api") if self.metrics else nullcontext()
+
+    def observe(self, context: ResponseContext) -> None:
+        """
+        Record a response in `metrics` and in the cache, and drain the rate limiter if it was
+        rate limited
+        """
+        if self.metrics:
+            self.metrics.observe_context(context)
+        self.store(context)
+        self.observe_rate_limit(context)
+
+    def store(self, context: ResponseContext) -> None:
+        """Cache a response that was not answered by the cache, if there is a cache"""
+        response = context.response
+        if self.cache is None or response.headers.get("x-cache") == "hit":
+            return
+        try:
+            payload = context.payload
+        except ValueError:
+            return
+        self.cache.store(
+            dict(response.request.url.params), response.status_code, response.content, payload
+        )
+
+    def observe_rate_limit(self, context: ResponseContext) -> None:
+        """Drain the rate limiter bucket on `Retry-After` or code 1005 responses"""
+        if not self.rate_limiter:
+            return
+        retry_after = parse_retry_after(context.response.headers.get("Retry-After"))
+        if retry_after is not None or classify(context) in ("429", "1005"):
+            self.rate_limiter.penalize(retry_after)
+
+    @staticmethod
+    def decode(video_info: dict, resource: str) -> VideoRecord:
+        return VideoRecord.decode(video_info, process_tags=Crawler.TAGS_PROCESSORS[resource])
+
     @staticmethod
     def process(video_info: dict, resource: str):
-        process_tags = Crawler.TAGS_PROCESSORS[resource]
-        return {
-            "id": str(video_info["video_id"]),
-            "published_on": pendulum.parse(video_info["publish_date"], tz="UTC").to_date_string(),
-            "published_at": pendulum.parse(
-                video_info["publish_date"], tz="UTC"
-            ).to_iso8601_string(),
-            "title": str(video_info["title"]),
-            "duration": video_info["duration"],
-            "views": int(video_info["views"]),
-            "rating": float(video_info["rating"]),
-            "ratings": int(video_info["ratings"]),
-            "thumbs": [thumb["src"] for thumb in video_info["thumbs"]],
-            "tags": process_tags(video_info["tags"]),
-            "url": str(video_info["url"]),
-        }
+        return BaseCrawler.decode(video_info, resource).to_dict()
+
+    def iter_replay(self, resource: str) -> Iterator[Union[VideoRecord, Dict]]:
+        """Records of every response of `resource` in the cache, without a single request"""
+        if self.cache is None:
+            raise ValueError("Replaying requires a cache.")
+        for _, content in self.cache.replay(resource):
+            payload = loads(content)
+            results = payload.get("videos", []) if resource == self.SEARCH_RESOURCE else [payload]
+            for r in results:
+                if r.get("code") != 2002 and "video" in r:
+                    yield self.record(r["video"], resource=resource)
+
+    def record(self, video_info: dict, resource: str) -> Union[VideoRecord, Dict]:
+        """Record of a `video` payload: a `VideoRecord` if the crawler is `typed`, else a dict"""
+        start = time.perf_counter()
+        if self.typed:
+            record = self.decode(video_info, resource)
+        else:
+            record = self.process(video_info, resource)
+        if self.metrics:
+            self.metrics.observe_process(time.perf_counter() - start)
+        return record
 
 class Crawler(BaseCrawler):
-    def __init__(self, callbacks: Optional[List[CallBack]] = None, thumbsize: str = "big"):
-        BaseCrawler.__init__(self, callbacks=callbacks, thumbsize=thumbsize)
-        self.client = Client(base_url="https://api.xyz.com", params=self.params)
+    def __init__(
+        self,
+        callbacks: Optional[List[CallBack]] = None,
+        thumbsize: str = "big",
+        rate_limiter: Optional[RateLimiter] = None,
+        typed: bool = False,
+        cache: Optional[ResponseCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        metrics: Optional[Metrics] = None,
+        progress: bool = True,
+        connections: Optional[Connections] = None,
+    ):
+        BaseCrawler.__init__(
+            self,
+            callbacks=callbacks,
+            thumbsize=thumbsize,
+            rate_limiter=rate_limiter,
+            typed=typed,
+            cache=cache,
+            retry_policy=retry_policy,
+            metrics=metrics,
+            connections=connections,
+        )
+        self.progress = progress
+        self.client = Client(
+            base_url="https://api.xyz.com",
+            params=self.params,
+            transport=self.transport,
+            timeout=self.connections.timeout,
+        )
 
-    def search(self, n_pages=1, params=None):
+    def iter_search(self, n_pages=1, params=None, dedupe: bool = True) -> Iterator[Dict]:
+        """
+        Stream the records of up to `n_pages` search pages (all pages if None), page by page.
+        Stops at the first empty or short page. Ids already yielded are skipped if `dedupe`.
+        """
         params = params or {}
         search_params = {**self.params, **params, **{"data": self.SEARCH_RESOURCE}}
+        pagination = SearchPagination(dedupe=dedupe)
 
-        responses = []
-        for page in range(1, n_pages + 1):
+        for page in search_pages(n_pages):
             search_params = {**search_params, **{"page": page}}
-            responses.append(self.client.get("/", params=search_params).json())
+            response = self.request("/", params=search_params).payload
+            for video in pagination.read(response):
+                yield self.record(video, resource=search_params["data"])
+            if pagination.done:
+                break
 
-        return [
-            self.process(r["video"], resource=search_params["data"])
-            for response in responses
-            for r in response["videos"]
-            if r.get("code") != 2002
-        ]
+    def search(self, n_pages=1, params=None):
+        return list(self.iter_search(n_pages=n_pages, params=params))
 
-    def crawl(self, id_generator: VideoIdGenerator) -> List[Dict]:
+    def iter_crawl(self, id_generator: VideoIdGenerator) -> Iterator[Dict]:
         crawl_params = {**self.params, **{"data": self.VIDEO_BY_ID_RESOURCE}}
 
-        payloads = []
-        for video_id in track(id_generator):
+        video_ids: Iterable = id_generator
+        if self.progress:
+            from rich.progress import track
+
+            video_ids = track(id_generator)
+        for video_id in video_ids:
             crawl_params = {**crawl_params, **{"video_id": f"{video_id}"}}
             try:
-                response = self.get("/", params=crawl_params)
+                context = self.fetch("/", params=crawl_params)
             except StopCrawlException as err:
                 logging.warning(err.msg)
                 break
 
-            payload = response.json()
-            payloads.append(payload)
+            payload = context.payload
+            id_generator.feedback(video_id, found=payload.get("code") != 2002)
+            if payload.get("code") != 2002:
+                yield self.record(payload["video"], resource=crawl_params["data"])
 
-        return [
-            self.process(p["video"], resource=crawl_params["data"])
-            for p in payloads
-            if p.get("code") != 2002
-        ]
+    def crawl(self, id_generator: VideoIdGenerator) -> List[Dict]:
+        return list(self.iter_crawl(id_generator))
 
-    def get(self, *args, **kwargs):
-        response = self.client.get(*args, **kwargs)
+    def request(self, *args, **kwargs) -> ResponseContext:
+        """GET a resource within the rate limit, retried according to the retry policy"""
+        return self.retry_policy.call(lambda: self.send(*args, **kwargs))
+
+    def send(self, *args, **kwargs) -> ResponseContext:
+        """GET a resource once, within the rate limit"""
+        if self.rate_limiter and not self.cached(kwargs.get("params")):
+            self.rate_limiter.wait()
+        start = time.perf_counter()
+        with self.measure():
+            response = self.client.get(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        context = ResponseContext(response, elapsed=elapsed, params=kwargs.get("params"))
+        self.observe(context)
+        return context
+
+    def fetch(self, *args, **kwargs) -> ResponseContext:
+        """GET a resource and pass its decoded context through the callbacks chain"""
+        context = self.request(*args, **kwargs)
         for callback in self.callbacks:
-            callback.after_response(response)
-        return response
+            callback.on_response(context)
+        return context
+
+    def get(self, *args, **kwargs):
+        return self.fetch(*args, **kwargs).response
 
     def get_video(self, video_id: str) -> Dict[str, Any]:
         params = {"video_id": video_id, "data": self.VIDEO_BY_ID_RESOURCE}
-        response = self.get("/", params=params)
-        payload = response.json()
+        payload = self.fetch("/", params=params).payload
         return (
             self.process(payload["video"], resource=self.VIDEO_BY_ID_RESOURCE)
             if payload.get("code") != 2002
@@ -113,51 +257,161 @@ class Crawler(BaseCrawler):
 
 
 class AsyncCrawler(BaseCrawler):
-    def __init__(self, max_concurrency: int = 50, thumbsize: str = "big"):
-        BaseCrawler.__init__(self, thumbsize=thumbsize)
-        self.max_concurrency = max_concurrency
-        self.aclient = AsyncClient(base_url="https://api.xyz.com", params=self.params)
-        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+    def __init__(
+        self,
+        max_concurrency: int = 50,
+        thumbsize: str = "big",
+        callbacks: Optional[List[CallBack]] = None,
+        limiter: Optional[Limiter] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        typed: bool = False,
+        cache: Optional[ResponseCache] = None,
+        retry_policy: Optional[RetryPolicy] = None,
+        metrics: Optional[Metrics] = None,
+        connections: Optional[Connections] = None,
+    ):
+        """
+        Args:
+            max_concurrency: Maximum number of concurrent requests (default = 50)
+            thumbsize: Size of the thumbnails urls to request (default = "big")
+            callbacks: Callbacks called on every crawled response
+            limiter: Concurrency limiter, adjusting in-flight requests up to its `max_limit`
+                (default = StaticLimiter(max_concurrency))
+            rate_limiter: Requests per second budget, may be shared across crawlers and processes
+            typed: Yield `VideoRecord`s rather than dicts, lighter in memory (default = False)
+            cache: Cache answering requests made before, and storing the new responses
+            retry_policy: Retries of failed requests, shared by all of them
+                (default = RetryPolicy())
+            metrics: Runtime metrics of the requests and records, if any
+            connections: Owner of the HTTP clients, its api pool sized to the concurrency
+                (default = Connections(metrics=metrics))
+        """
+        self.limiter = limiter or StaticLimiter(max_concurrency)
+        self.max_concurrency = self.limiter.max_limit
+        BaseCrawler.__init__(
+            self,
+            callbacks=callbacks,
+            thumbsize=thumbsize,
+            rate_limiter=rate_limiter,
+            typed=typed,
+            cache=cache,
+            retry_policy=retry_policy,
+            metrics=metrics,
+            connections=connections,
+            max_connections=self.max_concurrency,
+        )
+        if metrics:
+            metrics.watch_limiter("api", self.limiter)
+        self.aclient = AsyncClient(
+            base_url="https://api.xyz.com",
+            params=self.params,
+            transport=self.transport,
+            timeout=self.connections.timeout,
+        )
 
-    @retry(wait=wait_exponential(multiplier=1, min=2, max=10))
     async def aget(self, *args, **kwargs):
-        async with self.semaphore:
-            return await self.aclient.get(*args, **kwargs)
+        return (await self.afetch(*args, **kwargs)).response
 
-    async def search(self, n_pages=1, params=None):
+    async def afetch(self, *args, **kwargs) -> ResponseContext:
+        """GET a resource, retried according to the retry policy"""
+        return await self.retry_policy.acall(lambda: self.asend(*args, **kwargs))
+
+    async def asend(self, *args, **kwargs) -> ResponseContext:
+        """GET a resource once, within the rate and concurrency limits"""
+        if self.rate_limiter and not self.cached(kwargs.get("params")):
+            await self.rate_limiter.acquire()
+        async with self.limiter.slot() as slot:
+            start = time.perf_counter()
+            with self.measure():
+                response = await self.aclient.get(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+            context = ResponseContext(response, elapsed=elapsed, params=kwargs.get("params"))
+            if classify(context):
+                slot.drop()
+        self.observe(context)
+        return context
+
+    async def iter_search(
+        self,
+        n_pages=1,
+        params=None,
+        dedupe: bool = True,
+        window: Optional[int] = None,
+    ) -> AsyncIterator[Dict]:
+        """
+        Stream the records of up to `n_pages` search pages (all pages if None), page by page.
+
+        Pages are fetched through a sliding window of `window` concurrent requests (default =
+        max_concurrency) and read in page order. The search stops at the first empty or short
+        page, cancelling the requests of later pages. Ids already yielded are skipped if `dedupe`.
+        """
         params = params or {}
         search_params = {**self.params, **params, **{"data": self.SEARCH_RESOURCE}}
+        pagination = SearchPagination(dedupe=dedupe)
 
-        responses = [
-            self.aget("/", params={**search_params, **{"page": page}})
-            for page in range(1, n_pages + 1)
-        ]
-        awaited_responses = [
-            (await response).json()
-            for response in track(asyncio.as_completed(responses), total=len(responses))
-        ]
-
-        return [
-            self.process(r["video"], resource=search_params["data"])
-            for response in awaited_responses
-            for r in response["videos"]
-            if r.get("code") != 2002
-        ]
+        async def fetch(page: int) -> Dict:
+            context = await self.afetch("/", params={**search_params, **{"page": page}})
+            return context.payload
 
-    async def crawl(self, id_generator: VideoIdGenerator) -> List[Dict]:
+        pool = WorkerPool(n_workers=window or self.max_concurrency, queue_size=1)
+        responses = pool.imap(fetch, search_pages(n_pages), ordered=True)
+        async with aclosing(responses):
+            async for _, response in responses:
+                for video in pagination.read(response):
+                    yield self.record(video, resource=search_params["data"])
+                if pagination.done:
+                    break
+
+    async def search(self, n_pages=1, params=None):
+        records = self.iter_search(n_pages=n_pages, params=params)
+        return [record async for record in atrack(records, total=None)]
+
+    async def iter_crawl(self, id_generator: VideoIdGenerator) -> AsyncIterator[Dict]:
+        """
+        Stream processed records as their responses complete.
+
+        A fixed pool of `max_concurrency` workers pulls ids lazily from `id_generator`,
+        so memory stays flat whatever its length, and unbounded generators are supported.
+
+        Unordered callbacks are called by the workers as soon as a response completes.
+        If any callback is ordered, records are yielded in id order and ordered callbacks
+        see responses in that order, so range and consecutive-failure stoppers behave as
+        in `Crawler`. Queued and in-flight requests are cancelled on StopCrawlException.
+
+        `id_generator` gets the feedback of each response as it completes. As that feedback
+        may let an exhausted generator generate again, it is pulled until it stays exhausted.
+        """
         crawl_params = {**self.params, **{"data": self.VIDEO_BY_ID_RESOURCE}}
+        ordered_callbacks = [callback for callback in self.callbacks if callback.ordered]
+        unordered_callbacks = [callback for callback in self.callbacks if not callback.ordered]
+
+        async def fetch(video_id) -> ResponseContext:
+            context = await self.afetch("/", params={**crawl_params, **{"video_id": f"{video_id}"}})
+            for callback in unordered_callbacks:
+                callback.on_response(context)
+            id_generator.feedback(video_id, found=context.payload.get("code") != 2002)
+            return context
+
+        pool = WorkerPool(n_workers=self.max_concurrency)
+        try:
+            while True:
+                n_contexts = 0
+                contexts = pool.imap(fetch, id_generator, ordered=bool(ordered_callbacks))
+                async with aclosing(contexts):
+                    async for _, context in contexts:
+                        n_contexts += 1
+                        for callback in ordered_callbacks:
+                            callback.on_response(context)
 
-        responses = [
-            self.aget("/", params={**crawl_params, **{"video_id": f"{video_id}"}})
-            for video_id in id_generator
-        ]
-        awaited_responses = [
-            (await response).json()
-            for response in track(asyncio.as_completed(responses), total=len(responses))
-        ]
-
-        return [
-            self.process(r["video"], resource=crawl_params["data"])
-            for r in awaited_responses
-            if r.get("code") != 2002
-        ]
+                        payload = context.payload
+                        if payload.get("code") != 2002:
+                            yield self.record(payload["video"], resource=crawl_params["data"])
+                if not n_contexts:
+                    break
+        except StopCrawlException as err:
+            logging.warning(err.msg)
+
+    async def crawl(self, id_generator: VideoIdGenerator) -> List[Dict]:
+        # Records are counted, without a total: ids missing or skipped produce none
+        records = self.iter_crawl(id_generator)
+        return [record async for record in atrack(records, total=None)]
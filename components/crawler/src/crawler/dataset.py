@@ -0,0 +1,265 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import pendulum
+
+from crawler.records import VideoRecord, record_schema
+from crawler.sinks import ParquetSink, Sink
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+# Column the datasets are partitioned by, a directory "published_on=2024-01-31" per day
+PARTITION = "published_on"
+
+
+@lru_cache(maxsize=1)
+def dataset_schema() -> "pa.Schema":
+    """
+    Arrow schema of the files of a dataset: the records without their partition column, with
+    the time they were crawled at
+    """
+    import pyarrow as pa
+
+    fields = [field for field in record_schema() if field.name != PARTITION]
+    return pa.schema([*fields, pa.field("crawled_at", pa.timestamp("us", tz="UTC"))])
+
+
+def run_id() -> str:
+    """Unique prefix of the files written by a run, eg. "20240131T120000-3fa2c1" """
+    return f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{os.urandom(3).hex()}"
+
+
+def data_files(directory: Path) -> List[Path]:
+    """Complete files of a partition, skipping the hidden ones still being written"""
+    return sorted(
+        path for path in directory.glob("*.parquet") if not path.name.startswith((".", "_"))
+    )
+
+
+class DatasetSink(Sink):
+    """
+    Append records to a hive-partitioned Parquet dataset, a directory per `published_on` day:
+    `root/published_on=2024-01-31/part-<run>-00000.parquet`.
+
+    Every run writes new files, named after the run, so runs never overwrite each other and
+    readers only open the days they query, see `read_dataset`. A record crawled by several
+    runs is in several files until `compact_dataset` keeps its latest crawl.
+
+    Files are written under a hidden name and renamed once complete: on every commit, every
+    `commit_every` records, when more than `max_open_files` days are written at once, and
+    on close.
+
+    Args:
+        root: Dataset directory, created if needed
+        commit_every: Number of records between commits (default = 100_000)
+        max_open_files: Maximum number of files written at once (default = 32)
+        **kwargs: `ParquetSink` arguments
+
+    Example:
+        >>> with DatasetSink("videos/") as sink:
+        ...     for record in crawler.iter_crawl(id_generator):
+        ...         sink.write(record)
+    """
+
+    def __init__(
+        self,
+        root: str,
+        commit_every: Optional[int] = 100_000,
+        max_open_files: int = 32,
+        **kwargs,
+    ) -> None:
+        super().__init__()
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.commit_every = commit_every
+        self.max_open_files = max_open_files
+        self.kwargs = kwargs
+        self.run = run_id()
+        self.files: "OrderedDict[str, ParquetSink]" = OrderedDict()
+        self.n_files = 0
+        self.uncommitted = 0
+
+    def write(self, record: Dict) -> None:
+        row = record.to_dict() if isinstance(record, VideoRecord) else dict(record)
+        partition = row.pop(PARTITION)
+        row["crawled_at"] = datetime.now(timezone.utc)
+        self.file(partition).write(row)
+        self.accepted(record)
+        self.uncommitted += 1
+        if self.commit_every and self.uncommitted >= self.commit_every:
+            self.commit()
+
+    def file(self, partition: str) -> ParquetSink:
+        """File written for the day `partition`, opening it if needed"""
+        if partition in self.files:
+            self.files.move_to_end(partition)
+            return self.files[partition]
+        if len(self.files) >= self.max_open_files:
+            self.complete(self.files.popitem(last=False)[1])
+        directory = self.root / f"{PARTITION}={partition}"
+        directory.mkdir(exist_ok=True)
+        path = directory / f".part-{self.run}-{self.n_files:05d}.parquet"
+        self.n_files += 1
+        self.files[partition] = ParquetSink(str(path), schema=dataset_schema(), **self.kwargs)
+        return self.files[partition]
+
+    @staticmethod
+    def complete(file: ParquetSink) -> None:
+        file.close()
+        path = Path(file.path)
+        os.replace(path, path.with_name(path.name[1:]))
+
+    def commit(self) -> None:
+        while self.files:
+            self.complete(self.files.popitem(last=False)[1])
+        self.uncommitted = 0
+        self.committed()
+
+    def close(self) -> None:
+        self.commit()
+
+
+def day(value: str) -> str:
+    """Partition of a date or datetime, eg. "2024-01-31" for "2024-01-31T12:00:00" """
+    return pendulum.parse(value).to_date_string()
+
+
+def in_range(partition: str, since: Optional[str], until: Optional[str]) -> bool:
+    return (not since or partition >= day(since)) and (not until or partition <= day(until))
+
+
+def partition_filter(
+    since: Optional[str] = None, until: Optional[str] = None
+) -> Optional["pc.Expression"]:
+    """Filter on the days published between `since` and `until`, None if neither is given"""
+    import pyarrow.dataset as ds
+
+    conditions = []
+    if since:
+        conditions.append(ds.field(PARTITION) >= day(since))
+    if until:
+        conditions.append(ds.field(PARTITION) <= day(until))
+    if not conditions:
+        return None
+    return conditions[0] & conditions[1] if len(conditions) == 2 else conditions[0]
+
+
+def open_dataset(root: str) -> "ds.Dataset":
+    """pyarrow dataset of the files of `root`, with their `published_on` partition column"""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    partition_schema = pa.schema([(PARTITION, pa.string())])
+    return ds.dataset(
+        root,
+        schema=pa.unify_schemas([dataset_schema(), partition_schema]),
+        format="parquet",
+        partitioning=ds.partitioning(partition_schema, flavor="hive"),
+    )
+
+
+def read_dataset(
+    root: str,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    columns: Optional[List[str]] = None,
+) -> "pa.Table":
+    """
+    Records of the days published between `since` and `until`, only reading their partitions
+
+    Example:
+        >>> read_dataset("videos/", since="2024-01-01", until="2024-01-31").num_rows
+        12480
+    """
+    return open_dataset(root).to_table(columns=columns, filter=partition_filter(since, until))
+
+
+def latest_crawls(table: "pa.Table") -> "pa.Table":
+    """Rows of `table` deduplicated by `id`, keeping the latest crawled of each, sorted by id"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if table.num_rows == 0:
+        return table
+    table = table.sort_by([("id", "ascending"), ("crawled_at", "descending")])
+    ids = table.column("id").combine_chunks()
+    first = pc.not_equal(ids.slice(1), ids.slice(0, len(ids) - 1))
+    return table.filter(pa.concat_arrays([pa.array([True]), first]))
+
+
+@dataclass(frozen=True)
+class Compaction:
+    """A partition compacted: its number of files and rows, before and after"""
+
+    partition: str
+    files: int
+    rows: int
+    compacted_files: int
+    compacted_rows: int
+
+
+def compact_dataset(
+    root: str,
+    rows_per_file: int = 1_000_000,
+    min_files: int = 2,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> List[Compaction]:
+    """
+    Rewrite every partition of at least `min_files` files of fewer than `rows_per_file` rows
+    into files of `rows_per_file` rows without duplicate ids: the latest crawl of each is kept.
+
+    Compacting after every few runs keeps the number of files of a day bounded by its number
+    of rows, whatever the number of runs. A partition is read in memory at once. New files
+    are complete before old ones are removed: a compaction interrupted leaves duplicates, and
+    no loss, for the next one to remove.
+
+    Args:
+        root: Dataset directory written by `DatasetSink`
+        rows_per_file: Maximum number of rows per compacted file (default = 1_000_000)
+        min_files: Number of files under `rows_per_file` rows from which a partition is
+            compacted (default = 2)
+        since: First day compacted, if any
+        until: Last day compacted, if any
+
+    Example:
+        >>> compact_dataset("videos/", since="2024-01-01")
+        [Compaction(partition='2024-01-01', files=30, rows=12480, compacted_files=1, ...)]
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    run = run_id()
+    compactions = []
+    for directory in sorted(Path(root).glob(f"{PARTITION}=*")):
+        partition = directory.name.partition("=")[2]
+        paths = data_files(directory)
+        if not in_range(partition, since, until):
+            continue
+        # Compacted files are full but the last: a day is compacted again once appended to
+        small = [path for path in paths if pq.read_metadata(path).num_rows < rows_per_file]
+        if len(small) < min_files:
+            continue
+        table = pa.concat_tables(pq.read_table(path, schema=dataset_schema()) for path in paths)
+        compacted = latest_crawls(table)
+        n_files = 0
+        for start in range(0, compacted.num_rows, rows_per_file):
+            path = directory / f".part-{run}-{n_files:05d}.parquet"
+            pq.write_table(compacted.slice(start, rows_per_file), path)
+            os.replace(path, path.with_name(path.name[1:]))
+            n_files += 1
+        for path in paths:
+            path.unlink()
+        compactions.append(
+            Compaction(partition, len(paths), table.num_rows, n_files, compacted.num_rows)
+        )
+    return compactions
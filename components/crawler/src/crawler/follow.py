@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Set, Union
+
+from crawler.callbacks.stopping import StopCrawlException
+from crawler.core import AsyncCrawler
+from crawler.records import VideoRecord
+from crawler.sinks import Sink
+from crawler.videos import VideoId
+
+
+class Watermark:
+    """
+    Persisted high-watermark of a followed crawl: the newest video id whose record is durable.
+
+    `advance` only moves the watermark in memory, `commit` stores it, eg. from the `on_commit`
+    callbacks of the sink once the records below it are durably written.
+
+    Args:
+        path: Location of the SQLite state, created if needed
+
+    Example:
+        >>> watermark = Watermark("follow.sqlite")
+        >>> watermark.video_id or VideoId("1231")
+        >>> watermark.advance(VideoId("1241"))
+        >>> sink.on_commit.append(watermark.commit)
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS watermark (id TEXT, updated_at REAL)")
+        self.connection.commit()
+        row = self.connection.execute("SELECT id FROM watermark").fetchone()
+        self.video_id: Optional[VideoId] = VideoId(row[0]) if row else None
+        self.pending: Optional[VideoId] = None
+
+    def advance(self, video_id: VideoId) -> None:
+        current = self.pending or self.video_id
+        if current is None or video_id.numerical_value > current.numerical_value:
+            self.pending = video_id
+
+    def commit(self) -> None:
+        if self.pending is None:
+            return
+        with self.connection:
+            self.connection.execute("DELETE FROM watermark")
+            self.connection.execute(
+                "INSERT INTO watermark VALUES (?, ?)", (str(self.pending), time.time())
+            )
+        self.video_id, self.pending = self.pending, None
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+@dataclass
+class Recheck:
+    """Probes of an id skipped or failed below the frontier: at doubling delays, until `until`"""
+
+    until: float
+    at: float
+    delay: float
+
+    def backoff(self, now: float) -> None:
+        self.delay *= 2
+        self.at = now + self.delay
+
+
+class Follower:
+    """
+    Follow the newest videos: probe the `lookahead` ids above the newest video found, then the
+    ones above the next newest, and so on, with the connections of `crawler` kept warm.
+
+    Polling adapts to the publication rate: every poll finding nothing doubles the interval up to
+    `max_interval`, a poll finding videos resets it to `min_interval`, and a poll finding
+    videos near the end of its window polls again at once, to catch up. Ids skipped below the
+    newest video found are probed again for `grace` seconds, for videos published late, at
+    delays doubling from `min_interval`. Ids whose request failed are probed again until they
+    resolve, and the watermark stays below them, so that a restart probes them again.
+
+    Args:
+        crawler: Crawler of the records, with a small concurrency
+        start: Newest video id known, the first one probed being the next one
+        lookahead: Number of ids probed above the newest video (default = 50)
+        min_interval: Seconds between polls while videos are found (default = 1)
+        max_interval: Upper bound of the seconds between empty polls (default = 30)
+        grace: Seconds skipped ids are probed again (default = 600)
+
+    Example:
+        >>> follower = Follower(AsyncCrawler(max_concurrency=8), start=watermark.video_id)
+        >>> await follower.follow(sink, watermark)
+    """
+
+    def __init__(
+        self,
+        crawler: AsyncCrawler,
+        start: VideoId,
+        lookahead: int = 50,
+        min_interval: float = 1.0,
+        max_interval: float = 30.0,
+        grace: float = 600.0,
+    ) -> None:
+        self.crawler = crawler
+        self.frontier = start.numerical_value
+        self.lookahead = lookahead
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.grace = grace
+        self.interval = min_interval
+        # Numerical values of the skipped and failed ids, and their probes
+        self.recheck: Dict[int, Recheck] = {}
+        # Numerical values of the ids whose last probe failed
+        self.failed: Set[int] = set()
+        self.params = {**crawler.params, "data": crawler.VIDEO_BY_ID_RESOURCE}
+
+    async def fetch(self, value: int) -> Optional[Union[VideoRecord, Dict]]:
+        """Record of the id of numerical `value`, None if it does not exist (yet)"""
+        params = {**self.params, "video_id": str(VideoId.from_numerical(value))}
+        payload = (await self.crawler.afetch("/", params=params)).payload
+        if payload.get("code") == 1005:
+            raise StopCrawlException(payload.get("message", "Too many requests."))
+        if payload.get("code") == 2002 or "video" not in payload:
+            return None
+        return self.crawler.record(payload["video"], resource=self.params["data"])
+
+    async def poll(self) -> List[Union[VideoRecord, Dict]]:
+        """Records of the new videos, adapting the `interval` to the next poll"""
+        now = time.monotonic()
+        self.recheck = {
+            value: recheck
+            for value, recheck in self.recheck.items()
+            if recheck.until > now or value in self.failed
+        }
+        due = [value for value, recheck in self.recheck.items() if recheck.at <= now]
+        window = range(self.frontier + 1, self.frontier + 1 + self.lookahead)
+        values = sorted({*due, *window})
+        results = await asyncio.gather(
+            *(self.fetch(value) for value in values), return_exceptions=True
+        )
+
+        records, found, failed = [], [], []
+        for value, result in zip(values, results):
+            if isinstance(result, StopCrawlException):
+                logging.warning(f"Video {VideoId.from_numerical(value)} failed: {result.msg}")
+                failed.append(value)
+                self.failed.add(value)
+            elif isinstance(result, BaseException):
+                raise result
+            elif result is not None:
+                records.append(result)
+                found.append(value)
+                self.recheck.pop(value, None)
+                self.failed.discard(value)
+            elif value in self.failed:
+                # Resolved as missing: probed for the grace period, as skipped ids
+                self.failed.discard(value)
+                if value in self.recheck:
+                    self.recheck[value].until = now + self.grace
+            if value in self.recheck:
+                self.recheck[value].backoff(now)
+
+        if found:
+            frontier = max(self.frontier, *found)
+            for value in values:
+                if value not in found and value < frontier and value not in self.recheck:
+                    self.recheck[value] = Recheck(
+                        now + self.grace, now + self.min_interval, self.min_interval
+                    )
+            self.frontier = frontier
+        # Failed ids below the frontier would never be probed again otherwise
+        for value in failed:
+            if value < self.frontier and value not in self.recheck:
+                self.recheck[value] = Recheck(
+                    float("inf"), now + self.min_interval, self.min_interval
+                )
+            elif value in self.recheck:
+                self.recheck[value].until = float("inf")
+
+        if not found or failed:
+            self.interval = min(self.max_interval, max(self.interval, self.min_interval) * 2)
+        elif self.frontier >= window[-1] - self.lookahead // 4:
+            self.interval = 0.0
+        else:
+            self.interval = self.min_interval
+        return records
+
+    def durable_frontier(self) -> int:
+        """Numerical value of the newest id found, below the oldest id whose probe failed"""
+        return min([self.frontier, *(value - 1 for value in self.failed)])
+
+    async def run(self, max_polls: Optional[int] = None) -> AsyncIterator[List]:
+        """Yield the records of every poll, possibly none, forever or for `max_polls` polls"""
+        polls = 0
+        while max_polls is None or polls < max_polls:
+            yield await self.poll()
+            polls += 1
+            if max_polls is None or polls < max_polls:
+                await asyncio.sleep(self.interval)
+
+    async def follow(
+        self,
+        sink: Sink,
+        watermark: Watermark,
+        commit_interval: float = 60.0,
+        max_polls: Optional[int] = None,
+    ) -> None:
+        """
+        Write the new records to `sink`, and advance `watermark` once they are durable.
+        The sink is committed at least every `commit_interval` seconds with new records.
+        """
+        sink.on_commit.append(watermark.commit)
+        last_commit = time.monotonic()
+        async with sink:
+            async for records in self.run(max_polls):
+                for record in records:
+                    await sink.awrite(record)
+                watermark.advance(VideoId.from_numerical(self.durable_frontier()))
+                if watermark.pending and time.monotonic() - last_commit >= commit_interval:
+                    await sink.acommit()
+                    last_commit = time.monotonic()
@@ -0,0 +1,299 @@
+import mmap
+import os
+import struct
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from crawler.callbacks.base import CallBack
+from crawler.records import record_id
+from crawler.responses import ResponseContext
+from crawler.videos import VideoId, VideoIdGenerator
+
+
+class IdIndex:
+    """
+    Compact on-disk index of resolved video ids, memory-mapped from a single file.
+
+    Ids are dense integers, so the index keeps one bit per `VideoId.numerical_value` for
+    "fetched" and one for "known missing" (code 2002): 100M ids fit in 40MB. Missing ids
+    are re-checked after a TTL at the granularity of blocks of `block_size` ids: a block
+    keeps the oldest probe time of its missing ids. Re-probes of its missing ids make a
+    round, tracked by a third bitmap, and the block time only advances to the start of the
+    round once the round has re-probed every one of them.
+
+    Args:
+        path: Location of the index file, created if needed
+        capacity: Initial number of ids covered, grown on demand (default = 2**27)
+        block_size: Number of ids sharing a probe time, a multiple of 8 (default = 4096)
+
+    Examples:
+        >>> index = IdIndex("ids.idx")
+        >>> index.mark_missing(VideoId("1231"))
+        >>> index.is_resolved(VideoId("1231"))
+        True
+
+        >>> index.is_resolved(VideoId("1231"), missing_ttl=0)
+        False
+    """
+
+    MAGIC = b"XYZIDX02"
+    # Files of version 1 lack the re-probe bitmap and round times, appended in version 2
+    MAGIC_V1 = b"XYZIDX01"
+    HEADER = struct.Struct("<8sQQ")
+    HEADER_SIZE = 64
+    # Bitmaps and block times of the file, in order
+    FETCHED, MISSING, PROBED_AT, REPROBED, ROUND_AT = range(5)
+
+    def __init__(self, path: str, capacity: int = 2**27, block_size: int = 4096) -> None:
+        self.path = path
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        self.file = open(path, "r+b" if exists else "w+b")
+        if exists:
+            header = self.file.read(self.HEADER.size)
+            magic, self.capacity, self.block_size = self.HEADER.unpack(header)
+            if magic not in (self.MAGIC, self.MAGIC_V1):
+                raise ValueError(f"{path} is not an id index.")
+            if magic == self.MAGIC_V1:
+                self.file.truncate(self._file_size(self.capacity))
+                self.file.seek(0)
+                self.file.write(self.HEADER.pack(self.MAGIC, self.capacity, self.block_size))
+                self.file.flush()
+        else:
+            if block_size % 8:
+                raise ValueError(f"block_size must be a multiple of 8, got {block_size}.")
+            self.block_size = block_size
+            self.capacity = self._round(capacity)
+            self.file.truncate(self._file_size(self.capacity))
+            self.file.write(self.HEADER.pack(self.MAGIC, self.capacity, self.block_size))
+            self.file.flush()
+        self.map = mmap.mmap(self.file.fileno(), 0)
+
+    def _round(self, capacity: int) -> int:
+        return -(-capacity // (8 * self.block_size)) * 8 * self.block_size
+
+    def _sizes(self, capacity: int) -> List[int]:
+        """Sizes of the fetched, missing and re-probed bitmaps and of the block times"""
+        bitmap, times = capacity // 8, 4 * (capacity // self.block_size)
+        return [bitmap, bitmap, times, bitmap, times]
+
+    def _file_size(self, capacity: int) -> int:
+        return self.HEADER_SIZE + sum(self._sizes(capacity))
+
+    def _offsets(self, capacity: int) -> List[int]:
+        """Offsets of the fetched, missing and re-probed bitmaps and of the block times"""
+        offsets = [self.HEADER_SIZE]
+        for size in self._sizes(capacity)[:-1]:
+            offsets.append(offsets[-1] + size)
+        return offsets
+
+    def _grow(self, value: int) -> None:
+        capacity = self.capacity
+        while capacity <= value:
+            capacity *= 2
+        old = self.map[:]
+        old_offsets, new_offsets = self._offsets(self.capacity), self._offsets(capacity)
+        sizes = self._sizes(self.capacity)
+
+        self.map.close()
+        self.file.truncate(self._file_size(capacity))
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.map[self.HEADER_SIZE :] = bytes(len(self.map) - self.HEADER_SIZE)
+        for old_offset, new_offset, size in zip(old_offsets, new_offsets, sizes):
+            self.map[new_offset : new_offset + size] = old[old_offset : old_offset + size]
+        self.map[: self.HEADER.size] = self.HEADER.pack(self.MAGIC, capacity, self.block_size)
+        self.capacity = capacity
+
+    def _get(self, bitmap: int, value: int) -> bool:
+        if value >= self.capacity:
+            return False
+        offset = self._offsets(self.capacity)[bitmap] + value // 8
+        return bool(self.map[offset] & (1 << (value % 8)))
+
+    def _set(self, bitmap: int, value: int, bit: bool) -> None:
+        if value >= self.capacity:
+            self._grow(value)
+        offset = self._offsets(self.capacity)[bitmap] + value // 8
+        if bit:
+            self.map[offset] |= 1 << (value % 8)
+        else:
+            self.map[offset] &= ~(1 << (value % 8)) & 0xFF
+
+    def _time_offset(self, times: int, value: int) -> int:
+        return self._offsets(self.capacity)[times] + 4 * (value // self.block_size)
+
+    def _time(self, times: int, value: int) -> int:
+        return struct.unpack_from("<I", self.map, self._time_offset(times, value))[0]
+
+    def _set_time(self, times: int, value: int, seconds: int) -> None:
+        struct.pack_into("<I", self.map, self._time_offset(times, value), seconds)
+
+    def _block_bits(self, bitmap: int, value: int) -> int:
+        """Bits of the block of `value` in `bitmap`, as an integer"""
+        offset = self._offsets(self.capacity)[bitmap] + value // self.block_size * (
+            self.block_size // 8
+        )
+        return int.from_bytes(self.map[offset : offset + self.block_size // 8], "little")
+
+    def _clear_block(self, bitmap: int, value: int) -> None:
+        offset = self._offsets(self.capacity)[bitmap] + value // self.block_size * (
+            self.block_size // 8
+        )
+        self.map[offset : offset + self.block_size // 8] = bytes(self.block_size // 8)
+
+    def _probed(self, value: int, again: bool) -> None:
+        """
+        Account for a probe of `value` in the probe time of its block: `again` if it was known
+        missing, so that the probe re-checks it
+        """
+        now = int(time.time())
+        missing = self._block_bits(self.MISSING, value)
+        if not missing:
+            # No missing id left in the block
+            self._set_time(self.PROBED_AT, value, 0)
+            self._set_time(self.ROUND_AT, value, 0)
+            self._clear_block(self.REPROBED, value)
+            return
+        if not self._time(self.PROBED_AT, value):
+            self._set_time(self.PROBED_AT, value, now)
+            return
+        # A new missing id out of a round was probed after the block's oldest probe: it keeps
+        # the block time. Others join the round, their probe being at least as recent as it.
+        round_at = self._time(self.ROUND_AT, value)
+        if self._get(self.MISSING, value) and (again or round_at):
+            if not round_at:
+                round_at = now
+                self._set_time(self.ROUND_AT, value, now)
+            self._set(self.REPROBED, value, True)
+        if round_at and not missing & ~self._block_bits(self.REPROBED, value):
+            # Every missing id was probed since the round started: that is the oldest probe
+            self._set_time(self.PROBED_AT, value, round_at)
+            self._set_time(self.ROUND_AT, value, 0)
+            self._clear_block(self.REPROBED, value)
+
+    def is_fetched(self, video_id: VideoId) -> bool:
+        return self._get(0, video_id.numerical_value)
+
+    def is_missing(self, video_id: VideoId) -> bool:
+        return self._get(1, video_id.numerical_value)
+
+    def is_resolved(self, video_id: VideoId, missing_ttl: Optional[float] = None) -> bool:
+        """Whether `video_id` is fetched, or missing and probed less than `missing_ttl` ago"""
+        value = video_id.numerical_value
+        if self._get(self.FETCHED, value):
+            return True
+        if not self._get(self.MISSING, value):
+            return False
+        if missing_ttl is None or time.time() - self._time(self.PROBED_AT, value) < missing_ttl:
+            return True
+        # The block is stale, but this id may have been probed again in the current round
+        return (
+            self._get(self.REPROBED, value)
+            and time.time() - self._time(self.ROUND_AT, value) < missing_ttl
+        )
+
+    def mark_fetched(self, video_id: VideoId) -> None:
+        value = video_id.numerical_value
+        was_missing = self._get(self.MISSING, value)
+        self._set(self.FETCHED, value, True)
+        self._set(self.MISSING, value, False)
+        self._set(self.REPROBED, value, False)
+        if was_missing:
+            self._probed(value, again=True)
+
+    def mark_missing(self, video_id: VideoId) -> None:
+        value = video_id.numerical_value
+        again = self._get(self.MISSING, value)
+        self._set(self.MISSING, value, True)
+        self._set(self.FETCHED, value, False)
+        self._probed(value, again)
+
+    def filter(
+        self,
+        generator: VideoIdGenerator,
+        missing_ttl: Optional[float] = None,
+        on_skip: Optional[Callable[[VideoId], None]] = None,
+    ) -> "UnresolvedIdGenerator":
+        """Wrap `generator` to skip ids already resolved"""
+        return UnresolvedIdGenerator(generator, self, missing_ttl=missing_ttl, on_skip=on_skip)
+
+    def flush(self) -> None:
+        self.map.flush()
+
+    def close(self) -> None:
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+
+    def __enter__(self) -> "IdIndex":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class UnresolvedIdGenerator(VideoIdGenerator):
+    """
+    VideoIdGenerator skipping the ids of `generator` already resolved in `index`
+
+    Args:
+        generator: The generator to filter
+        index: Index of resolved ids
+        missing_ttl: Seconds after which known missing ids are probed again (default = never)
+        on_skip: Called with each skipped id, eg. to mark it done in a `CrawlJournal`
+    """
+
+    def __init__(
+        self,
+        generator: VideoIdGenerator,
+        index: IdIndex,
+        missing_ttl: Optional[float] = None,
+        on_skip: Optional[Callable[[VideoId], None]] = None,
+    ) -> None:
+        self.generator = generator
+        self.index = index
+        self.missing_ttl = missing_ttl
+        self.on_skip = on_skip
+        self.limit = getattr(generator, "limit", None)
+        self.skipped = 0
+
+    def __next__(self) -> VideoId:
+        while True:
+            video_id = next(self.generator)
+            if not self.index.is_resolved(video_id, missing_ttl=self.missing_ttl):
+                return video_id
+            self.skipped += 1
+            self.generator.feedback(video_id, found=self.index.is_fetched(video_id))
+            if self.on_skip:
+                self.on_skip(video_id)
+
+    def feedback(self, video_id: VideoId, found: bool) -> None:
+        self.generator.feedback(video_id, found)
+
+
+class IndexCallback(CallBack):
+    """
+    Record crawled ids in `index`.
+
+    Missing ids are recorded right away. Fetched ids are collected by `mark_record`, an
+    `on_write` callback of the sink, and recorded on `commit`, once their records are durably
+    written: an id whose record failed or was lost is never indexed.
+    Must come after the stopping callbacks, so that ids stopping the crawl are not recorded.
+    """
+
+    def __init__(self, index: IdIndex) -> None:
+        self.index = index
+        self.pending: List[VideoId] = []
+
+    def on_response(self, context: ResponseContext) -> Any:
+        if context.payload.get("code") == 2002:
+            self.index.mark_missing(VideoId(context.params["video_id"]))
+
+    def mark_record(self, record: Dict) -> None:
+        """Collect the id of `record`, accepted by the sink"""
+        self.pending.append(VideoId(record_id(record)))
+
+    def commit(self) -> None:
+        for video_id in self.pending:
+            self.index.mark_fetched(video_id)
+        self.pending = []
+        self.index.flush()
@@ -0,0 +1,467 @@
+import json
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from crawler.concurrency import Limiter
+from crawler.responses import ResponseContext
+from crawler.retry import CircuitBreaker, RetryPolicy
+
+
+# Upper bounds of the request latency buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Upper bounds of the record processing time buckets, in seconds
+PROCESS_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 5e-3, 1e-2)
+
+
+class Histogram:
+    """
+    Counts of observed values in fixed buckets, as Prometheus histograms.
+
+    Args:
+        buckets: Sorted upper bounds of the buckets, the last one being implicitly +Inf
+
+    Example:
+        >>> histogram = Histogram((0.1, 1.0))
+        >>> histogram.observe(0.3)
+        >>> histogram.quantile(0.5)
+        1.0
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[float, int]]:
+        """`(upper bound, count of values below it)` of every bucket, ending with +Inf"""
+        total, result = 0, []
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket of the `q` quantile, None if nothing was observed"""
+        if not self.count:
+            return None
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return bound
+        return float("inf")
+
+
+class Throughput:
+    """
+    Rate of events over the last `window` seconds, counted in one second slots.
+
+    Args:
+        window: Seconds averaged over (default = 10)
+
+    Example:
+        >>> throughput = Throughput()
+        >>> throughput.add()
+        >>> throughput.rate()
+        1.0
+    """
+
+    def __init__(self, window: int = 10) -> None:
+        self.window = window
+        self.started_at = time.monotonic()
+        self.seconds = [-1] * window
+        self.counts = [0] * window
+
+    def add(self, now: Optional[float] = None) -> None:
+        second = int(time.monotonic() if now is None else now)
+        slot = second % self.window
+        if self.seconds[slot] != second:
+            self.seconds[slot], self.counts[slot] = second, 0
+        self.counts[slot] += 1
+
+    def rate(self, now: Optional[float] = None) -> float:
+        """Events per second, over the window or the time since started if shorter"""
+        now = time.monotonic() if now is None else now
+        second = int(now)
+        total = sum(
+            count
+            for slot_second, count in zip(list(self.seconds), list(self.counts))
+            if second - self.window < slot_second <= second
+        )
+        return total / max(1.0, min(self.window, now - self.started_at))
+
+
+class Metrics:
+    """
+    Runtime metrics of the crawlers and thumbnail downloaders sharing it.
+
+    Requests are measured by client, eg. "api" or "thumbnails": latency, in-flight count,
+    requests per second over the last 10 seconds, bytes received, HTTP statuses, xyz api
+    codes and, with `Connections`, time spent waiting for a pool connection, connecting and
+    waiting on the server. Metrics also keep the time spent turning payloads into records,
+    the retries and circuit breakers of the watched retry policies, and the limit and slots
+    in use of the watched concurrency limiters. Updates are plain counter increments, cheap
+    enough to stay enabled at any rate.
+
+    Export them with `MetricsServer` (Prometheus) or `MetricsLog` (JSON lines).
+
+    Example:
+        >>> metrics = Metrics()
+        >>> crawler = AsyncCrawler(metrics=metrics)
+        >>> print(metrics.prometheus())
+        # TYPE crawler_requests_total counter
+        crawler_requests_total{client="api",status="200"} 1234
+        ...
+    """
+
+    def __init__(self) -> None:
+        self.started_at = time.time()
+        self.latency: Dict[str, Histogram] = defaultdict(Histogram)
+        self.statuses: Counter = Counter()
+        self.codes: Counter = Counter()
+        self.errors: Counter = Counter()
+        self.bytes: Counter = Counter()
+        self.in_flight: Counter = Counter()
+        self.throughput: Dict[str, Throughput] = defaultdict(Throughput)
+        self.phases: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+        self.process = Histogram(PROCESS_BUCKETS)
+        self.retry_policies: List[RetryPolicy] = []
+        self.limiters: Dict[str, Limiter] = {}
+
+    @contextmanager
+    def measure(self, client: str) -> Iterator[None]:
+        """Count a request of `client` in flight, and as an error if it raises"""
+        self.in_flight[client] += 1
+        try:
+            yield
+        except Exception:
+            self.errors[client] += 1
+            self.throughput[client].add()
+            raise
+        finally:
+            self.in_flight[client] -= 1
+
+    def observe(self, client: str, status: int, elapsed: float, size: int) -> None:
+        """Record a response of `client`"""
+        self.latency[client].observe(elapsed)
+        self.statuses[client, status] += 1
+        self.bytes[client] += size
+        self.throughput[client].add()
+
+    def observe_phases(self, client: str, phases: Dict[str, float]) -> None:
+        """Record the seconds of the phases of a request of `client`, eg. {"pool_wait": 0.1}"""
+        for phase, seconds in phases.items():
+            self.phases[client, phase].observe(seconds)
+
+    def observe_context(self, context: ResponseContext) -> None:
+        """Record a response of the api, and its `code` ("ok" if none)"""
+        response = context.response
+        self.observe("api", response.status_code, context.elapsed or 0.0, len(response.content))
+        try:
+            code = context.payload.get("code") or "ok"
+        except (ValueError, AttributeError):
+            code = "invalid"
+        self.codes[code] += 1
+
+    def observe_process(self, seconds: float) -> None:
+        self.process.observe(seconds)
+
+    def watch(self, retry_policy: RetryPolicy) -> None:
+        """Report the retries and circuit breaker of `retry_policy`"""
+        if retry_policy not in self.retry_policies:
+            self.retry_policies.append(retry_policy)
+
+    def watch_limiter(self, client: str, limiter: Limiter) -> None:
+        """Report the concurrency limit of `client` adjusted by `limiter`"""
+        self.limiters[client] = limiter
+
+    def requests(self) -> int:
+        return sum(dict(self.statuses).values()) + sum(dict(self.errors).values())
+
+    def retries(self) -> Counter:
+        retries: Counter = Counter()
+        for policy in self.retry_policies:
+            retries.update(dict(policy.retries))
+        return retries
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current values, as a JSON serializable dict"""
+        now = time.time()
+        return {
+            "time": now,
+            "uptime": now - self.started_at,
+            "requests": self.requests(),
+            "in_flight": dict(self.in_flight),
+            "requests_per_second": {
+                client: throughput.rate() for client, throughput in dict(self.throughput).items()
+            },
+            "bytes": dict(self.bytes),
+            "statuses": {f"{client}:{status}": n for (client, status), n in self.statuses.items()},
+            "codes": {str(code): n for code, n in self.codes.items()},
+            "errors": dict(self.errors),
+            "latency": {
+                client: {
+                    "count": histogram.count,
+                    "mean": histogram.sum / histogram.count if histogram.count else None,
+                    "p50": histogram.quantile(0.5),
+                    "p99": histogram.quantile(0.99),
+                }
+                for client, histogram in dict(self.latency).items()
+            },
+            "phases": {
+                f"{client}:{phase}": {
+                    "count": histogram.count,
+                    "mean": histogram.sum / histogram.count,
+                    "p99": histogram.quantile(0.99),
+                }
+                for (client, phase), histogram in dict(self.phases).items()
+            },
+            "process": {
+                "count": self.process.count,
+                "seconds": self.process.sum,
+                "p99": self.process.quantile(0.99),
+            },
+            "concurrency": {
+                client: {"limit": limiter.limit, "in_flight": limiter.in_flight}
+                for client, limiter in dict(self.limiters).items()
+            },
+            "retries": dict(self.retries()),
+            "retries_exhausted": sum(policy.exhausted for policy in self.retry_policies),
+            "breakers_open": self.breakers_open(),
+        }
+
+    def breakers_open(self) -> int:
+        return sum(policy.breaker.state != CircuitBreaker.CLOSED for policy in self.retry_policies)
+
+    def prometheus(self) -> str:
+        """Current values, in the Prometheus text exposition format"""
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help: str, samples: List[Tuple[str, Any]]) -> None:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(f"{name}{labels} {value}" for labels, value in samples)
+
+        metric(
+            "crawler_requests_total",
+            "counter",
+            "Responses received, by client and HTTP status.",
+            [
+                (labels(client=client, status=status), n)
+                for (client, status), n in sorted(dict(self.statuses).items(), key=str)
+            ],
+        )
+        metric(
+            "crawler_request_errors_total",
+            "counter",
+            "Requests failed without a response.",
+            [(labels(client=client), n) for client, n in sorted(dict(self.errors).items())],
+        )
+        metric(
+            "crawler_requests_in_flight",
+            "gauge",
+            "Requests waiting for their response.",
+            [(labels(client=client), n) for client, n in sorted(dict(self.in_flight).items())],
+        )
+        metric(
+            "crawler_requests_per_second",
+            "gauge",
+            "Requests completed per second, over the last 10 seconds.",
+            [
+                (labels(client=client), throughput.rate())
+                for client, throughput in sorted(dict(self.throughput).items())
+            ],
+        )
+        metric(
+            "crawler_received_bytes_total",
+            "counter",
+            "Bytes of the response bodies.",
+            [(labels(client=client), n) for client, n in sorted(dict(self.bytes).items())],
+        )
+        metric(
+            "crawler_api_codes_total",
+            "counter",
+            "Api responses, by payload code.",
+            [(labels(code=code), n) for code, n in sorted(dict(self.codes).items(), key=str)],
+        )
+        lines.append("# HELP crawler_request_duration_seconds Latency of the requests.")
+        lines.append("# TYPE crawler_request_duration_seconds histogram")
+        for client, histogram in sorted(dict(self.latency).items()):
+            lines.extend(
+                histogram_lines("crawler_request_duration_seconds", histogram, client=client)
+            )
+        lines.append(
+            "# HELP crawler_request_phase_seconds Time waiting for a pool connection (pool_wait), "
+            "connecting (connect) and from sending the request to its response headers (server)."
+        )
+        lines.append("# TYPE crawler_request_phase_seconds histogram")
+        for (client, phase), histogram in sorted(dict(self.phases).items()):
+            lines.extend(
+                histogram_lines(
+                    "crawler_request_phase_seconds", histogram, client=client, phase=phase
+                )
+            )
+        lines.append("# HELP crawler_process_duration_seconds Time turning payloads into records.")
+        lines.append("# TYPE crawler_process_duration_seconds histogram")
+        lines.extend(histogram_lines("crawler_process_duration_seconds", self.process))
+        limiters = sorted(dict(self.limiters).items())
+        metric(
+            "crawler_concurrency_limit",
+            "gauge",
+            "Concurrent requests allowed by the limiter.",
+            [(labels(client=client), limiter.limit) for client, limiter in limiters],
+        )
+        metric(
+            "crawler_concurrency_in_flight",
+            "gauge",
+            "Limiter slots held by requests.",
+            [(labels(client=client), limiter.in_flight) for client, limiter in limiters],
+        )
+        metric(
+            "crawler_retries_total",
+            "counter",
+            "Retried requests, by reason.",
+            [(labels(reason=reason), n) for reason, n in sorted(self.retries().items())],
+        )
+        metric(
+            "crawler_retries_exhausted_total",
+            "counter",
+            "Requests failed after their retries.",
+            [("", sum(policy.exhausted for policy in self.retry_policies))],
+        )
+        metric(
+            "crawler_circuit_breakers_open",
+            "gauge",
+            "Circuit breakers pausing requests.",
+            [("", self.breakers_open())],
+        )
+        return "\n".join(lines) + "\n"
+
+
+def labels(**values: Any) -> str:
+    return "{" + ",".join(f'{name}="{value}"' for name, value in values.items()) + "}"
+
+
+def histogram_lines(name: str, histogram: Histogram, **extra: str) -> List[str]:
+    lines = [
+        f"{name}_bucket{labels(**extra, le='+Inf' if bound == float('inf') else bound)} {total}"
+        for bound, total in histogram.cumulative()
+    ]
+    suffix = labels(**extra) if extra else ""
+    lines.append(f"{name}_sum{suffix} {histogram.sum}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
+    return lines
+
+
+class MetricsServer:
+    """
+    Serve `metrics` to Prometheus on `http://host:port/metrics`, from a background thread.
+
+    Args:
+        metrics: Metrics to serve
+        port: Port to listen on, 0 for any free port (see `port` once started)
+        host: Interface to listen on (default = "127.0.0.1")
+
+    Example:
+        >>> with MetricsServer(metrics, port=9100):
+        ...     crawl()
+    """
+
+    def __init__(self, metrics: Metrics, port: int, host: str = "127.0.0.1") -> None:
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.metrics = metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(handler) -> None:
+                if handler.path.split("?")[0] != "/metrics":
+                    handler.send_error(404)
+                    return
+                body = metrics.prometheus().encode()
+                handler.send_response(200)
+                handler.send_header("Content-Type", "text/plain; version=0.0.4")
+                handler.send_header("Content-Length", str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args: Any) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self) -> "MetricsServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self.thread.is_alive():
+            self.server.shutdown()
+        self.server.server_close()
+
+
+class MetricsLog:
+    """
+    Write a JSON line of `metrics` every `interval` seconds, and a last one on close.
+    Lines add the requests per second since the previous line.
+
+    Args:
+        metrics: Metrics to log
+        stream: Text stream of the lines (default = stderr)
+        interval: Seconds between lines (default = 10)
+
+    Example:
+        >>> with open("metrics.jsonl", "a") as f, MetricsLog(metrics, f):
+        ...     crawl()
+    """
+
+    def __init__(
+        self, metrics: Metrics, stream: Optional[TextIO] = None, interval: float = 10.0
+    ) -> None:
+        self.metrics = metrics
+        self.stream = stream or sys.stderr
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.last: Tuple[float, int] = (time.time(), 0)
+
+    def __enter__(self) -> "MetricsLog":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def write(self) -> None:
+        snapshot = self.metrics.snapshot()
+        last_time, last_requests = self.last
+        elapsed = snapshot["time"] - last_time
+        rps = (snapshot["requests"] - last_requests) / elapsed if elapsed > 0 else 0.0
+        self.last = snapshot["time"], snapshot["requests"]
+        self.stream.write(json.dumps({**snapshot, "rps": rps}) + "\n")
+        self.stream.flush()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def close(self) -> None:
+        self.stopped.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.write()
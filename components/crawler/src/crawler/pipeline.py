@@ -0,0 +1,111 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, Optional, Union
+
+import pyarrow as pa
+
+from crawler.core import AsyncCrawler
+from crawler.records import RECORD_SCHEMA, VideoRecord
+from crawler.thumbnails import ThumbnailStore, aThumbnailsContent
+from crawler.videos import VideoIdGenerator
+
+
+# Records enriched with the `Thumbnail.hash` and `Thumbnail.base64` of each of their thumbs
+ENRICHED_SCHEMA = RECORD_SCHEMA.append(pa.field("thumbs_hash", pa.list_(pa.string()))).append(
+    pa.field("thumbs_base64", pa.list_(pa.string()))
+)
+
+_DONE = object()
+
+
+class EnrichPipeline:
+    """
+    Crawl records and download their thumbnails at the same time.
+
+    The crawler feeds records into a bounded queue, consumed by `n_enrichers` tasks which
+    store the thumbnails of each record in `store` and attach their hashes and contents.
+    Both stages run concurrently, so the crawl does not wait for thumbnails and thumbnails
+    start with the first record. Full queues block the stage ahead, so neither outruns memory.
+
+    Args:
+        crawler: Crawler of the records
+        thumbnails: Downloader of the thumbnails, with its own concurrency limit
+        store: Store of the thumbnails, shared by the records and across runs
+        queue_size: Capacity of the queues between the stages (default = 100)
+        n_enrichers: Number of records enriched at a time (default = thumbnails max limit)
+        base64: Attach the `base64` content of the thumbnails besides their hash (default = True)
+
+    Example:
+        >>> pipeline = EnrichPipeline(AsyncCrawler(), aThumbnailsContent(), ThumbnailStore("t/"))
+        >>> async for record in pipeline.run(id_generator):
+        ...     record["thumbs_hash"]
+        ["5d41...", ...]
+    """
+
+    def __init__(
+        self,
+        crawler: AsyncCrawler,
+        thumbnails: aThumbnailsContent,
+        store: ThumbnailStore,
+        queue_size: int = 100,
+        n_enrichers: Optional[int] = None,
+        base64: bool = True,
+    ) -> None:
+        self.crawler = crawler
+        self.thumbnails = thumbnails
+        self.store = store
+        self.queue_size = queue_size
+        self.n_enrichers = n_enrichers or thumbnails.limiter.max_limit
+        self.base64 = base64
+
+    async def enrich(self, record: Union[VideoRecord, Dict[str, Any]]) -> Dict[str, Any]:
+        """`record` as a dict, with the hash and base64 content of its thumbs (None if failed)"""
+        record = record.to_dict() if isinstance(record, VideoRecord) else dict(record)
+        stored = await asyncio.gather(
+            *(self.thumbnails.fetch(url, self.store) for url in record["thumbs"])
+        )
+        hashes = [thumbnail.hash if thumbnail else None for thumbnail in stored]
+        record["thumbs_hash"] = hashes
+        record["thumbs_base64"] = [
+            self.store.thumbnail(hash).base64 if hash and self.base64 else None for hash in hashes
+        ]
+        return record
+
+    async def run(self, id_generator: VideoIdGenerator) -> AsyncIterator[Dict[str, Any]]:
+        """Yield enriched records as they complete"""
+        records: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        enriched: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+
+        async def crawl() -> None:
+            try:
+                async for record in self.crawler.iter_crawl(id_generator):
+                    await records.put(record)
+            except Exception as err:
+                await enriched.put(err)
+            for _ in range(self.n_enrichers):
+                await records.put(_DONE)
+
+        async def enrich() -> None:
+            while (record := await records.get()) is not _DONE:
+                try:
+                    await enriched.put(await self.enrich(record))
+                except Exception as err:
+                    await enriched.put(err)
+                    return
+            await enriched.put(_DONE)
+
+        tasks = [asyncio.create_task(crawl())]
+        tasks.extend(asyncio.create_task(enrich()) for _ in range(self.n_enrichers))
+        try:
+            running = self.n_enrichers
+            while running:
+                output = await enriched.get()
+                if output is _DONE:
+                    running -= 1
+                elif isinstance(output, Exception):
+                    raise output
+                else:
+                    yield output
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,108 @@
+import asyncio
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_DONE = object()
+
+
+class WorkerPool:
+    """
+    Fixed number of asyncio workers mapping a coroutine function over a (possibly unbounded)
+    iterable.
+
+    Items are pulled lazily from the iterable through a bounded queue, so the number of
+    items alive at any time does not depend on the length of the iterable.
+
+    Args:
+        n_workers: Number of concurrent workers (default = 50)
+        queue_size: Capacity of the pending items queue and of the results queue
+            (default = n_workers)
+
+    Example:
+        >>> async for video_id, payload in WorkerPool(n_workers=50).imap(fetch, id_generator):
+        ...     ...
+    """
+
+    def __init__(self, n_workers: int = 50, queue_size: Optional[int] = None) -> None:
+        self.n_workers = n_workers
+        self.queue_size = queue_size or n_workers
+
+    async def imap(
+        self, func: Callable[[T], Awaitable[R]], items: Iterable[T], ordered: bool = False
+    ) -> AsyncIterator[Tuple[T, R]]:
+        """
+        Yield (item, await func(item)) as they complete, or in items order if `ordered`.
+
+        In ordered mode, completed results wait in a reorder buffer for their predecessors,
+        and no new item is pulled while `n_workers + 2 * queue_size` items are not yielded yet.
+        Errors are raised as soon as they occur, whatever the order. Pending work is cancelled
+        on exit.
+        """
+        inputs: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        outputs: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        window = asyncio.Semaphore(self.n_workers + 2 * self.queue_size)
+
+        async def feed() -> None:
+            try:
+                for index, item in enumerate(items):
+                    if ordered:
+                        await window.acquire()
+                    await inputs.put((index, item))
+            except Exception as err:
+                await outputs.put((None, None, None, err))
+            for _ in range(self.n_workers):
+                await inputs.put(_DONE)
+
+        async def work() -> None:
+            while (entry := await inputs.get()) is not _DONE:
+                index, item = entry
+                try:
+                    result = await func(item)
+                except Exception as err:
+                    await outputs.put((index, item, None, err))
+                    return
+                await outputs.put((index, item, result, None))
+            await outputs.put(_DONE)
+
+        tasks = [asyncio.create_task(feed())]
+        tasks.extend(asyncio.create_task(work()) for _ in range(self.n_workers))
+        try:
+            running = self.n_workers
+            reorder_buffer: Dict[int, Tuple[T, R]] = {}
+            next_index = 0
+            while running:
+                output: Any = await outputs.get()
+                if output is _DONE:
+                    running -= 1
+                    continue
+
+                index, item, result, error = output
+                if error is not None:
+                    raise error
+                if not ordered:
+                    yield item, result
+                    continue
+
+                reorder_buffer[index] = (item, result)
+                while next_index in reorder_buffer:
+                    item, result = reorder_buffer.pop(next_index)
+                    next_index += 1
+                    window.release()
+                    yield item, result
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
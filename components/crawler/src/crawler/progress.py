@@ -0,0 +1,39 @@
+from typing import AsyncIterable, AsyncIterator, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+
+async def atrack(
+    sequence: AsyncIterable[T],
+    description: str = "Working...",
+    total: Optional[float] = None,
+    disable: bool = False,
+) -> AsyncIterator[T]:
+    """
+    Asynchronous counterpart of `rich.progress.track`, for async iterators of unknown length.
+    If `disable`, items are passed through without any rendering, eg. in headless containers.
+    """
+    if disable:
+        async for item in sequence:
+            yield item
+        return
+    from rich.progress import (
+        BarColumn,
+        Progress,
+        TaskProgressColumn,
+        TextColumn,
+        TimeRemainingColumn,
+    )
+
+    progress = Progress(
+        TextColumn("[progress.description]{task.description}"),
+        BarColumn(),
+        TaskProgressColumn(show_speed=True),
+        TimeRemainingColumn(elapsed_when_finished=True),
+    )
+    with progress:
+        task = progress.add_task(description, total=total)
+        async for item in sequence:
+            yield item
+            progress.advance(task)
@@ -0,0 +1,199 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Iterator, Optional, Tuple
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds to wait from a `Retry-After` header, given either as seconds or as an HTTP date.
+
+    Examples:
+        >>> parse_retry_after("120")
+        120.0
+
+        >>> parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT")
+        0.0
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class BucketState:
+    tokens: float
+    updated_at: float
+    blocked_until: float = 0.0
+
+
+class RateLimiter:
+    """
+    Abstract token bucket: allows `rate` requests per second on average, with bursts
+    of up to `burst` requests. Backends only define how the bucket state is stored.
+
+    Args:
+        rate: Number of requests per second
+        burst: Capacity of the bucket (default = max(1, rate))
+        penalty: Seconds to block the bucket on a rate limited response without
+            `Retry-After` (default = 1)
+
+    Examples:
+        >>> rate_limiter.wait()  # before a synchronous request
+
+        >>> await rate_limiter.acquire()  # before an asynchronous request
+
+        >>> rate_limiter.penalize(retry_after)  # on a rate limited response
+    """
+
+    def __init__(self, rate: float, burst: Optional[int] = None, penalty: float = 1.0) -> None:
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.penalty = penalty
+
+    def take(self) -> float:
+        """Take a token: return 0 on success, or the number of seconds to wait before retrying"""
+        ...
+
+    async def atake(self) -> float:
+        """`take` from a coroutine. Backends waiting on I/O take off the event loop."""
+        return self.take()
+
+    def penalize(self, seconds: Optional[float] = None) -> None:
+        """Drain the bucket and block it for `seconds` (default = penalty)"""
+        ...
+
+    def wait(self) -> None:
+        while (delay := self.take()) > 0:
+            time.sleep(delay)
+
+    async def acquire(self) -> None:
+        while (delay := await self.atake()) > 0:
+            await asyncio.sleep(delay)
+
+    def _take(self, state: BucketState, now: float) -> Tuple[BucketState, float]:
+        if now < state.blocked_until:
+            return state, state.blocked_until - now
+
+        tokens = min(self.burst, state.tokens + (now - state.updated_at) * self.rate)
+        if tokens >= 1:
+            return BucketState(tokens - 1, now, state.blocked_until), 0.0
+        return BucketState(tokens, now, state.blocked_until), (1 - tokens) / self.rate
+
+    def _penalize(self, state: BucketState, now: float, seconds: Optional[float]) -> BucketState:
+        blocked_until = max(state.blocked_until, now + (seconds or self.penalty))
+        return BucketState(tokens=0.0, updated_at=blocked_until, blocked_until=blocked_until)
+
+
+class TokenBucket(RateLimiter):
+    """In-process token bucket, shared by every crawler and thread holding it"""
+
+    def __init__(self, rate: float, burst: Optional[int] = None, penalty: float = 1.0) -> None:
+        super().__init__(rate=rate, burst=burst, penalty=penalty)
+        self.state = BucketState(tokens=self.burst, updated_at=time.monotonic())
+        self.lock = threading.Lock()
+
+    def take(self) -> float:
+        with self.lock:
+            self.state, delay = self._take(self.state, time.monotonic())
+        return delay
+
+    def penalize(self, seconds: Optional[float] = None) -> None:
+        with self.lock:
+            self.state = self._penalize(self.state, time.monotonic(), seconds)
+
+
+class SQLiteTokenBucket(RateLimiter):
+    """
+    Token bucket stored in a SQLite file, shared by every process of the host using the
+    same `path` and `key`, eg. several `crawl-async` containers mounting the same volume.
+
+    Args:
+        path: Location of the SQLite database
+        rate: Number of requests per second, for all processes together
+        burst: Capacity of the bucket (default = max(1, rate))
+        penalty: Seconds to block the bucket on a rate limited response (default = 1)
+        key: Name of the bucket, eg. the API key it guards (default = "default")
+    """
+
+    def __init__(
+        self,
+        path: str,
+        rate: float,
+        burst: Optional[int] = None,
+        penalty: float = 1.0,
+        key: str = "default",
+    ) -> None:
+        super().__init__(rate=rate, burst=burst, penalty=penalty)
+        self.key = key
+        self.connection = sqlite3.connect(
+            path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS buckets "
+            "(key TEXT PRIMARY KEY, tokens REAL, updated_at REAL, blocked_until REAL)"
+        )
+        self.connection.execute(
+            "INSERT OR IGNORE INTO buckets VALUES (?, ?, ?, 0)", (key, self.burst, time.time())
+        )
+        self.lock = threading.Lock()
+
+    def take(self) -> float:
+        with self.lock, self.transaction() as state:
+            new_state, delay = self._take(state, time.time())
+            self.save(new_state)
+        return delay
+
+    async def atake(self) -> float:
+        # The transaction waits up to 30s for the other processes holding the bucket
+        return await asyncio.to_thread(self.take)
+
+    def penalize(self, seconds: Optional[float] = None) -> None:
+        with self.lock, self.transaction() as state:
+            self.save(self._penalize(state, time.time(), seconds))
+
+    @contextmanager
+    def transaction(self) -> Iterator[BucketState]:
+        """Write-lock the bucket for the duration of a read-modify-write"""
+        self.connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.load()
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        self.connection.execute("COMMIT")
+
+    def load(self) -> BucketState:
+        row = self.connection.execute(
+            "SELECT tokens, updated_at, blocked_until FROM buckets WHERE key = ?", (self.key,)
+        ).fetchone()
+        return BucketState(*row)
+
+    def save(self, state: BucketState) -> None:
+        self.connection.execute(
+            "UPDATE buckets SET tokens = ?, updated_at = ?, blocked_until = ? WHERE key = ?",
+            (state.tokens, state.updated_at, state.blocked_until, self.key),
+        )
+
+
+def build_rate_limiter(
+    rate: Optional[float], burst: Optional[int] = None, state: Optional[str] = None
+) -> Optional[RateLimiter]:
+    """In-process bucket, or bucket shared through the SQLite file `state`. None if no `rate`."""
+    if not rate:
+        return None
+    if state:
+        return SQLiteTokenBucket(state, rate=rate, burst=burst)
+    return TokenBucket(rate=rate, burst=burst)
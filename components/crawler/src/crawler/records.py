@@ -0,0 +1,162 @@
+import sys
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Union
+
+import pendulum
+from pendulum import DateTime
+
+from crawler.transforms import preprocess_crawl_tags
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+
+class RecordValidationError(ValueError):
+    """A `video` payload field that cannot be decoded into its `VideoRecord` field"""
+
+    def __init__(self, name: str, source: str, value: Any, error: Exception) -> None:
+        self.name = name
+        self.source = source
+        self.value = value
+        super().__init__(f"Invalid {source!r} for field {name!r}: {value!r} ({error})")
+
+
+@lru_cache(maxsize=8)
+def parse_datetime(value: str) -> DateTime:
+    """Parse a publish date once for both `published_on` and `published_at`"""
+    return pendulum.parse(value, tz="UTC")
+
+
+def decode_date(value: str) -> str:
+    # Publication days, durations and tags repeat across videos: interned, each is held once
+    return sys.intern(parse_datetime(value).to_date_string())
+
+
+def decode_duration(value: Any) -> Any:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def decode_datetime(value: str) -> str:
+    return parse_datetime(value).to_iso8601_string()
+
+
+def decode_thumbs(value: List[Dict[str, str]]) -> List[str]:
+    return [thumb["src"] for thumb in value]
+
+
+def column(type: str, source: str, decode: Callable[[Any], Any] = lambda value: value) -> Any:
+    """
+    Field of `VideoRecord`: the name of its Arrow `type`, eg. "int64" or "list<string>", and
+    how to `decode` it from the `source` key
+    """
+    return field(metadata={"type": type, "source": source, "decode": decode})
+
+
+def arrow_type(name: str) -> "pa.DataType":
+    """Arrow type of a `column` type name"""
+    import pyarrow as pa
+
+    if name.startswith("list<"):
+        return pa.list_(arrow_type(name[len("list<") : -1]))
+    return getattr(pa, name)()
+
+
+@dataclass(frozen=True, slots=True)
+class VideoRecord:
+    """
+    A video, as crawled. The single schema of records: its fields define how they are decoded
+    from `video` payloads and their Arrow types.
+
+    Slotted records take about 27% less memory than the equivalent dicts (936 against 1280
+    bytes, see benchmarks/bench_records.py), and decoding only reads the payload keys mapped
+    to a field, so the rest of the payload can be freed at once.
+
+    Examples:
+        >>> record = VideoRecord.decode(payload["video"])
+        >>> record.views
+        8920
+
+        >>> VideoRecord.decode({**payload["video"], "views": "many"})
+        RecordValidationError: Invalid 'views' for field 'views': 'many' (invalid literal ...)
+
+        >>> VideoRecord.to_arrow([record]).num_rows
+        1
+    """
+
+    id: str = column("string", "video_id", str)
+    published_on: str = column("string", "publish_date", decode_date)
+    published_at: str = column("string", "publish_date", decode_datetime)
+    title: str = column("string", "title", str)
+    duration: str = column("string", "duration", decode_duration)
+    views: int = column("int64", "views", int)
+    rating: float = column("float64", "rating", float)
+    ratings: int = column("int64", "ratings", int)
+    thumbs: List[str] = column("list<string>", "thumbs", decode_thumbs)
+    tags: List[str] = column("list<string>", "tags", preprocess_crawl_tags)
+    url: str = column("string", "url", str)
+
+    @classmethod
+    def decode(
+        cls,
+        video: Dict[str, Any],
+        process_tags: Callable[[Any], List[str]] = preprocess_crawl_tags,
+    ) -> "VideoRecord":
+        """
+        Decode a `video` payload, raising RecordValidationError on the first invalid field.
+
+        Args:
+            video: `video` payload of either resource
+            process_tags: Tags normalization of the resource (default = preprocess_crawl_tags)
+        """
+        values = []
+        for name, source, decode in COLUMNS:
+            value = video.get(source)
+            try:
+                if source not in video:
+                    raise KeyError("missing from the payload")
+                values.append(process_tags(value) if name == "tags" else decode(value))
+            except (KeyError, TypeError, ValueError, AttributeError) as err:
+                raise RecordValidationError(name, source, value, err) from err
+        return cls(*values)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in NAMES}
+
+    @staticmethod
+    def to_arrow(
+        records: Sequence["VideoRecord"], schema: Optional["pa.Schema"] = None
+    ) -> "pa.RecordBatch":
+        """Columns of `records`, as a RecordBatch of `schema` (default = RECORD_SCHEMA)"""
+        import pyarrow as pa
+
+        schema = schema or record_schema()
+        arrays = [
+            pa.array([getattr(record, name) for record in records], schema.field(name).type)
+            for name in schema.names
+        ]
+        return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+COLUMNS = [(f.name, f.metadata["source"], f.metadata["decode"]) for f in fields(VideoRecord)]
+NAMES = [f.name for f in fields(VideoRecord)]
+
+
+@lru_cache(maxsize=1)
+def record_schema() -> "pa.Schema":
+    """Arrow schema of the records, eg. of Parquet outputs"""
+    import pyarrow as pa
+
+    return pa.schema([(f.name, arrow_type(f.metadata["type"])) for f in fields(VideoRecord)])
+
+
+def record_id(record: Union[VideoRecord, Dict[str, Any]]) -> str:
+    """Video id of a typed or dict record"""
+    return record.id if isinstance(record, VideoRecord) else record["id"]
+
+
+def __getattr__(name: str) -> Any:
+    # RECORD_SCHEMA is built on first use: crawling and printing records never import pyarrow
+    if name == "RECORD_SCHEMA":
+        return record_schema()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,56 @@
+import json
+from functools import cached_property
+from typing import Any, Dict, Optional
+
+from httpx import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def loads(content: bytes) -> Any:
+    """Decode JSON with orjson when installed, falling back to the standard library"""
+    return orjson.loads(content) if orjson else json.loads(content)
+
+
+class ResponseContext:
+    """
+    A response of the xyz api, decoded once and shared by the whole callback chain.
+
+    Args:
+        response: The raw httpx response
+        elapsed: Seconds spent waiting for the response
+        payload: Already decoded payload, if any. Otherwise `content` is decoded on first access.
+        params: Query parameters of the request, eg. its `video_id`
+
+    Examples:
+        >>> context = ResponseContext(response, elapsed=0.12)
+        >>> context.payload
+        {"video": {...}}
+
+        >>> context.content
+        b'{"video": {...}}'
+    """
+
+    def __init__(
+        self,
+        response: Response,
+        elapsed: Optional[float] = None,
+        payload: Optional[Dict[str, Any]] = None,
+        params: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        self.response = response
+        self.elapsed = elapsed
+        self.params = params or {}
+        if payload is not None:
+            self.payload = payload
+
+    @property
+    def content(self) -> bytes:
+        return self.response.content
+
+    @cached_property
+    def payload(self) -> Dict[str, Any]:
+        return loads(self.content)
@@ -0,0 +1,340 @@
+import asyncio
+import logging
+import random
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+from crawler.callbacks.stopping import StopCrawlException
+from crawler.ratelimit import parse_retry_after
+from crawler.responses import ResponseContext
+
+
+# Statuses worth retrying: rate limited, or the api failed to answer
+RETRY_STATUSES = frozenset({429, *range(500, 600)})
+
+# Retry reasons telling the api is unhealthy, rather than rate limiting the crawler
+FAILURE_REASONS = frozenset({"transport", "5xx", "decode"})
+
+
+class RetriesExhausted(StopCrawlException):
+    """Raises when a request still fails after its last allowed attempt"""
+
+    def __init__(self, msg: str, reason: str, *args: object) -> None:
+        super().__init__(msg, *args)
+        self.reason = reason
+
+
+def classify(
+    context: Optional[ResponseContext] = None, error: Optional[BaseException] = None
+) -> Optional[str]:
+    """
+    Reason to retry a request from its response `context` or its `error`, None if final.
+
+    Transport errors, 429 and 5xx statuses, undecodable payloads and code 1005 are retried.
+    Anything else is final, including "video not found" (code 2002) and unexpected errors.
+
+    Examples:
+        >>> classify(error=httpx.ConnectTimeout("timed out"))
+        'transport'
+
+        >>> classify(ResponseContext(response, payload={"code": 2002}))
+        None
+    """
+    if error is not None:
+        return "transport" if isinstance(error, httpx.TransportError) else None
+    status = context.response.status_code
+    if status in RETRY_STATUSES:
+        return "429" if status == 429 else "5xx"
+    try:
+        payload = context.payload
+    except ValueError:
+        return "decode"
+    if isinstance(payload, dict) and payload.get("code") == 1005:
+        return "1005"
+    return None
+
+
+class RetryBudget:
+    """
+    Retries allowed across all requests, as a `ratio` of the traffic.
+
+    Every request deposits `ratio` of a token, every retry withdraws a whole one. Up to
+    `reserve` tokens are kept, so a few retries are allowed at low traffic, but a failing api
+    makes at most `1 + ratio` times the requests of a healthy one, instead of `max_attempts`.
+
+    Args:
+        ratio: Retries per request allowed on average (default = 0.1)
+        reserve: Retries allowed at once, the capacity of the budget (default = 10)
+
+    Example:
+        >>> budget = RetryBudget(ratio=0.2)
+        >>> budget.deposit()  # on every request
+        >>> budget.withdraw()  # on every retry
+        True
+    """
+
+    def __init__(self, ratio: float = 0.1, reserve: int = 10) -> None:
+        self.ratio = ratio
+        self.reserve = reserve
+        self.tokens = float(reserve)
+
+    def deposit(self) -> None:
+        self.tokens = min(self.reserve, self.tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        """Take a token for a retry: False if the budget is exhausted"""
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+class CircuitBreaker:
+    """
+    Pauses every request while the api is unhealthy.
+
+    The breaker opens after `failure_threshold` consecutive failures: requests then wait for
+    `reset_timeout` seconds, after which a single probe request is let through (half open).
+    Its success closes the breaker, its failure opens it again for twice as long, up to
+    `max_reset_timeout`.
+
+    Args:
+        failure_threshold: Consecutive failures opening the breaker (default = 10)
+        reset_timeout: Seconds before probing the api once opened (default = 30)
+        max_reset_timeout: Upper bound of the doubling reset timeout (default = 300)
+
+    Example:
+        >>> while (delay := breaker.delay()) > 0:
+        ...     time.sleep(delay)
+        >>> breaker.record(healthy=response.status_code < 500)
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = 10,
+        reset_timeout: float = 30.0,
+        max_reset_timeout: float = 300.0,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.timeout = reset_timeout
+        self.opened_at = 0.0
+        self.probed_at = 0.0
+        self.n_opened = 0
+
+    def delay(self) -> float:
+        """Seconds to wait before sending a request, 0 if it may be sent now"""
+        now = time.monotonic()
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.timeout - now
+            if remaining > 0:
+                return remaining
+            self.state = self.HALF_OPEN
+            self.probed_at = now
+            return 0.0
+        if self.state == self.HALF_OPEN:
+            # Wait for the probe, unless it was lost, eg. cancelled
+            if now - self.probed_at < self.reset_timeout:
+                return min(1.0, self.reset_timeout)
+            self.probed_at = now
+        return 0.0
+
+    def record(self, healthy: bool) -> None:
+        """Record the outcome of a request"""
+        if healthy:
+            if self.state != self.CLOSED:
+                logging.warning("Circuit breaker closed: the api is healthy again")
+            self.state = self.CLOSED
+            self.failures = 0
+            self.timeout = self.reset_timeout
+            return
+
+        self.failures += 1
+        if self.state == self.HALF_OPEN:
+            self.open(min(2 * self.timeout, self.max_reset_timeout))
+        elif self.state == self.CLOSED and self.failures >= self.failure_threshold:
+            self.open(self.reset_timeout)
+
+    def open(self, timeout: float) -> None:
+        self.state = self.OPEN
+        self.timeout = timeout
+        self.opened_at = time.monotonic()
+        self.n_opened += 1
+        logging.warning(
+            f"Circuit breaker open after {self.failures} failures: pausing for {timeout:.0f}s"
+        )
+
+
+class RetryPolicy:
+    """
+    Retries of the requests of a crawler, shared by all of them.
+
+    Failed requests (see `classify`) are retried up to `max_attempts` attempts in total, after
+    an exponential backoff with jitter, or after the `Retry-After` of the response. Retries
+    are bounded by `budget` across all requests, and every attempt waits for `breaker`.
+    Once a request is out of attempts or budget, a failure or a 429 raises RetriesExhausted,
+    stopping the crawl, while a code 1005 response is returned to the callbacks.
+
+    Counts of attempts and retries, by reason, and the breaker state are kept for monitoring.
+
+    Args:
+        max_attempts: Attempts per request, including the first one (default = 5)
+        base_delay: Backoff of the first retry in seconds, doubling at every retry (default = 1)
+        max_delay: Upper bound of the backoff and of `Retry-After` in seconds (default = 60)
+        budget: Retry budget (default = RetryBudget())
+        breaker: Circuit breaker (default = CircuitBreaker())
+
+    Examples:
+        >>> policy = RetryPolicy(max_attempts=3, budget=RetryBudget(ratio=0.2))
+        >>> crawler = AsyncCrawler(retry_policy=policy)
+
+        >>> context = policy.call(lambda: send(request))
+        >>> policy.stats()
+        {"requests": 1, "attempts": 2, "retries": {"5xx": 1}, ..., "breaker": "closed"}
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        budget: Optional[RetryBudget] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget or RetryBudget()
+        self.breaker = breaker or CircuitBreaker()
+        self.requests = 0
+        self.attempts = 0
+        self.retries: Counter = Counter()
+        self.exhausted = 0
+        self.budget_denied = 0
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to wait after the failed `attempt`: half fixed, half random"""
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def outcome(
+        self, context: Optional[ResponseContext], error: Optional[BaseException]
+    ) -> Optional[str]:
+        """Classify an attempt, recording the health of the api"""
+        self.attempts += 1
+        reason = classify(context, error)
+        if reason in FAILURE_REASONS:
+            self.breaker.record(healthy=False)
+        elif reason is None:
+            self.breaker.record(healthy=True)
+        return reason
+
+    def retry_delay(
+        self,
+        attempt: int,
+        reason: str,
+        context: Optional[ResponseContext],
+        error: Optional[BaseException],
+    ) -> Optional[float]:
+        """
+        Seconds to wait before retrying the failed `attempt`. If it is not retried, code 1005
+        responses are returned as is (None), for callbacks such as TooManyRequestStopper to
+        handle, while failures and 429 statuses, whose body is no api payload, raise
+        RetriesExhausted.
+        """
+        if attempt >= self.max_attempts:
+            self.exhausted += 1
+            msg = f"Request failed after {attempt} attempts ({reason})."
+        elif not self.budget.withdraw():
+            self.budget_denied += 1
+            msg = f"Retry budget exhausted ({reason})."
+        else:
+            msg = None
+        if msg is not None:
+            if reason != "1005":
+                raise RetriesExhausted(msg, reason) from error
+            return None
+        self.retries[reason] += 1
+
+        retry_after = None
+        if context is not None:
+            retry_after = parse_retry_after(context.response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return self.backoff(attempt)
+
+    def call(self, send: Callable[[], ResponseContext]) -> ResponseContext:
+        """Send a request with `send` until it succeeds or fails for good"""
+        self.requests += 1
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            while (delay := self.breaker.delay()) > 0:
+                time.sleep(delay)
+            context, error = None, None
+            try:
+                context = send()
+            except Exception as err:
+                error = err
+            reason = self.outcome(context, error)
+            if reason is None:
+                if error is not None:
+                    raise error
+                return context
+            delay = self.retry_delay(attempt, reason, context, error)
+            if delay is None:
+                return context
+            time.sleep(delay)
+
+    async def acall(self, send: Callable[[], Awaitable[ResponseContext]]) -> ResponseContext:
+        """Asynchronous `call`"""
+        self.requests += 1
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            while (delay := self.breaker.delay()) > 0:
+                await asyncio.sleep(delay)
+            context, error = None, None
+            try:
+                context = await send()
+            except Exception as err:
+                error = err
+            reason = self.outcome(context, error)
+            if reason is None:
+                if error is not None:
+                    raise error
+                return context
+            delay = self.retry_delay(attempt, reason, context, error)
+            if delay is None:
+                return context
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters of the policy, for monitoring"""
+        return {
+            "requests": self.requests,
+            "attempts": self.attempts,
+            "retries": dict(self.retries),
+            "exhausted": self.exhausted,
+            "budget_denied": self.budget_denied,
+            "budget_tokens": self.budget.tokens,
+            "breaker": self.breaker.state,
+            "breaker_opened": self.breaker.n_opened,
+        }
+
+
+def build_retry_policy(max_attempts: int = 5, retry_budget: float = 0.1) -> RetryPolicy:
+    """Retry policy of `max_attempts` attempts per request, `retry_budget` retries per request"""
+    return RetryPolicy(max_attempts=max_attempts, budget=RetryBudget(ratio=retry_budget))
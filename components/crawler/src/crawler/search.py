@@ -0,0 +1,66 @@
+import itertools
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from crawler.callbacks.stopping import StopCrawlException
+
+# Code of the page after the last one, "No videos found!"
+NO_RESULTS = 2001
+
+
+class SearchPagination:
+    """
+    Early termination and deduplication of the pages of a search.
+
+    Results are read page by page, in page order. The search is `done` once a page is empty,
+    or shorter than the longest page seen so far (or than `page_size`, if known): later pages
+    would be empty. An error page raises StopCrawlException instead, the search being
+    incomplete. Videos shifting to a later page while the search runs are seen twice,
+    and yielded once if `dedupe`.
+
+    Args:
+        page_size: Number of results of a full page (default = longest page seen)
+        dedupe: Skip ids already yielded by a previous page (default = True)
+
+    Example:
+        >>> pagination = SearchPagination()
+        >>> for page in itertools.count(1):
+        ...     videos = pagination.read(request(page))
+        ...     if pagination.done:
+        ...         break
+    """
+
+    def __init__(self, page_size: Optional[int] = None, dedupe: bool = True) -> None:
+        self.page_size = page_size or 0
+        self.dedupe = dedupe
+        self.seen: Set[str] = set()
+        self.done = False
+        self.pages = 0
+        self.duplicates = 0
+
+    def read(self, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """`video` payloads of a search page, updating `done`"""
+        self.pages += 1
+        if "videos" not in payload and payload.get("code") != NO_RESULTS:
+            code, message = payload.get("code"), payload.get("message", "no videos")
+            raise StopCrawlException(f"Search page {self.pages} failed: {message} ({code})")
+        results = payload.get("videos") or []
+        if not results or len(results) < self.page_size:
+            self.done = True
+        self.page_size = max(self.page_size, len(results))
+
+        videos = []
+        for r in results:
+            if r.get("code") == 2002:
+                continue
+            video_id = str(r["video"]["video_id"])
+            if self.dedupe and video_id in self.seen:
+                self.duplicates += 1
+                continue
+            self.seen.add(video_id)
+            videos.append(r["video"])
+        return videos
+
+
+def search_pages(n_pages: Optional[int]) -> Iterable[int]:
+    """Numbers of the first `n_pages` pages, of every page if None"""
+    return itertools.count(1) if n_pages is None else range(1, n_pages + 1)
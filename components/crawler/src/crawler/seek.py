@@ -0,0 +1,158 @@
+from typing import Iterator, Optional, Tuple
+
+import pendulum
+from pendulum import DateTime
+
+from crawler.callbacks.stopping import StopCrawlException
+from crawler.core import Crawler
+from crawler.utils import get_nested
+from crawler.videos import (
+    VideoId,
+    VideoIdAscendingGenerator,
+    VideoIdDescendingGenerator,
+    VideoIdGenerator,
+)
+
+
+class PublicationDateSeeker:
+    """
+    Find the ids bounding a publication date window in a few dozen requests.
+
+    Video ids roughly follow publication time, so the first id published at or after a date
+    is found by galloping down from the newest id, then binary searching `numerical_value`.
+    Ids never published (code 2002) are stepped over by probing up to `hole_radius` nearby ids,
+    then ids at doubling distances for wider holes.
+    Probes bypass the crawler callbacks, so stoppers do not fire while seeking.
+
+    Args:
+        crawler: Crawler sending the probes, within its rate limit
+        hole_radius: Number of ids probed on each side of a missing id (default = 16)
+
+    Examples:
+        >>> seeker = PublicationDateSeeker(Crawler())
+        >>> seeker.range(since=pendulum.parse("2024-01-01"), until=pendulum.parse("2024-01-02"))
+        (10357626, 10361102)
+
+        >>> id_generator = seeker.generator(since=pendulum.parse("2024-01-01"))
+        >>> seeker.probes
+        41
+    """
+
+    def __init__(self, crawler: Crawler, hole_radius: int = 16) -> None:
+        self.crawler = crawler
+        self.hole_radius = hole_radius
+        self.probes = 0
+
+    def request(self, params: dict) -> dict:
+        self.probes += 1
+        payload = self.crawler.request("/", params={**self.crawler.params, **params}).payload
+        if payload.get("code") == 1005:
+            raise StopCrawlException(payload.get("message", "Too many requests."))
+        return payload
+
+    def latest(self) -> int:
+        """Numerical value of the newest id listed by the search resource"""
+        payload = self.request({"data": self.crawler.SEARCH_RESOURCE, "page": 1})
+        return max(
+            VideoId(str(r["video"]["video_id"])).numerical_value
+            for r in payload["videos"]
+            if r.get("code") != 2002
+        )
+
+    def published_at(self, value: int) -> Optional[DateTime]:
+        """Publication date of the video of numerical value `value`, None if missing"""
+        video_id = VideoId.from_numerical(value)
+        params = {"data": self.crawler.VIDEO_BY_ID_RESOURCE, "video_id": str(video_id)}
+        payload = self.request(params)
+        datetime_string = get_nested(payload, ["video", "publish_date"])
+        return pendulum.parse(datetime_string) if datetime_string else None
+
+    def distances(self, value: int, lower: int, upper: int) -> Iterator[int]:
+        """
+        Distances to `value` probed: every one up to `hole_radius`, then doubling ones until
+        both `lower` and `upper` are reached, so that a wider hole is stepped over too
+        """
+        yield from range(self.hole_radius + 1)
+        distance = max(self.hole_radius, 1)
+        while value - distance > lower + 1 or value + distance < upper - 1:
+            distance *= 2
+            yield distance
+        # The ids next to the bounds, missed by the doubling distances
+        yield from (value - lower - 1, upper - 1 - value)
+
+    def probe(self, value: int, lower: int, upper: int) -> Optional[Tuple[int, DateTime]]:
+        """
+        First video found nearest to `value` strictly between `lower` and `upper`, None if
+        none is found: a run of missing ids spans the whole window
+        """
+        probed = set()
+        for distance in self.distances(value, lower, upper):
+            for candidate in (value + distance, value - distance):
+                if lower < candidate < upper and candidate not in probed:
+                    probed.add(candidate)
+                    datetime = self.published_at(candidate)
+                    if datetime is not None:
+                        return candidate, datetime
+        return None
+
+    def seek(self, datetime: DateTime, upper: int) -> int:
+        """
+        Smallest numerical value below `upper` published at or after `datetime`,
+        `upper` itself if none is.
+
+        `lower` only ever moves to a video published before `datetime`: an empty probe is a
+        run of missing ids, never taken for either side of `datetime`.
+        """
+        lower, step = -1, 1
+        while upper - step > 0:
+            found = self.probe(upper - step, lower, upper)
+            if found is None:
+                return upper
+            if found[1] < datetime:
+                lower = found[0]
+                break
+            upper, step = found[0], step * 2
+
+        while upper - lower > 1:
+            found = self.probe((lower + upper) // 2, lower, upper)
+            if found is None:
+                break
+            if found[1] < datetime:
+                lower = found[0]
+            else:
+                upper = found[0]
+        return upper
+
+    def range(
+        self,
+        since: Optional[DateTime] = None,
+        until: Optional[DateTime] = None,
+        upper: Optional[int] = None,
+    ) -> Tuple[int, int]:
+        """
+        Numerical values `(start, stop)` of the ids published in `[since, until)`, `start` included.
+
+        Args:
+            since: Minimum publication datetime. If None, starts from the first id.
+            until: Maximum publication datetime. If None, ends after the newest id.
+            upper: Numerical value known to be published after the window (default = latest + 1)
+        """
+        stop = upper if upper is not None else self.latest() + 1
+        if until:
+            stop = self.seek(until, stop)
+        start = self.seek(since, stop) if since else 0
+        return start, stop
+
+    def generator(
+        self,
+        since: Optional[DateTime] = None,
+        until: Optional[DateTime] = None,
+        ascending: bool = True,
+    ) -> VideoIdGenerator:
+        """Generator over the ids published in `[since, until)`"""
+        start, stop = self.range(since=since, until=until)
+        if stop <= start:
+            raise ValueError("No video published in the requested window.")
+        if ascending:
+            return VideoIdAscendingGenerator(seed=VideoId.from_numerical(start), limit=stop - start)
+        return VideoIdDescendingGenerator(seed=VideoId.from_numerical(stop), limit=stop - start)
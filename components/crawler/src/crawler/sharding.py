@@ -0,0 +1,329 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from multiprocessing.context import BaseContext
+from pathlib import Path
+from typing import Any, List, Optional, Sequence
+
+import pyarrow.parquet as pq
+from rich.progress import BarColumn, Progress, TaskProgressColumn, TextColumn, TimeRemainingColumn
+
+from crawler.callbacks.base import CallBack
+from crawler.callbacks.stopping import StopCrawlException
+from crawler.concurrency import ConcurrencyStrategy, build_limiter
+from crawler.core import AsyncCrawler
+from crawler.ratelimit import build_rate_limiter
+from crawler.responses import ResponseContext
+from crawler.retry import build_retry_policy
+from crawler.sinks import RECORD_SCHEMA, ParquetSink
+from crawler.videos import (
+    VideoId,
+    VideoIdAscendingGenerator,
+    VideoIdDescendingGenerator,
+    VideoIdGenerator,
+    VideoIdSparseGenerator,
+)
+
+
+class VideoIdInterleavedGenerator(VideoIdGenerator):
+    """
+    VideoIdGenerator over every `n_shards`-th id of a range, starting from its `shard`-th id
+
+    Args:
+        seed: The seed VideoId of the range (included if ascending, excluded if descending)
+        limit: The size of the range
+        shard: Rank of the first id of the range generated
+        n_shards: Number of interleaved shards
+        ascending: Direction of the range (default = True)
+
+    Examples:
+
+        >>> generator = VideoIdInterleavedGenerator(VideoId("1231"), limit=6, shard=1, n_shards=2)
+        >>> [video_id.numerical_value for video_id in generator]
+        [124, 126, 128]
+    """
+
+    def __init__(
+        self, seed: VideoId, limit: int, shard: int, n_shards: int, ascending: bool = True
+    ) -> None:
+        self.seed = seed
+        self.shard = shard
+        self.n_shards = n_shards
+        self.ascending = ascending
+        self.limit = len(range(shard, limit, n_shards))
+        self.count = 0
+
+    def __next__(self) -> VideoId:
+        if self.count >= self.limit:
+            raise StopIteration(f"Reached max number of VideoId to generate: {self.limit}")
+        position = self.shard + self.count * self.n_shards
+        self.count += 1
+        if self.ascending:
+            return VideoId.from_numerical(self.seed.numerical_value + position)
+        return VideoId.from_numerical(self.seed.numerical_value - position - 1)
+
+    def __len__(self):
+        return self.limit
+
+
+def split_range(
+    generator: VideoIdAscendingGenerator,
+    n_shards: int,
+    interleaved: bool = False,
+    sparse: bool = False,
+) -> List[VideoIdGenerator]:
+    """
+    Split the bounded range of an ascending or descending generator into `n_shards` generators.
+
+    Contiguous shards keep dense and sparse regions apart, and may be `sparse` themselves.
+    Interleaved shards spread every region over all shards, and progress at the same pace.
+
+    Examples:
+        >>> shards = split_range(VideoIdAscendingGenerator(VideoId("1231"), limit=10), n_shards=3)
+        >>> [[video_id.numerical_value for video_id in shard] for shard in shards]
+        [[123, 124, 125, 126], [127, 128, 129], [130, 131, 132]]
+    """
+    if not generator.limit:
+        raise ValueError("Only bounded ranges can be split into shards.")
+    if interleaved and sparse:
+        raise ValueError("Interleaved shards cannot be sparse.")
+    ascending = not isinstance(generator, VideoIdDescendingGenerator)
+    seed, limit = generator.seed.numerical_value, generator.limit
+    n_shards = min(n_shards, limit)
+
+    if interleaved:
+        return [
+            VideoIdInterleavedGenerator(
+                generator.seed, limit=limit, shard=shard, n_shards=n_shards, ascending=ascending
+            )
+            for shard in range(n_shards)
+        ]
+
+    shards: List[VideoIdGenerator] = []
+    size, remainder = divmod(limit, n_shards)
+    start = 0
+    for shard in range(n_shards):
+        shard_limit = size + (shard < remainder)
+        shard_seed = VideoId.from_numerical(seed + start if ascending else seed - start)
+        if sparse:
+            shards.append(
+                VideoIdSparseGenerator(seed=shard_seed, limit=shard_limit, ascending=ascending)
+            )
+        elif ascending:
+            shards.append(VideoIdAscendingGenerator(seed=shard_seed, limit=shard_limit))
+        else:
+            shards.append(VideoIdDescendingGenerator(seed=shard_seed, limit=shard_limit))
+        start += shard_limit
+    return shards
+
+
+class SharedStop(CallBack):
+    """
+    Stop a shard once another shard stopped, and signal the other shards when `callback` stops
+    this one, for stop conditions shared by the whole crawl, such as rate limiting.
+    """
+
+    def __init__(self, callback: CallBack, stop_event: Any) -> None:
+        self.callback = callback
+        self.stop_event = stop_event
+        self.ordered = callback.ordered
+
+    def on_response(self, context: ResponseContext) -> Any:
+        if self.stop_event.is_set():
+            raise StopCrawlException("Stopped by another shard.")
+        try:
+            return self.callback.on_response(context)
+        except StopCrawlException:
+            self.stop_event.set()
+            raise
+
+
+class ProgressCallback(CallBack):
+    """Count the responses of shard `index` in the shared `counters` array"""
+
+    ordered = False
+
+    def __init__(self, counters: Any, index: int) -> None:
+        self.counters = counters
+        self.index = index
+
+    def on_response(self, context: ResponseContext) -> Any:
+        self.counters[self.index] += 1
+
+
+@dataclass
+class Shard:
+    """
+    Picklable settings of a shard, crawled by `crawl_shard` in its own process into `path`
+
+    Callbacks are copied into the shard process: each shard keeps its own stopping state.
+    Those `shared` stop all the shards.
+    """
+
+    index: int
+    id_generator: VideoIdGenerator
+    path: str
+    callbacks: List[CallBack] = field(default_factory=list)
+    max_concurrency: int = 50
+    concurrency: ConcurrencyStrategy = ConcurrencyStrategy.static
+    rate: Optional[float] = None
+    burst: Optional[int] = None
+    rate_state: Optional[str] = None
+    max_attempts: int = 5
+    retry_budget: float = 0.1
+
+
+def crawl_shard(shard: Shard, stop_event: Any, counters: Any) -> None:
+    """Crawl `shard` with its own event loop and connection pool. Entry point of shard processes."""
+    callbacks: List[CallBack] = [
+        SharedStop(callback, stop_event) if callback.shared else callback
+        for callback in shard.callbacks
+    ]
+    # Also stops shards without shared callbacks once another shard stopped or failed
+    callbacks.append(SharedStop(ProgressCallback(counters, shard.index), stop_event))
+    crawler = AsyncCrawler(
+        limiter=build_limiter(shard.concurrency, shard.max_concurrency),
+        callbacks=callbacks,
+        rate_limiter=build_rate_limiter(shard.rate, shard.burst, shard.rate_state),
+        typed=True,
+        retry_policy=build_retry_policy(shard.max_attempts, shard.retry_budget),
+    )
+
+    async def dump() -> None:
+        with ParquetSink(shard.path) as sink:
+            async for record in crawler.iter_crawl(shard.id_generator):
+                sink.write(record)
+
+    try:
+        asyncio.run(dump())
+    except KeyboardInterrupt:
+        stop_event.set()
+
+
+def merge_parquet(paths: Sequence[str], output: str) -> int:
+    """Concatenate the Parquet files `paths` into `output`, one row group at a time"""
+    n_rows = 0
+    tmp_output = f"{output}.tmp"
+    with pq.ParquetWriter(tmp_output, RECORD_SCHEMA) as writer:
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            parquet_file = pq.ParquetFile(path)
+            for index in range(parquet_file.num_row_groups):
+                table = parquet_file.read_row_group(index)
+                writer.write_table(table)
+                n_rows += table.num_rows
+    os.replace(tmp_output, output)
+    return n_rows
+
+
+class ShardedCrawl:
+    """
+    Crawl shards in parallel worker processes, each running an `AsyncCrawler`, and merge their
+    outputs into a single Parquet file.
+
+    Shards write their own files under a hidden directory next to `output`, merged once every
+    shard is done, including after a stop or an interruption. Progress is aggregated over all
+    shards. If a `rate` is given without `rate_state`, the rate is shared by all the shards.
+
+    Args:
+        id_generators: Generators of the shards, eg. from `split_range`
+        output: Location of the merged Parquet file
+        callbacks: Callbacks of every shard
+        context: Multiprocessing context of the shard processes (default = platform default)
+        progress: Show the aggregate progress bar (default = True)
+        **kwargs: `Shard` settings
+
+    Example:
+        >>> generator = VideoIdAscendingGenerator(VideoId("1231"), limit=100_000)
+        >>> crawl = ShardedCrawl(split_range(generator, n_shards=8), "videos.parquet")
+        >>> crawl.run()
+        12345
+    """
+
+    def __init__(
+        self,
+        id_generators: Sequence[VideoIdGenerator],
+        output: str,
+        callbacks: Optional[List[CallBack]] = None,
+        context: Optional[BaseContext] = None,
+        progress: bool = True,
+        **kwargs: Any,
+    ) -> None:
+        self.output = output
+        self.progress = progress
+        self.context = context or multiprocessing.get_context()
+        self.directory = Path(output).parent / f".{Path(output).name}.shards"
+        if kwargs.get("rate") and not kwargs.get("rate_state"):
+            kwargs["rate_state"] = str(self.directory / "rate.sqlite")
+        self.shards = [
+            Shard(
+                index=index,
+                id_generator=id_generator,
+                path=str(self.directory / f"shard-{index:05d}.parquet"),
+                callbacks=callbacks or [],
+                **kwargs,
+            )
+            for index, id_generator in enumerate(id_generators)
+        ]
+        # Sparse shards only request part of their range: their number of responses is unknown
+        sparse = any(isinstance(generator, VideoIdSparseGenerator) for generator in id_generators)
+        limits = [getattr(generator, "limit", None) or 0 for generator in id_generators]
+        self.total = None if sparse else sum(limits) or None
+        self.stop_event = self.context.Event()
+        self.counters = self.context.RawArray("q", len(self.shards))
+
+    def run(self, poll_interval: float = 0.2) -> int:
+        """Crawl all shards, then merge their outputs. Returns the number of merged records."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        processes = [
+            self.context.Process(
+                target=crawl_shard, args=(shard, self.stop_event, self.counters), daemon=True
+            )
+            for shard in self.shards
+        ]
+        for process in processes:
+            process.start()
+
+        try:
+            self.monitor(processes, poll_interval)
+        except KeyboardInterrupt:
+            self.stop_event.set()
+            raise
+        finally:
+            for process in processes:
+                process.join()
+            n_rows = merge_parquet([shard.path for shard in self.shards], self.output)
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+        failed = [shard.index for shard, p in zip(self.shards, processes) if p.exitcode]
+        if failed:
+            raise RuntimeError(f"Shards {failed} failed, their records so far were merged.")
+        return n_rows
+
+    def monitor(self, processes: List[Any], poll_interval: float) -> None:
+        """Report the aggregate progress of the shards until they are all done"""
+        progress = Progress(
+            TextColumn("[progress.description]{task.description}"),
+            BarColumn(),
+            TaskProgressColumn(show_speed=True),
+            TimeRemainingColumn(elapsed_when_finished=True),
+            disable=not self.progress,
+        )
+        with progress:
+            description = f"Crawling {len(processes)} shards..."
+            task = progress.add_task(description, total=self.total)
+            while any(process.is_alive() for process in processes):
+                if not self.stop_event.is_set() and any(p.exitcode for p in processes):
+                    # A failed shard stops the others, so that the crawl ends early
+                    logging.warning("A shard process failed, stopping all shards.")
+                    self.stop_event.set()
+                progress.update(task, completed=sum(self.counters))
+                time.sleep(poll_interval)
+            # Shards stopped early leave part of the total unrequested
+            completed = sum(self.counters)
+            progress.update(task, total=completed, completed=completed)
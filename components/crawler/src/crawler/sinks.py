@@ -0,0 +1,395 @@
+import asyncio
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Set
+
+import rich
+
+from crawler.records import VideoRecord, record_schema
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+MONGODB_SCHEMES = ("mongodb://", "mongodb+srv://")
+
+
+def __getattr__(name: str) -> Any:
+    if name == "RECORD_SCHEMA":
+        return record_schema()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+class Sink:
+    """
+    Abstract base class for record destinations. Closes itself when used as a context manager.
+    `on_write` callbacks are called with every record the sink accepted, and `on_commit`
+    callbacks whenever the records written so far are durable.
+
+    Coroutines write with `awrite`, `acommit` and `async with`: sinks waiting on I/O override
+    them to wait off the event loop, the other sinks write in place.
+    """
+
+    def __init__(self) -> None:
+        self.on_write: List[Callable[[Dict], None]] = []
+        self.on_commit: List[Callable[[], None]] = []
+
+    def write(self, record: Dict) -> None: ...
+
+    def accepted(self, record: Dict) -> None:
+        for callback in self.on_write:
+            callback(record)
+
+    def close(self) -> None:
+        self.committed()
+
+    def commit(self) -> None:
+        """Make the records written so far durable, if the sink can before being closed"""
+        self.committed()
+
+    def committed(self) -> None:
+        for callback in self.on_commit:
+            callback()
+
+    def __enter__(self) -> "Sink":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    async def awrite(self, record: Dict) -> None:
+        self.write(record)
+
+    async def acommit(self) -> None:
+        self.commit()
+
+    async def aclose(self) -> None:
+        self.close()
+
+    async def __aenter__(self) -> "Sink":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+
+class PrintSink(Sink):
+    def write(self, record: Dict) -> None:
+        rich.print(record.to_dict() if isinstance(record, VideoRecord) else record)
+        self.accepted(record)
+
+
+class ParquetSink(Sink):
+    """
+    Stream records into a Parquet file, one row group at a time.
+
+    Records, either dicts or `VideoRecord`s, are buffered and flushed as a row group every
+    `row_group_size` records or every `flush_interval` seconds, whichever comes first.
+    Exiting the context (including on KeyboardInterrupt or StopCrawlException) flushes the
+    buffer and writes the file footer, so the file is always readable.
+
+    Args:
+        path: Output file location
+        schema: Arrow schema of the records (default = RECORD_SCHEMA)
+        row_group_size: Maximum number of buffered records before a flush (default = 10_000)
+        flush_interval: Maximum number of seconds between two flushes (default = 60)
+
+    Example:
+        >>> with ParquetSink("videos.parquet") as sink:
+        ...     for record in crawler.iter_crawl(id_generator):
+        ...         sink.write(record)
+    """
+
+    def __init__(
+        self,
+        path: str,
+        schema: Optional["pa.Schema"] = None,
+        row_group_size: int = 10_000,
+        flush_interval: float = 60.0,
+    ) -> None:
+        import pyarrow.parquet as pq
+
+        super().__init__()
+        self.path = path
+        self.schema = schema or record_schema()
+        self.row_group_size = row_group_size
+        self.flush_interval = flush_interval
+        self.buffer: List[Dict] = []
+        self.writer: Optional["pq.ParquetWriter"] = pq.ParquetWriter(path, self.schema)
+        self.last_flush = time.monotonic()
+
+    def write(self, record: Dict) -> None:
+        self.buffer.append(record)
+        self.accepted(record)
+        if (
+            len(self.buffer) >= self.row_group_size
+            or time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        import pyarrow as pa
+
+        if self.buffer and self.writer:
+            if isinstance(self.buffer[0], VideoRecord):
+                batch = VideoRecord.to_arrow(self.buffer, schema=self.schema)
+            else:
+                batch = pa.RecordBatch.from_pylist(self.buffer, schema=self.schema)
+            self.writer.write_batch(batch)
+            self.buffer = []
+        self.last_flush = time.monotonic()
+
+    def commit(self) -> None:
+        # Records are only durable once the footer is written, on close
+        self.flush()
+
+    def close(self) -> None:
+        if self.writer:
+            self.flush()
+            self.writer.close()
+            self.writer = None
+            self.committed()
+
+
+class ParquetPartsSink(Sink):
+    """
+    Stream records into a directory of Parquet part files, rolling to a new part every
+    `rows_per_file` records.
+
+    Parts are written under a hidden name and renamed once closed, so the directory only
+    ever holds complete files, readable with `pd.read_parquet(directory)`. `on_commit`
+    callbacks are called after each rename: records written before survive a hard crash.
+
+    Args:
+        directory: Output directory, created if needed. New parts are numbered after existing ones.
+        rows_per_file: Number of records per part file (default = 100_000)
+        **kwargs: `ParquetSink` arguments
+
+    Example:
+        >>> sink = ParquetPartsSink("videos/")
+        >>> sink.on_commit.append(journal.commit)
+        >>> with sink:
+        ...     sink.write(record)
+    """
+
+    def __init__(self, directory: str, rows_per_file: int = 100_000, **kwargs) -> None:
+        super().__init__()
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.rows_per_file = rows_per_file
+        self.kwargs = kwargs
+        self.n_parts = 1 + max(
+            (int(path.stem.split("-")[-1]) for path in self.directory.glob("part-*.parquet")),
+            default=-1,
+        )
+        self.part: Optional[ParquetSink] = None
+        self.rows = 0
+
+    def write(self, record: Dict) -> None:
+        if self.part is None:
+            path = self.directory / f".part-{self.n_parts:05d}.parquet"
+            self.part = ParquetSink(str(path), **self.kwargs)
+        self.part.write(record)
+        self.accepted(record)
+        self.rows += 1
+        if self.rows >= self.rows_per_file:
+            self.roll()
+
+    def roll(self) -> None:
+        """Complete the current part file"""
+        if self.part is not None:
+            self.part.close()
+            os.replace(self.part.path, self.directory / f"part-{self.n_parts:05d}.parquet")
+            self.part = None
+            self.n_parts += 1
+            self.rows = 0
+        self.committed()
+
+    def commit(self) -> None:
+        self.roll()
+
+    def close(self) -> None:
+        self.roll()
+
+
+class MongoSink(Sink):
+    """
+    Upsert records into a MongoDB collection, keyed on their `id` as the document `_id`.
+
+    Records are buffered and written as unordered `bulk_write` batches of `batch_size`
+    upserts, by up to `max_in_flight` concurrent batches. Once they are all in flight,
+    `write` blocks until one completes: a slow database holds back the crawler rather
+    than the buffers growing. `awrite` awaits instead, so the other requests of an
+    asynchronous crawl keep running meanwhile. `waited` accumulates the seconds blocked,
+    zero as long as the ingest is bound by the api.
+
+    `on_commit` callbacks are called once every record written before is acknowledged,
+    every `commit_every` records and on close. A failed batch raises on the next write, and
+    on every write and commit after: the sink never commits again, even on close.
+
+    Args:
+        collection: `pymongo` collection of the records
+        batch_size: Number of upserts per `bulk_write` (default = 1000)
+        max_in_flight: Maximum number of concurrent batches (default = 4)
+        commit_every: Number of records between commits, None to only commit on close
+            (default = 100_000)
+
+    Example:
+        >>> with MongoSink.from_uri("mongodb://localhost:27017/datalake.videos") as sink:
+        ...     for record in crawler.iter_crawl(id_generator):
+        ...         sink.write(record)
+    """
+
+    def __init__(
+        self,
+        collection: Any,
+        batch_size: int = 1000,
+        max_in_flight: int = 4,
+        commit_every: Optional[int] = 100_000,
+    ) -> None:
+        super().__init__()
+        self.collection = collection
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.commit_every = commit_every
+        self.executor = ThreadPoolExecutor(max_in_flight, thread_name_prefix="mongo-sink")
+        self.in_flight: Set[Future] = set()
+        self.buffer: List[Dict] = []
+        self.client: Any = None
+        self.uncommitted = 0
+        self.written = 0
+        self.batches = 0
+        self.waited = 0.0
+        self.error: Optional[BaseException] = None
+
+    @classmethod
+    def from_uri(cls, uri: str, **kwargs) -> "MongoSink":
+        """Sink of the `database.collection` of a MongoDB uri, closing its client on close"""
+        try:
+            import pymongo
+        except ImportError:
+            raise ImportError("MongoSink requires pymongo: pip install 'crawler[mongo]'") from None
+        parsed = pymongo.uri_parser.parse_uri(uri)
+        if not parsed["database"] or not parsed["collection"]:
+            raise ValueError(f"{uri} does not name a collection, eg. mongodb://host/db.videos")
+        client = pymongo.MongoClient(uri)
+        sink = cls(client[parsed["database"]][parsed["collection"]], **kwargs)
+        sink.client = client
+        return sink
+
+    def operation(self, record: Dict) -> Any:
+        import pymongo
+
+        document = record.to_dict() if isinstance(record, VideoRecord) else record
+        return pymongo.ReplaceOne({"_id": document["id"]}, document, upsert=True)
+
+    def bulk_write(self, batch: List[Dict]) -> int:
+        self.collection.bulk_write([self.operation(record) for record in batch], ordered=False)
+        return len(batch)
+
+    def write(self, record: Dict) -> None:
+        self.buffer.append(record)
+        self.accepted(record)
+        if len(self.buffer) >= self.batch_size:
+            self.submit()
+
+    def submit(self) -> None:
+        """Send the buffered records, then commit if `commit_every` records are uncommitted"""
+        self.dispatch()
+        if self.commit_every and self.uncommitted >= self.commit_every:
+            self.commit()
+
+    async def asubmit(self) -> None:
+        await self.adispatch()
+        if self.commit_every and self.uncommitted >= self.commit_every:
+            await self.acommit()
+
+    def dispatch(self) -> None:
+        """Send the buffered records, once a batch slot is free"""
+        if not self.buffer:
+            return
+        if len(self.in_flight) >= self.max_in_flight:
+            start = time.monotonic()
+            wait(self.in_flight, return_when=FIRST_COMPLETED)
+            self.waited += time.monotonic() - start
+        self.send()
+
+    async def adispatch(self) -> None:
+        """`dispatch` awaiting a free batch slot without blocking the event loop"""
+        if not self.buffer:
+            return
+        if len(self.in_flight) >= self.max_in_flight:
+            start = time.monotonic()
+            await asyncio.wait(
+                [asyncio.wrap_future(future) for future in self.in_flight],
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            self.waited += time.monotonic() - start
+        self.send()
+
+    def send(self) -> None:
+        """Send the buffered records as a batch, a slot being free"""
+        self.reap()
+        batch, self.buffer = self.buffer, []
+        self.in_flight.add(self.executor.submit(self.bulk_write, batch))
+        self.uncommitted += len(batch)
+
+    def reap(self) -> None:
+        """Account for the completed batches, raising the error of the first failed one"""
+        for future in [future for future in self.in_flight if future.done()]:
+            self.in_flight.discard(future)
+            error = future.exception()
+            if error is None:
+                self.written += future.result()
+                self.batches += 1
+            elif self.error is None:
+                self.error = error
+        if self.error is not None:
+            raise self.error
+
+    def drain(self) -> None:
+        """Send the buffered records and wait for every batch in flight"""
+        self.dispatch()
+        wait(self.in_flight)
+        self.reap()
+
+    async def adrain(self) -> None:
+        await self.adispatch()
+        if self.in_flight:
+            await asyncio.wait([asyncio.wrap_future(future) for future in self.in_flight])
+        self.reap()
+
+    def commit(self) -> None:
+        self.drain()
+        self.uncommitted = 0
+        self.committed()
+
+    async def acommit(self) -> None:
+        await self.adrain()
+        self.uncommitted = 0
+        self.committed()
+
+    async def awrite(self, record: Dict) -> None:
+        self.buffer.append(record)
+        self.accepted(record)
+        if len(self.buffer) >= self.batch_size:
+            await self.asubmit()
+
+    def close(self) -> None:
+        try:
+            self.commit()
+        finally:
+            self.shutdown()
+
+    async def aclose(self) -> None:
+        try:
+            await self.acommit()
+        finally:
+            self.shutdown()
+
+    def shutdown(self) -> None:
+        self.executor.shutdown()
+        if self.client is not None:
+            self.client.close()
@@ -1,11 +1,22 @@
 import asyncio
 import base64
 import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import aclosing, nullcontext
+from dataclasses import dataclass
+from pathlib import Path
 
-from httpx import AsyncClient
-from rich.progress import track
-from typing import List
+from httpx import HTTPError
+from typing import AsyncIterator, ContextManager, Iterable, List, Optional, Tuple
 
+from crawler.concurrency import Limiter, StaticLimiter
+from crawler.metrics import Metrics
+from crawler.pool import WorkerPool
+from crawler.transport import Connections
 
 
 class Thumbnail:
@@ -34,32 +45,236 @@ class Thumbnail:
         return hashlib.sha256(self.content).hexdigest()
 
 
+@dataclass(frozen=True)
+class StoredThumbnail:
+    """A thumbnail `url`, and the `hash` and `size` of its content in a `ThumbnailStore`"""
+
+    url: str
+    hash: str
+    size: int
+
+
+class ThumbnailStore:
+    """
+    Content-addressed directory of thumbnails, keyed by `Thumbnail.hash`, so that thumbnails
+    shared by several videos or runs are stored once.
+
+    A SQLite index maps urls to the hash of their content: known urls are not downloaded again.
+
+    Args:
+        directory: Location of the store, created if needed
+
+    Examples:
+        >>> store = ThumbnailStore("thumbnails/")
+        >>> store.lookup("https://xyz.com/1.jpg")
+        StoredThumbnail(url="https://xyz.com/1.jpg", hash="5d41...", size=5324)
+
+        >>> store.thumbnail("5d41...").base64
+        str_urlsafe_b64_
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = Path(directory)
+        self.objects = self.directory / "objects"
+        self.objects.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(
+            str(self.directory / "urls.sqlite"),
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS urls (url TEXT PRIMARY KEY, hash TEXT, size INTEGER)"
+        )
+        self.lock = threading.Lock()
+
+    def path(self, hash: str) -> Path:
+        return self.objects / hash[:2] / hash
+
+    def lookup(self, url: str) -> Optional[StoredThumbnail]:
+        """Stored thumbnail of `url`, None if unknown or no longer stored"""
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT hash, size FROM urls WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None or not self.path(row[0]).exists():
+            return None
+        return StoredThumbnail(url, *row)
+
+    def thumbnail(self, hash: str) -> "Thumbnail":
+        return Thumbnail(self.path(hash).read_bytes())
+
+    def writer(self, url: str) -> "ThumbnailWriter":
+        return ThumbnailWriter(self, url)
+
+    def add(self, url: str, tmp_path: Path, hash: str, size: int) -> StoredThumbnail:
+        """Move the downloaded `tmp_path` to its content address, unless already stored"""
+        path = self.path(hash)
+        if path.exists():
+            tmp_path.unlink()
+        else:
+            path.parent.mkdir(exist_ok=True)
+            os.replace(tmp_path, path)
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO urls VALUES (?, ?, ?)", (url, hash, size)
+            )
+        return StoredThumbnail(url, hash, size)
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+class ThumbnailWriter:
+    """Write a thumbnail to a temporary file chunk by chunk, hashing it on the way"""
+
+    def __init__(self, store: ThumbnailStore, url: str) -> None:
+        self.store = store
+        self.url = url
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.tmp_path = store.directory / f".{os.getpid()}-{id(self)}.tmp"
+        self.file = open(self.tmp_path, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self.digest.update(chunk)
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> StoredThumbnail:
+        self.file.close()
+        return self.store.add(self.url, self.tmp_path, self.digest.hexdigest(), self.size)
+
+    def abort(self) -> None:
+        self.file.close()
+        self.tmp_path.unlink(missing_ok=True)
+
+
 class aThumbnailsContent:
     """
     Args:
         max_concurrency: Maximum number of thumbnails to download at a time (default = 50)
+        limiter: Concurrency limiter, may be shared with an `AsyncCrawler`
+            (default = StaticLimiter(max_concurrency))
+        metrics: Runtime metrics of the downloads, as client "thumbnails", if any
+        progress: Show a progress bar in `download` (default = True)
+        connections: Owner of the HTTP clients, its thumbnails pools sized to the concurrency
+            of every CDN host (default = Connections(metrics=metrics))
 
-    Example:
+    Examples:
         >>> thumbnails_url_list = List[url_as_str]
         >>> aThumbnailsContent().download(thumbnails_url_list)
         List[content]
+
+        >>> aThumbnailsContent().save(thumbnails_url_list, ThumbnailStore("thumbnails/"))
+        List[(url, hash, size)]
     """
 
-    def __init__(self, max_concurrency: int = 50):
-        self.aclient = AsyncClient()
-        self.semaphore = asyncio.Semaphore(max_concurrency)
+    def __init__(
+        self,
+        max_concurrency: int = 50,
+        limiter: Optional[Limiter] = None,
+        metrics: Optional[Metrics] = None,
+        progress: bool = True,
+        connections: Optional[Connections] = None,
+    ):
+        self.limiter = limiter or StaticLimiter(max_concurrency)
+        self.connections = connections or Connections(metrics=metrics)
+        self.aclient = self.connections.aclient("thumbnails", self.limiter.max_limit)
+        self.metrics = metrics
+        if metrics:
+            metrics.watch_limiter("thumbnails", self.limiter)
+        self.progress = progress
+
+    def measure(self) -> ContextManager:
+        return self.metrics.measure("thumbnails") if self.metrics else nullcontext()
+
+    def observe(self, status: int, elapsed: float, size: int) -> None:
+        if self.metrics:
+            self.metrics.observe("thumbnails", status, elapsed, size)
 
     async def aget(self, *args, **kwargs):
-        async with self.semaphore:
-            return await self.aclient.get(*args, **kwargs)
+        async with self.limiter.slot() as slot:
+            start = time.perf_counter()
+            with self.measure():
+                response = await self.aclient.get(*args, **kwargs)
+            self.observe(response.status_code, time.perf_counter() - start, len(response.content))
+            if response.status_code == 429 or response.status_code >= 500:
+                slot.drop()
+            return response
 
     async def get_contents(self, thumbnails_url_list: List[str]):
+        from rich.progress import track
+
         responses = [self.aget(image) for image in thumbnails_url_list]
         awaited_responses = [
             (await response).content
-            for response in track(asyncio.as_completed(responses), total=len(responses))
+            for response in track(
+                asyncio.as_completed(responses), total=len(responses), disable=not self.progress
+            )
         ]
         return awaited_responses
 
     def download(self, thumbnails_url_list: List[str]) -> List[bytes]:
         return asyncio.run(self.get_contents(thumbnails_url_list))
+
+    async def fetch(self, url: str, store: ThumbnailStore) -> Optional[StoredThumbnail]:
+        """Stream the thumbnail of `url` into `store`, None if it could not be downloaded"""
+        stored = store.lookup(url)
+        if stored is not None:
+            return stored
+        writer = store.writer(url)
+        try:
+            async with self.limiter.slot() as slot, self.measure():
+                start = time.perf_counter()
+                async with self.aclient.stream("GET", url) as response:
+                    if response.status_code != 200:
+                        self.observe(response.status_code, time.perf_counter() - start, 0)
+                        if response.status_code == 429 or response.status_code >= 500:
+                            slot.drop()
+                        logging.warning(f"Thumbnail {url} failed: {response.status_code}")
+                        writer.abort()
+                        return None
+                    async for chunk in response.aiter_bytes():
+                        writer.write(chunk)
+                self.observe(response.status_code, time.perf_counter() - start, writer.size)
+        except HTTPError as err:
+            logging.warning(f"Thumbnail {url} failed: {err!r}")
+            writer.abort()
+            return None
+        except BaseException:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    async def istore(
+        self, thumbnails_urls: Iterable[str], store: ThumbnailStore
+    ) -> AsyncIterator[StoredThumbnail]:
+        """
+        Stream thumbnails into `store` as they complete, skipping urls already stored.
+        Urls are pulled lazily and contents never held in memory, whatever their number.
+        """
+
+        async def fetch(url: str) -> Optional[StoredThumbnail]:
+            return await self.fetch(url, store)
+
+        pool = WorkerPool(n_workers=self.limiter.max_limit)
+        async with aclosing(pool.imap(fetch, thumbnails_urls)) as results:
+            async for _, stored in results:
+                if stored is not None:
+                    yield stored
+
+    def save(
+        self, thumbnails_urls: Iterable[str], store: ThumbnailStore
+    ) -> List[Tuple[str, str, int]]:
+        """(url, hash, size) of the thumbnails of `thumbnails_urls` stored in `store`"""
+
+        async def collect() -> List[Tuple[str, str, int]]:
+            return [
+                (stored.url, stored.hash, stored.size)
+                async for stored in self.istore(thumbnails_urls, store)
+            ]
+
+        return asyncio.run(collect())
@@ -0,0 +1,331 @@
+import asyncio
+import socket
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Union
+
+import httpx
+
+from crawler.cache import CachingTransport, ResponseCache
+from crawler.metrics import Metrics
+
+if TYPE_CHECKING:
+    import httpcore
+
+
+def connect_error(message: Any) -> Exception:
+    # httpcore is imported by httpx once a request is sent, not before
+    import httpcore
+
+    return httpcore.ConnectError(message)
+
+
+class DnsCache:
+    """
+    Addresses of the hosts connected to lately, reused for `ttl` seconds without a lookup.
+    An address failing to connect is forgotten, so the next connection resolves it again.
+
+    Args:
+        ttl: Seconds an address is reused (default = 300)
+    """
+
+    def __init__(self, ttl: float = 300.0) -> None:
+        self.ttl = ttl
+        self.addresses: Dict[Tuple[str, int], Tuple[str, float]] = {}
+        self.lock = threading.Lock()
+
+    def get(self, host: str, port: int) -> Optional[str]:
+        with self.lock:
+            address, expires_at = self.addresses.get((host, port), ("", 0.0))
+        return address if expires_at > time.monotonic() else None
+
+    def put(self, host: str, port: int, infos: List[Tuple]) -> str:
+        if not infos:
+            raise connect_error(f"No address found for {host}")
+        address = infos[0][4][0]
+        with self.lock:
+            self.addresses[host, port] = address, time.monotonic() + self.ttl
+        return address
+
+    def forget(self, host: str, port: int) -> None:
+        with self.lock:
+            self.addresses.pop((host, port), None)
+
+    def resolve(self, host: str, port: int) -> str:
+        address = self.get(host, port)
+        if address is None:
+            try:
+                infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+            except OSError as err:
+                raise connect_error(err) from err
+            address = self.put(host, port, infos)
+        return address
+
+    async def aresolve(self, host: str, port: int) -> str:
+        address = self.get(host, port)
+        if address is None:
+            try:
+                infos = await asyncio.get_running_loop().getaddrinfo(
+                    host, port, type=socket.SOCK_STREAM
+                )
+            except OSError as err:
+                raise connect_error(err) from err
+            address = self.put(host, port, infos)
+        return address
+
+
+class ResolvingBackend:
+    """httpcore network backend connecting to the addresses of `dns`"""
+
+    def __init__(self, dns: DnsCache, backend: Optional["httpcore.NetworkBackend"] = None) -> None:
+        import httpcore
+
+        self.dns = dns
+        self.backend = backend or httpcore.SyncBackend()
+        self.errors = (httpcore.ConnectError, httpcore.ConnectTimeout)
+
+    def connect_tcp(self, host: str, port: int, **kwargs: Any) -> "httpcore.NetworkStream":
+        address = self.dns.resolve(host, port)
+        try:
+            return self.backend.connect_tcp(address, port, **kwargs)
+        except self.errors:
+            self.dns.forget(host, port)
+            raise
+
+    def connect_unix_socket(self, path: str, **kwargs: Any) -> "httpcore.NetworkStream":
+        return self.backend.connect_unix_socket(path, **kwargs)
+
+    def sleep(self, seconds: float) -> None:
+        self.backend.sleep(seconds)
+
+
+class AsyncResolvingBackend:
+    """Asynchronous `ResolvingBackend`"""
+
+    def __init__(
+        self, dns: DnsCache, backend: Optional["httpcore.AsyncNetworkBackend"] = None
+    ) -> None:
+        import httpcore
+
+        self.dns = dns
+        self.backend = backend or httpcore.AnyIOBackend()
+        self.errors = (httpcore.ConnectError, httpcore.ConnectTimeout)
+
+    async def connect_tcp(
+        self, host: str, port: int, **kwargs: Any
+    ) -> "httpcore.AsyncNetworkStream":
+        address = await self.dns.aresolve(host, port)
+        try:
+            return await self.backend.connect_tcp(address, port, **kwargs)
+        except self.errors:
+            self.dns.forget(host, port)
+            raise
+
+    async def connect_unix_socket(self, path: str, **kwargs: Any) -> "httpcore.AsyncNetworkStream":
+        return await self.backend.connect_unix_socket(path, **kwargs)
+
+    async def sleep(self, seconds: float) -> None:
+        await self.backend.sleep(seconds)
+
+
+class Phases:
+    """
+    Timestamps of a request, from the httpcore `trace` extension, split into phases:
+    "pool_wait" until a connection is available, "connect" to open a new one, and
+    "server" from sending the request until its response headers are received.
+    """
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.marks: Dict[str, float] = {}
+
+    def __call__(self, event: str, info: Dict[str, Any]) -> None:
+        # eg. "http11.send_request_headers.started", keeping the first attempt
+        self.marks.setdefault(event.partition(".")[2], time.perf_counter())
+
+    async def atrace(self, event: str, info: Dict[str, Any]) -> None:
+        self(event, info)
+
+    def durations(self) -> Dict[str, float]:
+        sent = self.marks.get("send_request_headers.started")
+        if sent is None:
+            return {}
+        connect = self.marks.get("connect_tcp.started")
+        received = self.marks.get("receive_response_headers.complete", sent)
+        durations = {"pool_wait": (connect or sent) - self.start, "server": received - sent}
+        if connect is not None:
+            connected = self.marks.get("start_tls.complete") or self.marks.get(
+                "connect_tcp.complete", connect
+            )
+            durations["connect"] = connected - connect
+        return durations
+
+
+class HostPools(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    httpx transport with a connection pool per host, each of up to `max_connections`
+    connections kept alive, created as hosts are requested. Use it as the transport of
+    both `Client` and `AsyncClient`.
+
+    Args:
+        name: Name of the client in `metrics`, eg. "api" or "thumbnails"
+        limits: Limits of every host pool
+        http2: Multiplex requests over HTTP/2 connections, with hosts supporting it
+        dns: Cache of the addresses of the hosts, if any
+        metrics: Metrics of the pool wait, connect and server time of requests, if any
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limits: httpx.Limits,
+        http2: bool = False,
+        dns: Optional[DnsCache] = None,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
+        self.name = name
+        self.limits = limits
+        self.http2 = http2
+        self.dns = dns
+        self.metrics = metrics
+        self.pools: Dict[Tuple[bytes, bytes, Optional[int]], httpx.HTTPTransport] = {}
+        self.apools: Dict[Tuple[bytes, bytes, Optional[int]], httpx.AsyncHTTPTransport] = {}
+        self.lock = threading.Lock()
+
+    def pool(self, url: httpx.URL) -> httpx.HTTPTransport:
+        key = url.raw_scheme, url.raw_host, url.port
+        with self.lock:
+            if key not in self.pools:
+                self.pools[key] = httpx.HTTPTransport(limits=self.limits, http2=self.http2)
+                if self.dns:
+                    # httpx does not expose the network backend of its pool
+                    self.pools[key]._pool._network_backend = ResolvingBackend(self.dns)
+            return self.pools[key]
+
+    def apool(self, url: httpx.URL) -> httpx.AsyncHTTPTransport:
+        key = url.raw_scheme, url.raw_host, url.port
+        if key not in self.apools:
+            self.apools[key] = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+            if self.dns:
+                self.apools[key]._pool._network_backend = AsyncResolvingBackend(self.dns)
+        return self.apools[key]
+
+    def observe(self, phases: Phases) -> None:
+        if self.metrics:
+            self.metrics.observe_phases(self.name, phases.durations())
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        phases = Phases()
+        request.extensions["trace"] = phases
+        response = self.pool(request.url).handle_request(request)
+        self.observe(phases)
+        return response
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        phases = Phases()
+        request.extensions["trace"] = phases.atrace
+        response = await self.apool(request.url).handle_async_request(request)
+        self.observe(phases)
+        return response
+
+    def close(self) -> None:
+        for pool in self.pools.values():
+            pool.close()
+        self.pools = {}
+
+    async def aclose(self) -> None:
+        for pool in self.apools.values():
+            await pool.aclose()
+        self.apools = {}
+
+
+class Connections:
+    """
+    Owner of the HTTP clients of a crawl, api and thumbnails ones alike, with the same
+    tuning: per host pools sized to the concurrency of their client and kept alive,
+    optional HTTP/2, timeouts and a DNS cache shared by all the clients.
+
+    Requests wait for a connection of their pool rather than failing with a pool timeout:
+    with `metrics`, that wait is measured apart from the connect and server time, by client,
+    showing requests queuing for a connection instead of waiting on the server.
+
+    Args:
+        max_connections: Connections per host of a client not sized by its concurrency
+            (default = 50)
+        http2: Multiplex requests over HTTP/2, requires `h2` (default = False)
+        keepalive_expiry: Seconds an idle connection is kept open (default = 30)
+        connect_timeout: Seconds to open a connection (default = 5)
+        read_timeout: Seconds to wait for every chunk of a response (default = 30)
+        dns_ttl: Seconds the address of a host is reused, 0 to resolve every new connection
+            (default = 300)
+        metrics: Metrics of the requests phases, if any
+
+    Example:
+        >>> connections = Connections(http2=True, metrics=metrics)
+        >>> crawler = AsyncCrawler(max_concurrency=50, connections=connections)
+        >>> thumbnails = aThumbnailsContent(max_concurrency=20, connections=connections)
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 50,
+        http2: bool = False,
+        keepalive_expiry: float = 30.0,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        dns_ttl: float = 300.0,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
+        if http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                raise ImportError("HTTP/2 requires h2: pip install 'crawler[http2]'") from None
+        self.max_connections = max_connections
+        self.http2 = http2
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=None)
+        self.dns = DnsCache(dns_ttl) if dns_ttl > 0 else None
+        self.metrics = metrics
+
+    def transport(
+        self,
+        name: str,
+        max_connections: Optional[int] = None,
+        cache: Optional[ResponseCache] = None,
+        store: bool = True,
+    ) -> Union[HostPools, CachingTransport]:
+        """
+        Transport of the client `name`, of `max_connections` per host, answering from `cache`
+        when it can, if any, and storing the responses in it if `store`
+        """
+        max_connections = max_connections or self.max_connections
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+        pools = HostPools(name, limits, http2=self.http2, dns=self.dns, metrics=self.metrics)
+        return CachingTransport(cache, pools, store=store) if cache else pools
+
+    def client(
+        self,
+        name: str,
+        max_connections: Optional[int] = None,
+        cache: Optional[ResponseCache] = None,
+        **kwargs: Any,
+    ) -> httpx.Client:
+        """`httpx.Client` on the `transport` of `name`, with `kwargs` as client arguments"""
+        transport = self.transport(name, max_connections, cache)
+        return httpx.Client(transport=transport, timeout=self.timeout, **kwargs)
+
+    def aclient(
+        self,
+        name: str,
+        max_connections: Optional[int] = None,
+        cache: Optional[ResponseCache] = None,
+        **kwargs: Any,
+    ) -> httpx.AsyncClient:
+        """`httpx.AsyncClient` on the `transport` of `name`, with `kwargs` as client arguments"""
+        transport = self.transport(name, max_connections, cache)
+        return httpx.AsyncClient(transport=transport, timeout=self.timeout, **kwargs)
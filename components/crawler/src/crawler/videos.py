@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, List, Optional, Set, Union
 
 
 @dataclass
@@ -54,6 +54,9 @@ class VideoIdGenerator:
     def __iter__(self) -> "VideoIdGenerator":
         return self
 
+    def feedback(self, video_id: VideoId, found: bool) -> None:
+        """Called by the crawler with the outcome of each generated id, in completion order"""
+
 
 class VideoIdAscendingGenerator(VideoIdGenerator):
     """
@@ -114,3 +117,170 @@ class VideoIdDescendingGenerator(VideoIdAscendingGenerator):
         self.count += 1
         video_id = VideoId.from_numerical(self.seed.numerical_value - self.count)
         return video_id
+
+
+@dataclass
+class Backfill:
+    """Dense walk down from `frontier` to `floor`, ended early by consecutive `misses`"""
+
+    frontier: int
+    floor: int
+    misses: int = 0
+
+
+class VideoIdSparseGenerator(VideoIdGenerator):
+    """
+    Monotonic VideoIdGenerator striding over the dead regions of the id space.
+
+    Ids are generated one by one until `gap_threshold` consecutive ids are reported missing
+    through `feedback`. The stride then doubles with every further miss, up to `max_stride`.
+    On a hit after a stride, generation resumes densely right after it, and the ids skipped
+    before it are backfilled densely down to the start of the gap, or until `4 * gap_threshold`
+    consecutive misses, so dense regions are crawled entirely.
+
+    Feedback may lag behind generation and come out of order, eg. with concurrent requests:
+    an id is never generated twice, and a generator exhausted while feedback is pending may
+    generate again once it is received.
+
+    Args:
+        seed: The seed VideoId (included if ascending, excluded if descending)
+        limit: The size of the id range to cover. If None, generator will indefinitely stride.
+        ascending: Direction of the range (default = True)
+        gap_threshold: Consecutive misses before striding (default = 8)
+        max_stride: Maximum distance between two probed ids (default = 1024)
+
+    Examples:
+
+        >>> id_generator = VideoIdSparseGenerator(seed=VideoId("1"), limit=1000, gap_threshold=2)
+        >>> for video_id in id_generator:
+        ...     id_generator.feedback(video_id, found=video_id.numerical_value >= 900)
+        >>> id_generator.count
+        119
+    """
+
+    def __init__(
+        self,
+        seed: VideoId,
+        limit: Optional[int] = None,
+        ascending: bool = True,
+        gap_threshold: int = 8,
+        max_stride: int = 1024,
+    ) -> None:
+        self.seed = seed
+        self.limit = limit
+        self.ascending = ascending
+        self.gap_threshold = gap_threshold
+        self.max_stride = max_stride
+        # Ending a backfill early misses ids for good, unlike striding
+        self.backfill_threshold = 4 * gap_threshold
+        self.count = 0
+        self.cursor = 0
+        self.stride = 1
+        self.misses = 0
+        # First position of the current gap, and last position of the walk
+        self.gap_start = 0
+        self.previous = -1
+        # Positions awaiting feedback, mapped to their backfill, or to the number of positions
+        # skipped right before them
+        self.pending: Dict[int, Union[Backfill, int]] = {}
+        self.backfills: List[Backfill] = []
+        self.outcomes: Dict[int, bool] = {}
+        # Positions generated recently, not to be generated again by a backfill or rewind
+        self.generated: Set[int] = set()
+
+    def position(self, video_id: VideoId) -> int:
+        """Rank of `video_id` in the range"""
+        if self.ascending:
+            return video_id.numerical_value - self.seed.numerical_value
+        return self.seed.numerical_value - video_id.numerical_value - 1
+
+    def video_id(self, position: int) -> VideoId:
+        if self.ascending:
+            return VideoId.from_numerical(self.seed.numerical_value + position)
+        return VideoId.from_numerical(self.seed.numerical_value - position - 1)
+
+    def __next__(self) -> VideoId:
+        while self.backfills:
+            backfill = self.backfills[-1]
+            while backfill.frontier in self.generated:
+                backfill.frontier -= 1
+            if backfill.frontier < backfill.floor or backfill.misses >= self.backfill_threshold:
+                self.backfills.pop()
+                continue
+            backfill.frontier -= 1
+            return self.generate(backfill.frontier + 1, backfill)
+
+        while True:
+            reached = [position for position in self.outcomes if position <= self.cursor]
+            if reached:
+                # Outcomes received ahead of the walk take effect once the walk reaches them
+                position = min(reached)
+                self.observe(position, self.outcomes.pop(position), position - self.previous - 1)
+            elif self.cursor in self.generated:
+                self.previous = self.cursor
+                self.cursor += 1
+            else:
+                break
+        if self.limit and self.cursor >= self.limit:
+            raise StopIteration(f"Reached end of the range of VideoId: {self.limit}")
+
+        position = self.cursor
+        skipped = position - self.previous - 1
+        self.previous = position
+        self.cursor += self.stride
+        if self.limit and position < self.limit - 1 < self.cursor:
+            # Always probe the last id of the range, so that a hit backfills the last stride
+            self.cursor = self.limit - 1
+        return self.generate(position, skipped)
+
+    def generate(self, position: int, origin: Union[Backfill, int]) -> VideoId:
+        self.pending[position] = origin
+        self.generated.add(position)
+        self.count += 1
+        if self.count % 1024 == 0:
+            self.prune()
+        return self.video_id(position)
+
+    def prune(self) -> None:
+        """Forget generated positions no backfill nor rewind can reach anymore"""
+        floor = min(
+            [
+                *self.pending,
+                *self.outcomes,
+                *(backfill.floor for backfill in self.backfills),
+                self.gap_start,
+                self.cursor,
+            ]
+        )
+        self.generated = {position for position in self.generated if position >= floor}
+
+    def feedback(self, video_id: VideoId, found: bool) -> None:
+        position = self.position(video_id)
+        origin = self.pending.pop(position, None)
+        if isinstance(origin, Backfill):
+            origin.misses = 0 if found else origin.misses + 1
+            return
+        if origin is None:
+            return
+        if position > self.previous:
+            # Generated before a rewind, ahead of the walk
+            self.outcomes[position] = found
+        else:
+            self.observe(position, found, origin)
+
+    def observe(self, position: int, found: bool, skipped: int) -> None:
+        """Adapt the stride to the outcome of the walk at `position`"""
+        if not found:
+            self.misses += 1
+            if self.misses >= self.gap_threshold:
+                if self.stride == 1:
+                    self.gap_start = self.cursor
+                self.stride = min(2 * self.stride, self.max_stride)
+            return
+
+        self.misses, self.stride = 0, 1
+        if skipped > 0:
+            self.backfills.append(Backfill(frontier=position - 1, floor=self.gap_start))
+        self.gap_start = max(self.gap_start, position + 1)
+        if self.cursor > position:
+            self.cursor, self.previous = position + 1, position
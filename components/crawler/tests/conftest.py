@@ -1,8 +1,24 @@
 from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+from unittest.mock import patch
 import json
 
+import httpx
 import pytest
 
+from crawler.core import Crawler
+from crawler.videos import VideoId
+
+
+MISSING = {"code": 2002, "message": "Video not found"}
+
+
+@pytest.fixture(autouse=True)
+def tags_processors() -> Iterator[None]:
+    """Restores `Crawler.TAGS_PROCESSORS`, which tests may reassign"""
+    with patch.object(Crawler, "TAGS_PROCESSORS", dict(Crawler.TAGS_PROCESSORS)):
+        yield
+
 
 @pytest.fixture
 def search_payload():
@@ -14,3 +30,46 @@ def search_payload():
 def crawl_payload():
     with open(Path(__file__).parent / "resources" / "payload_crawl.json") as f:
         return json.load(f)
+
+
+@pytest.fixture
+def video_api(crawl_payload: Dict) -> Callable:
+    """
+    Factory of `httpx.MockTransport` handlers mocking the api of videos by id, every video
+    being the one of `crawl_payload` under the requested id.
+
+    Args:
+        published: whether the video of a numerical value exists, else it is "not found"
+        requested: list the numerical value of every requested id is appended to
+        fields: fields of the video of an id overriding the payload ones
+        respond: `respond(request, attempt)` answers a request instead of the api, when it
+            returns a response
+
+    Example:
+        >>> handler = video_api(published=lambda value: value % 2 == 0)
+        >>> client = httpx.Client(transport=httpx.MockTransport(handler))
+    """
+
+    def factory(
+        published: Callable[[int], bool] = lambda value: True,
+        requested: Optional[List[int]] = None,
+        fields: Callable[[str], Dict] = lambda video_id: {},
+        respond: Optional[Callable[[httpx.Request, int], Optional[httpx.Response]]] = None,
+    ) -> Callable[[httpx.Request], httpx.Response]:
+        requested = [] if requested is None else requested
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            video_id = request.url.params["video_id"]
+            value = VideoId(video_id).numerical_value
+            requested.append(value)
+            response = respond(request, requested.count(value) - 1) if respond else None
+            if response is not None:
+                return response
+            if not published(value):
+                return httpx.Response(200, json=MISSING)
+            video = {**crawl_payload["video"], "video_id": video_id, **fields(video_id)}
+            return httpx.Response(200, json={"video": video})
+
+        return handler
+
+    return factory
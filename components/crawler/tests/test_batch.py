@@ -0,0 +1,40 @@
+from typing import Dict, List
+
+import pytest
+
+from crawler.batch import process_batch
+from crawler.core import BaseCrawler
+from crawler.records import RecordValidationError
+
+
+def process(videos: List[Dict], resource: str) -> List[Dict]:
+    return [BaseCrawler.process(video, resource) for video in videos]
+
+
+def test_process_batch_matches_process_crawl(crawl_payload: Dict) -> None:
+    video = crawl_payload["video"]
+    videos = [
+        video,
+        {**video, "publish_date": "2024-01-01T12:00:00+02:00", "tags": ["Éa B", "ǅx"]},
+        {**video, "views": "12", "rating": 3, "ratings": 2.7, "title": 5},
+        {**video, "publish_date": "2024-03-01", "thumbs": [], "tags": []},
+    ]
+    resource = BaseCrawler.VIDEO_BY_ID_RESOURCE
+    assert process_batch(videos, resource).to_pylist() == process(videos, resource)
+
+
+def test_process_batch_matches_process_search(search_payload: Dict) -> None:
+    videos = [r["video"] for r in search_payload["videos"] if r.get("code") != 2002]
+    videos.append({**videos[0], "thumbs": [], "tags": []})
+    resource = BaseCrawler.SEARCH_RESOURCE
+    assert process_batch(videos, resource).to_pylist() == process(videos, resource)
+
+
+def test_process_batch_empty() -> None:
+    assert process_batch([], BaseCrawler.VIDEO_BY_ID_RESOURCE).num_rows == 0
+
+
+def test_process_batch_rejects_invalid_dates(crawl_payload: Dict) -> None:
+    video = {**crawl_payload["video"], "publish_date": "2024-02-30 12:00:00"}
+    with pytest.raises(RecordValidationError, match="publish_date"):
+        process_batch([video], BaseCrawler.VIDEO_BY_ID_RESOURCE)
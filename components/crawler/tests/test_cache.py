@@ -0,0 +1,163 @@
+import asyncio
+import json
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, List
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from crawler.cache import CachingTransport, ResponseCache
+from crawler.core import AsyncCrawler, Crawler
+from crawler.videos import VideoId, VideoIdAscendingGenerator
+
+
+MISSING = {"code": 2002, "message": "Video not found"}
+
+
+def params(video_id: str) -> Dict[str, str]:
+    return {"data": Crawler.VIDEO_BY_ID_RESOURCE, "video_id": video_id}
+
+
+def even(value: int) -> bool:
+    return value % 2 == 0
+
+
+def test_cache_stores_identical_bodies_once(tmp_path: Path) -> None:
+    cache = ResponseCache(str(tmp_path))
+    content = json.dumps(MISSING).encode()
+    cache.put(params("1231"), 200, content)
+    cache.put(params("1241"), 200, content)
+
+    assert cache.get(params("1231")) == (200, content)
+    assert cache.get(params("1251")) is None
+    assert len(list((tmp_path / "objects").rglob("*.z"))) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_expires_entries_per_resource(tmp_path: Path) -> None:
+    cache = ResponseCache(str(tmp_path), ttl={Crawler.SEARCH_RESOURCE: 60})
+    search = {"data": Crawler.SEARCH_RESOURCE, "page": "1"}
+    cache.put(search, 200, b"{}")
+    cache.put(params("1231"), 200, b"{}")
+
+    with patch("crawler.cache.time.time", return_value=cache_time(cache) + 61):
+        assert cache.get(search) is None
+        assert cache.get(params("1231")) is not None
+
+
+def test_cache_expires_missing_entries(tmp_path: Path, crawl_payload: Dict) -> None:
+    cache = ResponseCache(str(tmp_path), missing_ttl=3600)
+    video = {"video": crawl_payload["video"]}
+    cache.store(params("1231"), 200, json.dumps(MISSING).encode(), MISSING)
+    cache.store(params("1241"), 200, json.dumps(video).encode(), video)
+    cache.store(params("1251"), 200, b"{}", {"code": 1005})
+
+    with patch("crawler.cache.time.time", return_value=cache_time(cache) + 3601):
+        # The missing id may have been published since
+        assert cache.get(params("1231")) is None
+        assert cache.get(params("1241")) is not None
+    assert cache.get(params("1251")) is None
+
+
+def test_crawler_caches_decoded_payloads(tmp_path: Path, video_api: Callable) -> None:
+    cache = ResponseCache(str(tmp_path))
+    crawler = Crawler(cache=cache, progress=False)
+    crawler.transport.transport = httpx.MockTransport(video_api(even))
+    decoded: List[bytes] = []
+
+    def loads(content: bytes) -> Dict:
+        decoded.append(content)
+        return json.loads(content)
+
+    generator = VideoIdAscendingGenerator(seed=VideoId("1201"), limit=4)
+    with patch("crawler.responses.loads", loads), patch("crawler.cache.loads", loads):
+        assert len(crawler.crawl(generator)) == 2
+    assert len(decoded) == 4
+    assert all({**crawler.params, **params(f"{n}1")} in cache for n in range(120, 124))
+
+
+def cache_time(cache: ResponseCache) -> float:
+    return cache.connection.execute("SELECT MAX(created_at) FROM entries").fetchone()[0]
+
+
+def test_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    bodies = [json.dumps({"video_id": str(i), "padding": "x" * 1000}).encode() for i in range(4)]
+    size = len(zlib.compress(bodies[0]))
+    cache = ResponseCache(str(tmp_path), max_size=int(3.5 * size))
+    for i, body in enumerate(bodies[:3]):
+        cache.put(params(f"{i}1"), 200, body)
+    cache.get(params("01"))
+    cache.put(params("31"), 200, bodies[3])
+
+    assert cache.get(params("01")) is not None
+    assert cache.get(params("11")) is None
+    assert cache.size <= cache.max_size
+
+
+def test_caching_transport(tmp_path: Path, video_api: Callable) -> None:
+    requested: List[int] = []
+    api = httpx.MockTransport(video_api(even, requested))
+    transport = CachingTransport(ResponseCache(str(tmp_path)), api)
+    client = httpx.Client(base_url="https://api.xyz.com", transport=transport)
+
+    first = client.get("/", params=params("1201")).json()
+    second = client.get("/", params=params("1201"))
+    assert second.json() == first
+    assert second.headers["x-cache"] == "hit"
+    assert len(requested) == 1
+
+
+def test_caching_transport_skips_rate_limited(tmp_path: Path, video_api: Callable) -> None:
+    requested: List[int] = []
+    rate_limited = httpx.Response(200, json={"code": 1005, "message": "Too many requests"})
+    handler = video_api(requested=requested, respond=lambda request, attempt: rate_limited)
+
+    transport = CachingTransport(ResponseCache(str(tmp_path)), httpx.MockTransport(handler))
+    client = httpx.Client(base_url="https://api.xyz.com", transport=transport)
+    for _ in range(2):
+        client.get("/", params=params("1201"))
+    assert len(requested) == 2
+
+
+def test_async_crawler_cache_and_replay(tmp_path: Path, video_api: Callable) -> None:
+    requested: List[int] = []
+    cache = ResponseCache(str(tmp_path))
+    crawler = AsyncCrawler(cache=cache)
+    crawler.transport.transport = httpx.MockTransport(video_api(even, requested))
+    generator = VideoIdAscendingGenerator(seed=VideoId("1201"), limit=10)
+
+    records = asyncio.run(crawler.crawl(generator))
+    assert len(records) == 5 and len(requested) == 10
+
+    generator = VideoIdAscendingGenerator(seed=VideoId("1201"), limit=10)
+    again = asyncio.run(AsyncCrawler(cache=cache).crawl(generator))
+    replayed = list(Crawler(cache=cache).iter_replay(Crawler.VIDEO_BY_ID_RESOURCE))
+    assert len(requested) == 10
+    key = lambda record: record["id"]  # noqa: E731
+    assert sorted(again, key=key) == sorted(records, key=key)
+    assert sorted(replayed, key=key) == sorted(records, key=key)
+
+
+def test_cached_requests_bypass_rate_limit(tmp_path: Path, video_api: Callable) -> None:
+    cache = ResponseCache(str(tmp_path))
+    cache.put({**Crawler().params, **params("1201")}, 200, json.dumps(MISSING).encode())
+
+    class Limiter:
+        taken = 0
+
+        def wait(self) -> None:
+            self.taken += 1
+
+    crawler = Crawler(cache=cache, rate_limiter=Limiter())
+    crawler.transport.transport = httpx.MockTransport(video_api(even))
+    crawler.request("/", params=params("1201"))
+    assert crawler.rate_limiter.taken == 0
+    crawler.request("/", params=params("1211"))
+    assert crawler.rate_limiter.taken == 1
+
+
+def test_replay_requires_cache() -> None:
+    with pytest.raises(ValueError):
+        list(Crawler().iter_replay(Crawler.VIDEO_BY_ID_RESOURCE))
@@ -1,5 +1,7 @@
+import asyncio
+import json
 from contextlib import nullcontext
-from typing import Dict
+from typing import Dict, List
 from unittest.mock import MagicMock, Mock, patch
 
 from httpx import Response
@@ -13,22 +15,57 @@ from crawler.callbacks.stopping import (
     StopCrawlException,
     TooManyRequestStopper,
 )
-from crawler.core import Crawler
+from crawler.core import AsyncCrawler, Crawler
+from crawler.responses import ResponseContext
+from crawler.retry import RetryPolicy
 from crawler.videos import VideoId, VideoIdAscendingGenerator
 
 
 @patch("crawler.core.Client")
 def test_callbacks_are_called(client_mock: MagicMock, crawl_payload: Dict[str, Dict]) -> None:
     client = client_mock()
-    client.get.return_value.json.return_value = crawl_payload
+    client.get.return_value.content = json.dumps(crawl_payload).encode()
 
     callback = Mock(CallBack)
     crawler = Crawler(callbacks=[callback])
 
+    crawler.crawl(VideoIdAscendingGenerator(seed=VideoId("1231"), limit=1))
+    callback.on_response.assert_called_once()
+    (context,) = callback.on_response.call_args.args
+    assert context.response is client.get.return_value
+    assert context.payload == crawl_payload
+
+
+@patch("crawler.core.Client")
+def test_legacy_after_response_callbacks_are_called(
+    client_mock: MagicMock, crawl_payload: Dict[str, Dict]
+) -> None:
+    client = client_mock()
+    client.get.return_value.content = json.dumps(crawl_payload).encode()
+
+    class LegacyCallBack(CallBack):
+        after_response = Mock()
+
+    callback = LegacyCallBack()
+    crawler = Crawler(callbacks=[callback])
+
     crawler.crawl(VideoIdAscendingGenerator(seed=VideoId("1231"), limit=1))
     callback.after_response.assert_called_once_with(client.get.return_value)
 
 
+def test_response_payload_is_decoded_once(crawl_payload: Dict[str, Dict]) -> None:
+    response = Mock(Response)
+    response.content = json.dumps(crawl_payload).encode()
+    context = ResponseContext(response)
+    callbacks = [TooManyRequestStopper(), FailurePatienceStopper(), PublicationTimeRangeStopper()]
+
+    with patch("crawler.responses.loads", wraps=json.loads) as loads:
+        for callback in callbacks:
+            callback.on_response(context)
+
+    loads.assert_called_once()
+
+
 @pytest.mark.parametrize(
     argnames=("payload", "should_raise"),
     argvalues=[
@@ -97,3 +134,71 @@ def test_too_many_request(payload, should_raise):
     callback = TooManyRequestStopper()
     with pytest.raises(StopCrawlException) if should_raise else nullcontext():
         callback.after_response(response)
+
+
+def mock_async_get(payloads: Dict[str, Dict], requested: List[str]):
+    """Async client `get` whose latest ids complete first"""
+
+    async def get(*args, **kwargs):
+        video_id = kwargs["params"]["video_id"]
+        requested.append(video_id)
+        await asyncio.sleep(0.01 / len(requested))
+        response = Mock(Response)
+        response.status_code = 200
+        response.content = json.dumps(payloads.get(video_id, {"code": 2002})).encode()
+        return response
+
+    return get
+
+
+@patch("crawler.core.AsyncClient")
+def test_async_range_stop_is_order_aware(
+    client_mock: MagicMock, crawl_payload: Dict[str, Dict]
+) -> None:
+    payloads = {
+        str(VideoId.from_numerical(123 + day)): {
+            "video": {**crawl_payload["video"], "publish_date": f"2024-01-{day + 1:02d} 12:00:00"}
+        }
+        for day in range(20)
+    }
+    requested: List[str] = []
+    client_mock.return_value.get = mock_async_get(payloads, requested)
+
+    callback = PublicationTimeRangeStopper(end_datetime=pendulum.parse("2024-01-06T00:00:00Z"))
+    crawler = AsyncCrawler(max_concurrency=4, callbacks=[callback])
+    records = asyncio.run(crawler.crawl(VideoIdAscendingGenerator(seed=VideoId("1231"))))
+
+    assert [record["published_on"] for record in records] == [
+        f"2024-01-{day:02d}" for day in range(1, 6)
+    ]
+    assert len(requested) < 20
+
+
+@patch("crawler.core.AsyncClient")
+def test_async_failure_patience_counts_in_id_order(client_mock: MagicMock) -> None:
+    requested: List[str] = []
+    client_mock.return_value.get = mock_async_get({}, requested)
+
+    crawler = AsyncCrawler(max_concurrency=4, callbacks=[FailurePatienceStopper(patience=10)])
+    records = asyncio.run(crawler.crawl(VideoIdAscendingGenerator(seed=VideoId("1231"))))
+
+    assert records == []
+    assert 10 <= len(requested) < 30
+
+
+@patch("crawler.core.AsyncClient")
+def test_async_too_many_request_cancels_pending_requests(client_mock: MagicMock) -> None:
+    requested: List[str] = []
+    client_mock.return_value.get = mock_async_get(
+        {str(VideoId.from_numerical(123)): {"code": 1005}}, requested
+    )
+
+    crawler = AsyncCrawler(
+        max_concurrency=4,
+        callbacks=[TooManyRequestStopper()],
+        retry_policy=RetryPolicy(max_attempts=1),
+    )
+    records = asyncio.run(crawler.crawl(VideoIdAscendingGenerator(seed=VideoId("1231"))))
+
+    assert records == []
+    assert len(requested) < 20
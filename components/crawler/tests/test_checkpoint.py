@@ -0,0 +1,91 @@
+import json
+from pathlib import Path
+from typing import Callable, Dict
+from unittest.mock import MagicMock, patch
+
+import httpx
+import pytest
+
+from crawler.checkpoint import CheckpointCallback, CrawlJournal
+from crawler.core import Crawler
+from crawler.records import RecordValidationError
+from crawler.sinks import ParquetPartsSink
+from crawler.videos import VideoId, VideoIdAscendingGenerator, VideoIdDescendingGenerator
+
+
+def test_journal_resumes_outstanding_ids(tmp_path: Path):
+    path = str(tmp_path / "crawl.sqlite")
+    with CrawlJournal(path) as journal:
+        journal.resume(VideoIdAscendingGenerator(seed=VideoId("1231"), limit=6))
+        for numerical_value in (123, 124, 126):
+            journal.mark(VideoId.from_numerical(numerical_value))
+        journal.commit()
+        assert journal.watermark == 2
+
+    with CrawlJournal(path) as journal:
+        id_generator = journal.resume()
+        assert len(id_generator) == 3
+        assert [video_id.numerical_value for video_id in id_generator] == [125, 127, 128]
+
+
+def test_journal_resumes_descending_range(tmp_path: Path):
+    path = str(tmp_path / "crawl.sqlite")
+    with CrawlJournal(path) as journal:
+        journal.resume(VideoIdDescendingGenerator(seed=VideoId("1231"), limit=3))
+        journal.mark(VideoId.from_numerical(122))
+
+    with CrawlJournal(path) as journal:
+        assert [video_id.numerical_value for video_id in journal.resume()] == [121, 120]
+
+
+def test_journal_only_writes_on_commit(tmp_path: Path):
+    path = str(tmp_path / "crawl.sqlite")
+    journal = CrawlJournal(path)
+    journal.resume(VideoIdAscendingGenerator(seed=VideoId("1231"), limit=3))
+    journal.mark(VideoId.from_numerical(123))
+
+    assert len(list(CrawlJournal(path).resume())) == 3
+
+
+@patch("crawler.core.Client")
+def test_checkpoint_callback_marks_missing_ids(
+    client_mock: MagicMock, crawl_payload: Dict[str, Dict], tmp_path: Path
+) -> None:
+    client_mock().get.return_value.content = json.dumps({"code": 2002}).encode()
+    journal = CrawlJournal(str(tmp_path / "crawl.sqlite"))
+    id_generator = journal.resume(VideoIdAscendingGenerator(seed=VideoId("1231"), limit=3))
+
+    crawler = Crawler(callbacks=[CheckpointCallback(journal)])
+    assert crawler.crawl(id_generator) == []
+
+    journal.commit()
+    assert journal.watermark == 3
+
+
+def test_journal_marks_ids_of_records_accepted_by_the_sink(
+    video_api: Callable, tmp_path: Path
+) -> None:
+    def views(video_id: str) -> Dict:
+        # The video after the missing one has an invalid record
+        return {"views": "many" if VideoId(video_id).numerical_value == 125 else 10}
+
+    handler = video_api(published=lambda value: value != 124, fields=views)
+
+    path = str(tmp_path / "crawl.sqlite")
+    journal = CrawlJournal(path)
+    id_generator = journal.resume(VideoIdAscendingGenerator(seed=VideoId("1231"), limit=4))
+    crawler = Crawler(callbacks=[CheckpointCallback(journal)], typed=True, progress=False)
+    crawler.client = httpx.Client(
+        base_url="https://api.xyz.com", transport=httpx.MockTransport(handler)
+    )
+    sink = ParquetPartsSink(str(tmp_path / "videos"))
+    sink.on_write.append(journal.mark_record)
+    sink.on_commit.append(journal.commit)
+
+    with pytest.raises(RecordValidationError), sink:
+        for record in crawler.iter_crawl(id_generator):
+            sink.write(record)
+    journal.close()
+
+    # The id of the invalid record is crawled again on resume
+    assert [video_id.numerical_value for video_id in CrawlJournal(path).resume()] == [125, 126]
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from crawler.concurrency import AIMDLimiter, GradientLimiter, Limiter, StaticLimiter
+
+
+def run_concurrently(limiter: Limiter, n_requests: int) -> int:
+    max_in_flight = 0
+
+    async def request() -> None:
+        nonlocal max_in_flight
+        async with limiter.slot():
+            max_in_flight = max(max_in_flight, limiter.in_flight)
+            await asyncio.sleep(0.001)
+
+    async def run() -> None:
+        await asyncio.gather(*(request() for _ in range(n_requests)))
+
+    asyncio.run(run())
+    return max_in_flight
+
+
+def test_static_limiter_bounds_in_flight_requests():
+    limiter = StaticLimiter(3)
+    assert run_concurrently(limiter, 20) == 3
+    assert limiter.in_flight == 0
+
+
+def test_aimd_limiter_increases_on_success():
+    limiter = AIMDLimiter(initial_limit=4, max_limit=8)
+    limiter.in_flight = 4
+    for _ in range(20):
+        limiter.in_flight += 1
+        limiter.release(latency=0.1)
+    assert limiter.limit > 4
+
+
+def test_aimd_limiter_decreases_on_drop():
+    limiter = AIMDLimiter(initial_limit=10, backoff_ratio=0.5)
+    limiter.in_flight = 1
+    limiter.release(latency=0.1, dropped=True)
+    assert limiter.limit == 5
+
+
+def test_limiter_marks_failed_requests_dropped():
+    limiter = AIMDLimiter(initial_limit=10, backoff_ratio=0.5)
+
+    async def fail() -> None:
+        async with limiter.slot():
+            raise ValueError()
+
+    with pytest.raises(ValueError):
+        asyncio.run(fail())
+    assert limiter.limit == 5
+
+
+def test_gradient_limiter_follows_latency():
+    limiter = GradientLimiter(initial_limit=20, max_limit=100, short_window=2)
+    for _ in range(50):
+        limiter.in_flight = limiter.limit + 1
+        limiter.release(latency=0.1)
+    grown = limiter.limit
+    assert grown > 20
+
+    for _ in range(50):
+        limiter.in_flight = limiter.limit + 1
+        limiter.release(latency=1.0)
+    assert limiter.limit < grown
+
+
+def test_limiter_passes_on_wakeup_of_cancelled_waiter():
+    async def run() -> int:
+        limiter = StaticLimiter(1)
+        await limiter.acquire()
+        woken = asyncio.create_task(limiter.acquire())
+        waiting = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release(0.0)
+        # Cancelled once its wakeup is sent, before it takes the slot
+        woken.cancel()
+        await asyncio.wait_for(waiting, timeout=1)
+        return limiter.in_flight
+
+    assert asyncio.run(run()) == 1
@@ -0,0 +1,109 @@
+from pathlib import Path
+from typing import Dict, List
+
+import pyarrow.parquet as pq
+
+from crawler.dataset import (
+    DatasetSink,
+    compact_dataset,
+    data_files,
+    open_dataset,
+    partition_filter,
+    read_dataset,
+)
+from crawler.records import VideoRecord
+
+
+def videos(crawl_payload: Dict, days: Dict[str, List[int]], views: int = 0) -> List[VideoRecord]:
+    """Records of the ids published on each of `days`"""
+    video = crawl_payload["video"]
+    return [
+        VideoRecord.decode(
+            {**video, "video_id": str(video_id), "publish_date": f"{day} 12:00:00", "views": views}
+        )
+        for day, ids in days.items()
+        for video_id in ids
+    ]
+
+
+def append(root: Path, records: List[VideoRecord], **kwargs) -> None:
+    with DatasetSink(str(root), **kwargs) as sink:
+        for record in records:
+            sink.write(record)
+
+
+def partitions(root: Path) -> Dict[str, int]:
+    """Number of files of every partition, failing on incomplete ones"""
+    assert not list(root.glob("*/.*"))
+    return {path.name: len(data_files(path)) for path in sorted(root.iterdir())}
+
+
+def test_runs_append_files_by_day(tmp_path: Path, crawl_payload: Dict) -> None:
+    root = tmp_path / "videos"
+    append(root, videos(crawl_payload, {"2024-01-01": [1, 2], "2024-01-02": [3]}))
+    append(root, videos(crawl_payload, {"2024-01-02": [4], "2024-01-03": [5, 6]}))
+
+    assert partitions(root) == {
+        "published_on=2024-01-01": 1,
+        "published_on=2024-01-02": 2,
+        "published_on=2024-01-03": 1,
+    }
+    # The partition column is restored from the directories
+    table = read_dataset(str(root), since="2024-01-02", until="2024-01-02T23:00:00")
+    assert sorted(table.column("id").to_pylist()) == ["3", "4"]
+    assert set(table.column("published_on").to_pylist()) == {"2024-01-02"}
+    assert read_dataset(str(root)).num_rows == 6
+
+    # Only the files of the days queried are opened
+    fragments = open_dataset(str(root)).get_fragments(filter=partition_filter(since="2024-01-03"))
+    assert [Path(fragment.path).parent.name for fragment in fragments] == [
+        "published_on=2024-01-03"
+    ]
+
+
+def test_files_completed_on_commit_and_eviction(tmp_path: Path, crawl_payload: Dict) -> None:
+    root = tmp_path / "videos"
+    records = videos(crawl_payload, {"2024-01-01": [1, 2], "2024-01-02": [3, 4]})
+    commits = []
+    sink = DatasetSink(str(root), commit_every=3, max_open_files=1)
+    sink.on_commit.append(lambda: commits.append(partitions(root)))
+    with sink:
+        for record in [records[0], records[2], records[1], records[3]]:
+            sink.write(record)
+
+    # Alternating days complete a file every switch, a commit every 3 records
+    assert commits[0] == {"published_on=2024-01-01": 2, "published_on=2024-01-02": 1}
+    assert partitions(root) == {"published_on=2024-01-01": 2, "published_on=2024-01-02": 2}
+    assert read_dataset(str(root)).num_rows == 4
+
+
+def test_compaction_keeps_latest_crawl(tmp_path: Path, crawl_payload: Dict) -> None:
+    root = tmp_path / "videos"
+    for run in range(3):
+        # Daily runs re-crawling videos, their views growing
+        days = {"2024-01-01": [run + 1, run + 2, run + 3], "2024-01-02": [10]}
+        append(root, videos(crawl_payload, days, views=run))
+    append(root, videos(crawl_payload, {"2024-01-03": [20]}))
+    assert partitions(root)["published_on=2024-01-01"] == 3
+
+    compactions = compact_dataset(str(root), rows_per_file=4, until="2024-01-01")
+    assert [
+        (c.partition, c.files, c.rows, c.compacted_files, c.compacted_rows) for c in compactions
+    ] == [("2024-01-01", 3, 9, 2, 5)]
+    table = read_dataset(str(root), until="2024-01-01", columns=["id", "views"])
+    assert dict(zip(*table.to_pydict().values())) == {"1": 0, "2": 1, "3": 2, "4": 2, "5": 2}
+    paths = data_files(root / "published_on=2024-01-01")
+    assert [pq.read_metadata(path).num_rows for path in paths] == [4, 1]
+
+    compactions = compact_dataset(str(root), rows_per_file=4)
+    assert [c.partition for c in compactions] == ["2024-01-02"]
+    assert partitions(root) == {
+        "published_on=2024-01-01": 2,
+        "published_on=2024-01-02": 1,
+        "published_on=2024-01-03": 1,
+    }
+    assert read_dataset(str(root)).num_rows == 7
+    # Compacted days are left alone until new files are appended
+    assert compact_dataset(str(root), rows_per_file=4) == []
+    append(root, videos(crawl_payload, {"2024-01-01": [6]}))
+    assert [c.compacted_files for c in compact_dataset(str(root), rows_per_file=4)] == [2]
@@ -0,0 +1,142 @@
+import asyncio
+from pathlib import Path
+from typing import Callable, List, Set
+from unittest.mock import patch
+
+import httpx
+import pyarrow.parquet as pq
+
+from crawler.callbacks.stopping import StopCrawlException
+from crawler.core import AsyncCrawler
+from crawler.follow import Follower, Watermark
+from crawler.retry import RetryPolicy
+from crawler.sinks import ParquetPartsSink
+from crawler.videos import VideoId
+
+
+def follower(video_api: Callable, published: Set[int], **kwargs) -> Follower:
+    """Follower from id 100 of an api of the `published` numerical ids"""
+    crawler = AsyncCrawler(max_concurrency=4, retry_policy=RetryPolicy(base_delay=0))
+    crawler.aclient = httpx.AsyncClient(
+        base_url="https://api.xyz.com",
+        transport=httpx.MockTransport(video_api(published.__contains__)),
+    )
+    return Follower(crawler, VideoId.from_numerical(100), **kwargs)
+
+
+def ids(records) -> Set[int]:
+    return {VideoId(record["id"]).numerical_value for record in records}
+
+
+def test_watermark_is_persisted_on_commit(tmp_path: Path) -> None:
+    path = str(tmp_path / "follow.sqlite")
+    watermark = Watermark(path)
+    assert watermark.video_id is None
+    watermark.advance(VideoId("1241"))
+    watermark.advance(VideoId("1231"))
+    watermark.close()
+    assert Watermark(path).video_id is None
+
+    watermark = Watermark(path)
+    watermark.advance(VideoId("1241"))
+    watermark.commit()
+    watermark.close()
+    assert Watermark(path).video_id == VideoId("1241")
+
+
+def test_follower_polls_adaptively(video_api: Callable) -> None:
+    published = {101, 103}
+    follow = follower(video_api, published, lookahead=10, min_interval=1, max_interval=4)
+    clock = [0.0]
+
+    async def run():
+        assert ids(await follow.poll()) == {101, 103}
+        assert follow.frontier == 103
+        assert follow.interval == 1
+        assert set(follow.recheck) == {102}
+
+        # Nothing new: back off up to max_interval
+        assert await follow.poll() == []
+        assert follow.interval == 2
+        assert await follow.poll() == []
+        assert await follow.poll() == []
+        assert follow.interval == 4
+
+        # Late publication of a skipped id, and new videos up to the end of the window
+        published.update({102, 104, 112, 113})
+        clock[0] += 1
+        assert ids(await follow.poll()) == {102, 104, 112, 113}
+        assert follow.frontier == 113
+        assert follow.interval == 0
+        assert not follow.recheck.keys() & {102, 104}
+
+    with patch("crawler.follow.time.monotonic", lambda: clock[0]):
+        asyncio.run(run())
+
+
+def test_follower_backs_off_rechecks(video_api: Callable) -> None:
+    follow = follower(video_api, {101, 103}, lookahead=4, min_interval=1, grace=600)
+    requested: List[int] = []
+    fetch = follow.fetch
+
+    async def counted(value: int):
+        requested.append(value)
+        return await fetch(value)
+
+    follow.fetch = counted
+    clock = [0.0]
+
+    async def run():
+        for second in range(700):
+            clock[0] = float(second)
+            await follow.poll()
+
+    with patch("crawler.follow.time.monotonic", lambda: clock[0]):
+        asyncio.run(run())
+
+    # Probed at 1, 3, 7, 15... seconds after being skipped, not on every poll
+    assert requested.count(102) == 1 + 9
+    assert 102 not in follow.recheck
+
+
+def test_follow_keeps_watermark_below_failed_ids(video_api: Callable, tmp_path: Path) -> None:
+    published = {101, 102, 103}
+    limited = {102}
+    follow = follower(video_api, published, lookahead=4, min_interval=0)
+    fetch = follow.fetch
+
+    async def rate_limited(value: int):
+        if value in limited:
+            raise StopCrawlException("Too many requests.")
+        return await fetch(value)
+
+    follow.fetch = rate_limited
+    watermark = Watermark(str(tmp_path / "follow.sqlite"))
+
+    sink = ParquetPartsSink(str(tmp_path / "videos"))
+    asyncio.run(follow.follow(sink, watermark, commit_interval=0, max_polls=2))
+    assert follow.frontier == 103
+    # A restart from the watermark probes 102 again
+    assert watermark.video_id == VideoId.from_numerical(101)
+
+    limited.clear()
+    sink = ParquetPartsSink(str(tmp_path / "videos"))
+    asyncio.run(follow.follow(sink, watermark, commit_interval=0, max_polls=1))
+    assert watermark.video_id == VideoId.from_numerical(103)
+    table = pq.read_table(str(tmp_path / "videos"))
+    assert str(VideoId.from_numerical(102)) in table.column("id").to_pylist()
+
+
+def test_follow_commits_watermark_with_records(video_api: Callable, tmp_path: Path) -> None:
+    published = set(range(101, 131))
+    follow = follower(video_api, published, lookahead=10, min_interval=0)
+    watermark = Watermark(str(tmp_path / "follow.sqlite"))
+    sink = ParquetPartsSink(str(tmp_path / "videos"))
+
+    asyncio.run(follow.follow(sink, watermark, commit_interval=0, max_polls=5))
+
+    assert watermark.video_id == VideoId.from_numerical(130)
+    table = pq.read_table(str(tmp_path / "videos"))
+    assert sorted(table.column("id").to_pylist()) == [
+        str(VideoId.from_numerical(value)) for value in range(101, 131)
+    ]
@@ -0,0 +1,88 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Set
+
+import pytest
+
+RESOURCES = Path(__file__).parent / "resources"
+SRC = Path(__file__).parents[1] / "src"
+
+# Milliseconds `import crawler.cli` may take: about 3 times its import time on a slow machine,
+# that importing pandas (over 700ms there) or pyarrow at start-up again still exceeds
+IMPORT_BUDGET_MS = float(os.environ.get("CRAWLER_IMPORT_BUDGET_MS", 800))
+
+# Modules a command only pays for when it uses them
+HEAVY = ["pyarrow", "pandas", "numpy", "pymongo", "httpcore", "trio", "rich.progress"]
+
+# Runs the cli with the api answered from the fixtures, printing the heavy modules imported
+SCRIPT = """
+import json, sys
+import httpx
+from crawler.transport import HostPools
+
+video = json.load(open({crawl!r}))["video"]
+mock = httpx.MockTransport(lambda request: httpx.Response(200, json={{"video": video}}))
+HostPools.pool = lambda self, url: mock
+from crawler.cli import app
+if sys.argv[1:]:
+    app(sys.argv[1:], standalone_mode=False)
+print(json.dumps([name for name in {heavy!r} if name in sys.modules]))
+"""
+
+
+def environment() -> Dict[str, str]:
+    """Environment of a subprocess importing the crawler sources"""
+    paths = [str(SRC), os.environ.get("PYTHONPATH", "")]
+    return {**os.environ, "PYTHONPATH": os.pathsep.join(paths)}
+
+
+def imported(*args: str) -> Set[str]:
+    script = SCRIPT.format(crawl=str(RESOURCES / "payload_crawl.json"), heavy=HEAVY)
+    process = subprocess.run(
+        [sys.executable, "-c", script, *args], capture_output=True, text=True, env=environment()
+    )
+    assert process.returncode == 0, process.stderr
+    return set(json.loads(process.stdout.splitlines()[-1]))
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        [],
+        ["--help"],
+        ["get", "103576261"],
+        ["crawl", "-o", "103576261", "-n", "2", "--no-progress"],
+    ],
+)
+def test_light_commands_skip_heavy_imports(args: List[str]) -> None:
+    loaded = imported(*args)
+    assert not loaded - {"httpcore"}, f"{args} imported {loaded}"
+    if not args or args == ["--help"]:
+        assert "httpcore" not in loaded
+
+
+def test_parquet_output_imports_pyarrow(tmp_path: Path) -> None:
+    path = tmp_path / "videos.parquet"
+    loaded = imported("crawl", "-o", "103576261", "-n", "2", "--no-progress", "--output", str(path))
+    assert "pyarrow" in loaded
+    assert path.exists()
+
+
+def test_cli_import_time_within_budget() -> None:
+    timings = []
+    for _ in range(3):
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import crawler.cli"],
+            capture_output=True,
+            text=True,
+            env=environment(),
+        )
+        assert process.returncode == 0, process.stderr
+        # "import time: self [us] | cumulative [us] | package", the cli line including every import
+        line = next(line for line in process.stderr.splitlines() if line.endswith("| crawler.cli"))
+        timings.append(int(line.split("|")[1]) / 1000)
+
+    assert min(timings) < IMPORT_BUDGET_MS, f"import crawler.cli took {min(timings):.0f}ms"
@@ -0,0 +1,120 @@
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from crawler.index import IdIndex, IndexCallback
+from crawler.responses import ResponseContext
+from crawler.videos import VideoId, VideoIdAscendingGenerator
+
+
+def context(video_id: VideoId, payload: dict) -> ResponseContext:
+    return ResponseContext(MagicMock(), payload=payload, params={"video_id": str(video_id)})
+
+
+def test_index_marks_fetched_and_missing_ids(tmp_path: Path) -> None:
+    with IdIndex(str(tmp_path / "ids.idx"), capacity=1024, block_size=64) as index:
+        fetched, missing = VideoId.from_numerical(10), VideoId.from_numerical(11)
+        index.mark_fetched(fetched)
+        index.mark_missing(missing)
+
+        assert index.is_fetched(fetched) and not index.is_missing(fetched)
+        assert index.is_missing(missing) and not index.is_fetched(missing)
+        assert not index.is_resolved(VideoId.from_numerical(12))
+
+        index.mark_fetched(missing)
+        assert index.is_fetched(missing) and not index.is_missing(missing)
+
+
+def test_index_rechecks_missing_ids_after_ttl(tmp_path: Path) -> None:
+    with IdIndex(str(tmp_path / "ids.idx"), capacity=1024, block_size=64) as index:
+        video_id = VideoId.from_numerical(10)
+        with patch("crawler.index.time.time", return_value=1_000):
+            index.mark_missing(video_id)
+        with patch("crawler.index.time.time", return_value=1_050):
+            assert index.is_resolved(video_id)
+            assert index.is_resolved(video_id, missing_ttl=60)
+            assert not index.is_resolved(video_id, missing_ttl=30)
+
+
+def test_index_grows_and_persists(tmp_path: Path) -> None:
+    path = str(tmp_path / "ids.idx")
+    with IdIndex(path, capacity=1024, block_size=64) as index:
+        index.mark_fetched(VideoId.from_numerical(3))
+        index.mark_missing(VideoId.from_numerical(5000))
+        assert index.capacity > 5000
+
+    with IdIndex(path) as index:
+        assert index.block_size == 64
+        assert index.is_fetched(VideoId.from_numerical(3))
+        assert index.is_missing(VideoId.from_numerical(5000))
+
+
+def test_filter_skips_resolved_ids(tmp_path: Path) -> None:
+    with IdIndex(str(tmp_path / "ids.idx"), capacity=1024, block_size=64) as index:
+        index.mark_fetched(VideoId.from_numerical(124))
+        index.mark_missing(VideoId.from_numerical(125))
+        on_skip = MagicMock()
+
+        generator = VideoIdAscendingGenerator(seed=VideoId.from_numerical(123), limit=4)
+        id_generator = index.filter(generator, on_skip=on_skip)
+
+        assert [video_id.numerical_value for video_id in id_generator] == [123, 126]
+        assert id_generator.skipped == 2
+        assert on_skip.call_count == 2
+
+
+def test_index_rechecks_every_missing_id_of_a_block(tmp_path: Path) -> None:
+    with IdIndex(str(tmp_path / "ids.idx"), capacity=1024, block_size=64) as index:
+        first, second = VideoId.from_numerical(10), VideoId.from_numerical(11)
+        with patch("crawler.index.time.time", return_value=1_000):
+            index.mark_missing(first)
+            index.mark_missing(second)
+        with patch("crawler.index.time.time", return_value=1_100):
+            assert not index.is_resolved(first, missing_ttl=60)
+            index.mark_missing(first)
+            # Re-probing one id does not refresh the others of its block
+            assert index.is_resolved(first, missing_ttl=60)
+            assert not index.is_resolved(second, missing_ttl=60)
+        with patch("crawler.index.time.time", return_value=1_120):
+            index.mark_missing(second)
+        with patch("crawler.index.time.time", return_value=1_150):
+            assert index.is_resolved(first, missing_ttl=60)
+            assert index.is_resolved(second, missing_ttl=60)
+        # The block is as old as the oldest probe of the round
+        with patch("crawler.index.time.time", return_value=1_165):
+            assert not index.is_resolved(first, missing_ttl=60)
+            assert not index.is_resolved(second, missing_ttl=60)
+
+
+def test_index_upgrades_version_1_files(tmp_path: Path) -> None:
+    path = tmp_path / "ids.idx"
+    with IdIndex(str(path), capacity=1024, block_size=64) as index:
+        index.mark_fetched(VideoId.from_numerical(3))
+        size = index._file_size(index.capacity)
+    # A version 1 file is the prefix of the bitmaps and block times of version 2
+    content = path.read_bytes()
+    path.write_bytes(IdIndex.MAGIC_V1 + content[8 : 64 + 1024 // 4 + 4 * (1024 // 64)])
+
+    with IdIndex(str(path)) as index:
+        assert index.is_fetched(VideoId.from_numerical(3))
+        index.mark_missing(VideoId.from_numerical(4))
+    assert path.stat().st_size == size
+
+
+def test_index_callback_commits_fetched_ids(tmp_path: Path) -> None:
+    with IdIndex(str(tmp_path / "ids.idx"), capacity=1024, block_size=64) as index:
+        callback = IndexCallback(index)
+        fetched, missing = VideoId.from_numerical(10), VideoId.from_numerical(11)
+        callback.on_response(context(fetched, {"video": {}}))
+        callback.on_response(context(missing, {"code": 2002}))
+        callback.on_response(context(VideoId.from_numerical(12), {"code": 1005}))
+
+        assert index.is_missing(missing)
+        callback.commit()
+        # Only the records accepted by the sink are indexed fetched
+        assert not index.is_fetched(fetched)
+
+        callback.mark_record({"id": str(fetched)})
+        assert not index.is_fetched(fetched)
+        callback.commit()
+        assert index.is_fetched(fetched)
+        assert not index.is_resolved(VideoId.from_numerical(12))
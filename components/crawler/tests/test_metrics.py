@@ -0,0 +1,126 @@
+import asyncio
+import io
+import json
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from crawler.core import AsyncCrawler
+from crawler.metrics import Histogram, Metrics, MetricsLog, MetricsServer, Throughput
+from crawler.retry import RetryPolicy
+from crawler.thumbnails import aThumbnailsContent
+from crawler.videos import VideoId, VideoIdAscendingGenerator
+
+
+def test_histogram() -> None:
+    histogram = Histogram((0.1, 1.0))
+    assert histogram.quantile(0.5) is None
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value)
+    assert histogram.cumulative() == [(0.1, 1), (1.0, 3), (float("inf"), 4)]
+    assert histogram.quantile(0.5) == 1.0
+    assert histogram.quantile(0.99) == float("inf")
+    assert histogram.sum == 4.25
+
+
+def test_throughput() -> None:
+    throughput = Throughput(window=10)
+    start = throughput.started_at
+    for second in range(20):
+        for _ in range(second):
+            throughput.add(now=start + second + 0.5)
+        if second == 2:
+            # Rate over the time since started, until it spans the window
+            assert throughput.rate(now=start + 2.5) == (0 + 1 + 2) / 2.5
+    assert throughput.rate(now=start + 19.5) == sum(range(10, 20)) / 10
+    assert throughput.rate(now=start + 100) == 0
+
+
+def test_async_crawler_metrics(crawl_payload: Dict, video_api: Callable) -> None:
+    requested: List[int] = []
+
+    def unavailable(request: httpx.Request, attempt: int) -> Optional[httpx.Response]:
+        # The first request fails once
+        return httpx.Response(503, text="unavailable") if len(requested) == 1 else None
+
+    metrics = Metrics()
+    crawler = AsyncCrawler(
+        max_concurrency=4, retry_policy=RetryPolicy(base_delay=0), metrics=metrics
+    )
+    crawler.aclient = httpx.AsyncClient(
+        base_url="https://api.xyz.com",
+        transport=httpx.MockTransport(
+            video_api(lambda value: value % 2 == 0, requested, respond=unavailable)
+        ),
+    )
+
+    records = asyncio.run(
+        crawler.crawl(VideoIdAscendingGenerator(seed=VideoId.from_numerical(0), limit=10))
+    )
+
+    snapshot = metrics.snapshot()
+    assert len(records) == 5
+    assert snapshot["requests"] == 11
+    assert snapshot["statuses"] == {"api:503": 1, "api:200": 10}
+    assert snapshot["codes"] == {"ok": 5, "2002": 5, "invalid": 1}
+    assert snapshot["in_flight"] == {"api": 0}
+    assert snapshot["retries"] == {"5xx": 1}
+    assert snapshot["latency"]["api"]["count"] == 11
+    assert snapshot["process"]["count"] == 5
+    assert snapshot["concurrency"] == {"api": {"limit": 4, "in_flight": 0}}
+    assert snapshot["bytes"]["api"] > 5 * len(json.dumps(crawl_payload["video"]["title"]))
+
+    text = metrics.prometheus()
+    assert 'crawler_requests_total{client="api",status="200"} 10' in text
+    assert 'crawler_api_codes_total{code="2002"} 5' in text
+    assert 'crawler_request_duration_seconds_bucket{client="api",le="+Inf"} 11' in text
+    assert "crawler_process_duration_seconds_count 5" in text
+    assert 'crawler_retries_total{reason="5xx"} 1' in text
+    assert "crawler_circuit_breakers_open 0" in text
+    assert 'crawler_concurrency_limit{client="api"} 4' in text
+    assert 'crawler_concurrency_in_flight{client="api"} 0' in text
+
+
+def test_thumbnails_metrics() -> None:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=b"x" * 100)
+
+    metrics = Metrics()
+    thumbnails = aThumbnailsContent(metrics=metrics, progress=False)
+    thumbnails.aclient = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    contents = thumbnails.download([f"https://cdn.xyz.com/{i}.jpg" for i in range(3)])
+
+    assert contents == [b"x" * 100] * 3
+    assert metrics.bytes["thumbnails"] == 300
+    assert metrics.statuses["thumbnails", 200] == 3
+    assert metrics.latency["thumbnails"].count == 3
+
+
+def test_metrics_server() -> None:
+    metrics = Metrics()
+    metrics.observe("api", 200, 0.02, 10)
+
+    with MetricsServer(metrics, port=0) as server:
+        response = httpx.get(f"http://127.0.0.1:{server.port}/metrics")
+        missing = httpx.get(f"http://127.0.0.1:{server.port}/")
+
+    assert response.status_code == 200
+    assert 'crawler_requests_total{client="api",status="200"} 1' in response.text
+    assert 'crawler_requests_per_second{client="api"} ' in response.text
+    assert missing.status_code == 404
+
+
+def test_metrics_log() -> None:
+    metrics = Metrics()
+    stream = io.StringIO()
+
+    with MetricsLog(metrics, stream, interval=0.02):
+        metrics.observe("api", 200, 0.02, 10)
+        time.sleep(0.05)
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(lines) >= 2
+    assert lines[-1]["requests"] == 1
+    assert sum(line["rps"] for line in lines) > 0
@@ -0,0 +1,87 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import httpx
+import pyarrow as pa
+import pytest
+
+from crawler.core import AsyncCrawler
+from crawler.pipeline import ENRICHED_SCHEMA, EnrichPipeline
+from crawler.thumbnails import Thumbnail, ThumbnailStore, aThumbnailsContent
+from crawler.videos import VideoId, VideoIdAscendingGenerator
+
+
+SHARED = "https://img.xyz.com/0.jpg"
+
+
+def image(url: str) -> bytes:
+    return f"image of {url}".encode()
+
+
+def build_pipeline(tmp_path: Path, video_api: Callable, events: List) -> EnrichPipeline:
+    def thumbs(video_id: str) -> Dict:
+        return {"thumbs": [{"src": f"https://img.xyz.com/{video_id}.jpg"}, {"src": SHARED}]}
+
+    handler = video_api(fields=thumbs)
+
+    async def api(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.01)
+        events.append(("video", time.perf_counter()))
+        return handler(request)
+
+    async def images(request: httpx.Request) -> httpx.Response:
+        events.append(("thumbnail", time.perf_counter()))
+        await asyncio.sleep(0.01)
+        return httpx.Response(200, content=image(str(request.url)))
+
+    crawler = AsyncCrawler(max_concurrency=2, typed=True)
+    crawler.aclient = httpx.AsyncClient(
+        base_url="https://api.xyz.com", params=crawler.params, transport=httpx.MockTransport(api)
+    )
+    thumbnails = aThumbnailsContent(max_concurrency=4)
+    thumbnails.aclient = httpx.AsyncClient(transport=httpx.MockTransport(images))
+    return EnrichPipeline(crawler, thumbnails, ThumbnailStore(str(tmp_path)), queue_size=2)
+
+
+def run(pipeline: EnrichPipeline, limit: int) -> List[Dict]:
+    async def collect() -> List[Dict]:
+        generator = VideoIdAscendingGenerator(seed=VideoId("1231"), limit=limit)
+        return [record async for record in pipeline.run(generator)]
+
+    return asyncio.run(collect())
+
+
+def test_pipeline_enriches_records(tmp_path: Path, video_api: Callable) -> None:
+    records = run(build_pipeline(tmp_path, video_api, []), limit=10)
+
+    assert len(records) == 10
+    for record in records:
+        contents = [image(url) for url in record["thumbs"]]
+        assert record["thumbs_hash"] == [Thumbnail(content).hash for content in contents]
+        assert record["thumbs_base64"] == [Thumbnail(content).base64 for content in contents]
+    pa.RecordBatch.from_pylist(records, schema=ENRICHED_SCHEMA)
+
+
+def test_pipeline_overlaps_stages(tmp_path: Path, video_api: Callable) -> None:
+    events: List = []
+    run(build_pipeline(tmp_path, video_api, events), limit=20)
+
+    last_video = max(at for kind, at in events if kind == "video")
+    first_thumbnail = min(at for kind, at in events if kind == "thumbnail")
+    assert first_thumbnail < last_video
+    # The shared thumbnail is downloaded once
+    assert sum(kind == "thumbnail" for kind, _ in events) <= 20 + 4
+
+
+def test_pipeline_raises_crawl_errors(tmp_path: Path, video_api: Callable) -> None:
+    pipeline = build_pipeline(tmp_path, video_api, [])
+
+    async def fail(id_generator):
+        raise RuntimeError("crawl failed")
+        yield
+
+    pipeline.crawler.iter_crawl = fail
+    with pytest.raises(RuntimeError, match="crawl failed"):
+        run(pipeline, limit=1)
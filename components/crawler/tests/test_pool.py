@@ -0,0 +1,115 @@
+import asyncio
+import itertools
+import json
+from typing import Dict
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from crawler.core import AsyncCrawler
+from crawler.pool import WorkerPool
+from crawler.videos import VideoId, VideoIdAscendingGenerator, VideoIdSparseGenerator
+
+
+async def double(value: int) -> int:
+    await asyncio.sleep(0)
+    return 2 * value
+
+
+def test_worker_pool_maps_all_items():
+    async def run():
+        return [result async for _, result in WorkerPool(n_workers=3).imap(double, range(10))]
+
+    assert sorted(asyncio.run(run())) == [2 * value for value in range(10)]
+
+
+def test_worker_pool_ordered_mode_preserves_order():
+    async def slow_first(value: int) -> int:
+        await asyncio.sleep(0.01 / (value + 1))
+        return value
+
+    async def run():
+        pool = WorkerPool(n_workers=4)
+        return [result async for _, result in pool.imap(slow_first, range(20), ordered=True)]
+
+    assert asyncio.run(run()) == list(range(20))
+
+
+def test_worker_pool_pulls_items_lazily():
+    pulled = []
+
+    def items():
+        for value in itertools.count():
+            pulled.append(value)
+            yield value
+
+    async def run():
+        pool = WorkerPool(n_workers=2, queue_size=2)
+        results = pool.imap(double, items())
+        async for _ in results:
+            break
+        await results.aclose()
+
+    asyncio.run(run())
+    assert len(pulled) <= 2 + 2 * 2 + 1
+
+
+def test_worker_pool_propagates_errors():
+    async def fail(value: int) -> int:
+        raise ValueError(value)
+
+    async def run():
+        return [result async for _, result in WorkerPool(n_workers=2).imap(fail, range(3))]
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+
+
+@patch("crawler.core.AsyncClient")
+def test_iter_crawl_streams_unbounded_generator(
+    client_mock: MagicMock, crawl_payload: Dict[str, Dict]
+) -> None:
+    async def get(*args, **kwargs):
+        response = MagicMock()
+        response.content = json.dumps(crawl_payload).encode()
+        return response
+
+    client_mock.return_value.get = get
+
+    async def run():
+        crawler = AsyncCrawler(max_concurrency=4)
+        records = crawler.iter_crawl(VideoIdAscendingGenerator(seed=VideoId("1231"), limit=None))
+        first = await anext(records)
+        await records.aclose()
+        return first
+
+    assert asyncio.run(run())["id"] == crawl_payload["video"]["video_id"]
+
+
+@patch("crawler.core.AsyncClient")
+def test_iter_crawl_feeds_back_sparse_generator(
+    client_mock: MagicMock, crawl_payload: Dict[str, Dict]
+) -> None:
+    exists = set(range(3000, 5000))
+    requested = []
+
+    async def get(*args, params, **kwargs):
+        value = VideoId(params["video_id"]).numerical_value
+        requested.append(value)
+        await asyncio.sleep(0)
+        response = MagicMock()
+        payload = crawl_payload if value in exists else {"code": 2002}
+        response.content = json.dumps(payload).encode()
+        return response
+
+    client_mock.return_value.get = get
+
+    async def run():
+        crawler = AsyncCrawler(max_concurrency=8)
+        id_generator = VideoIdSparseGenerator(seed=VideoId.from_numerical(0), limit=20_000)
+        return await crawler.crawl(id_generator)
+
+    records = asyncio.run(run())
+    assert len(records) == len(exists)
+    assert exists <= set(requested)
+    assert len(requested) == len(set(requested)) < 2_500
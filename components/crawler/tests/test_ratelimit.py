@@ -0,0 +1,108 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from crawler.callbacks.stopping import TooManyRequestStopper
+from crawler.core import Crawler
+from crawler.ratelimit import SQLiteTokenBucket, TokenBucket, parse_retry_after
+from crawler.retry import RetryPolicy
+from crawler.videos import VideoId, VideoIdAscendingGenerator
+
+
+def test_token_bucket_allows_bursts():
+    bucket = TokenBucket(rate=1, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() == pytest.approx(1, abs=0.01)
+
+
+def test_token_bucket_penalize_drains_bucket():
+    bucket = TokenBucket(rate=100, burst=10)
+    bucket.penalize(5)
+    assert bucket.take() == pytest.approx(5, abs=0.01)
+
+
+def test_sqlite_token_bucket_is_shared(tmp_path: Path):
+    path = str(tmp_path / "bucket.sqlite")
+    first = SQLiteTokenBucket(path, rate=1, burst=2)
+    second = SQLiteTokenBucket(path, rate=1, burst=2)
+    assert first.take() == 0
+    assert second.take() == 0
+    assert first.take() > 0
+    assert second.take() > 0
+
+
+def test_sqlite_token_bucket_acquires_off_the_event_loop(tmp_path: Path):
+    path = str(tmp_path / "bucket.sqlite")
+    bucket = SQLiteTokenBucket(path, rate=10)
+    # Another process holding the bucket for 0.3s
+    holder = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    holder.execute("BEGIN IMMEDIATE")
+    threading.Timer(0.3, lambda: holder.execute("COMMIT")).start()
+    ticks = []
+
+    async def tick() -> None:
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def acquire() -> float:
+        ticker = asyncio.create_task(tick())
+        start = time.monotonic()
+        await bucket.acquire()
+        ticker.cancel()
+        return time.monotonic() - start
+
+    assert asyncio.run(acquire()) > 0.25
+    assert len(ticks) > 10
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.1
+
+
+@pytest.mark.parametrize(
+    argnames=("value", "expected"),
+    argvalues=[
+        (None, None),
+        ("2", 2.0),
+        ("Wed, 21 Oct 2015 07:28:00 GMT", 0.0),
+        ("soon", None),
+    ],
+)
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+
+@patch("crawler.core.Client")
+def test_crawler_penalizes_on_too_many_requests(client_mock: MagicMock) -> None:
+    client = client_mock()
+    client.get.return_value.content = json.dumps({"code": 1005}).encode()
+    client.get.return_value.headers = {}
+    rate_limiter = MagicMock(TokenBucket)
+
+    crawler = Crawler(
+        callbacks=[TooManyRequestStopper()],
+        rate_limiter=rate_limiter,
+        retry_policy=RetryPolicy(max_attempts=1),
+    )
+    crawler.crawl(VideoIdAscendingGenerator(seed=VideoId("1231"), limit=2))
+
+    rate_limiter.wait.assert_called_once()
+    rate_limiter.penalize.assert_called_once_with(None)
+
+
+@patch("crawler.core.Client")
+def test_crawler_honors_retry_after(client_mock: MagicMock, crawl_payload: Dict[str, Dict]) -> None:
+    client = client_mock()
+    client.get.return_value.content = json.dumps(crawl_payload).encode()
+    client.get.return_value.headers = {"Retry-After": "3"}
+    rate_limiter = MagicMock(TokenBucket)
+
+    crawler = Crawler(rate_limiter=rate_limiter)
+    crawler.crawl(VideoIdAscendingGenerator(seed=VideoId("1231"), limit=1))
+
+    rate_limiter.penalize.assert_called_once_with(3.0)
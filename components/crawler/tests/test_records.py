@@ -0,0 +1,70 @@
+import json
+import sys
+from typing import Dict
+from unittest.mock import patch
+
+import pyarrow.parquet as pq
+import pytest
+
+from crawler.core import BaseCrawler, Crawler
+from crawler.records import RECORD_SCHEMA, RecordValidationError, VideoRecord
+from crawler.sinks import ParquetSink
+from crawler.transforms import preprocess_search_tags
+from crawler.videos import VideoId, VideoIdAscendingGenerator
+
+
+def test_decode_crawl_payload(crawl_payload: Dict) -> None:
+    record = VideoRecord.decode(crawl_payload["video"])
+    assert record.id == "103576261"
+    assert record.published_on == "2024-01-01"
+    assert record.published_at == "2024-01-01T12:00:00Z"
+    assert record.views == 8920
+    assert list(record.to_dict()) == RECORD_SCHEMA.names
+
+
+def test_decode_search_payload(search_payload: Dict) -> None:
+    video = search_payload["videos"][0]["video"]
+    record = BaseCrawler.decode(video, BaseCrawler.SEARCH_RESOURCE)
+    assert record.to_dict() == BaseCrawler.process(video, BaseCrawler.SEARCH_RESOURCE)
+    assert record.tags == preprocess_search_tags(video["tags"])
+
+
+@pytest.mark.parametrize(
+    "field, value",
+    [("views", "many"), ("publish_date", "yesterday"), ("thumbs", [{}]), ("rating", None)],
+)
+def test_decode_names_invalid_field(crawl_payload: Dict, field: str, value) -> None:
+    with pytest.raises(RecordValidationError, match=repr(field)) as error:
+        VideoRecord.decode({**crawl_payload["video"], field: value})
+    assert error.value.source == field
+    assert error.value.value == value
+
+
+def test_decode_names_missing_field(crawl_payload: Dict) -> None:
+    video = dict(crawl_payload["video"])
+    del video["url"]
+    with pytest.raises(RecordValidationError, match="'url'"):
+        VideoRecord.decode(video)
+
+
+def test_records_are_lighter_than_dicts(crawl_payload: Dict) -> None:
+    record = VideoRecord.decode(crawl_payload["video"])
+    assert not hasattr(record, "__dict__")
+    assert sys.getsizeof(record) * 3 < sys.getsizeof(record.to_dict())
+
+
+def test_parquet_sink_writes_records(tmp_path, crawl_payload: Dict) -> None:
+    record = VideoRecord.decode(crawl_payload["video"])
+    with ParquetSink(str(tmp_path / "videos.parquet")) as sink:
+        sink.write(record)
+    table = pq.read_table(tmp_path / "videos.parquet")
+    assert table.schema == RECORD_SCHEMA
+    assert table.to_pylist() == [record.to_dict()]
+
+
+@patch("crawler.core.Client")
+def test_typed_crawler_yields_records(client, crawl_payload: Dict) -> None:
+    client.return_value.get.return_value.content = json.dumps(crawl_payload).encode()
+    crawler = Crawler(typed=True)
+    records = crawler.crawl(VideoIdAscendingGenerator(seed=VideoId("1231"), limit=2))
+    assert [type(record) for record in records] == [VideoRecord, VideoRecord]
@@ -0,0 +1,206 @@
+import asyncio
+import time
+from typing import Callable, List, Optional
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from crawler.callbacks.stopping import TooManyRequestStopper
+from crawler.core import AsyncCrawler, Crawler
+from crawler.responses import ResponseContext
+from crawler.retry import CircuitBreaker, RetriesExhausted, RetryBudget, RetryPolicy, classify
+from crawler.videos import VideoId, VideoIdAscendingGenerator
+
+
+def flaky(failures: List[Optional[httpx.Response]]):
+    """Answers `failures` in turn to every video before the api, None failing to connect"""
+
+    def respond(request: httpx.Request, attempt: int) -> Optional[httpx.Response]:
+        if attempt >= len(failures):
+            return None
+        if failures[attempt] is None:
+            raise httpx.ConnectError("connection refused", request=request)
+        return failures[attempt]
+
+    return respond
+
+
+def sync_crawler(handler, **kwargs) -> Crawler:
+    crawler = Crawler(**kwargs)
+    crawler.client = httpx.Client(
+        base_url="https://api.xyz.com", transport=httpx.MockTransport(handler)
+    )
+    return crawler
+
+
+@pytest.mark.parametrize(
+    argnames=("context", "error", "expected"),
+    argvalues=[
+        (None, httpx.ConnectTimeout("timed out"), "transport"),
+        (None, KeyError("video"), None),
+        (ResponseContext(httpx.Response(503, text="unavailable")), None, "5xx"),
+        (ResponseContext(httpx.Response(429, json={})), None, "429"),
+        (ResponseContext(httpx.Response(200, text="<html>")), None, "decode"),
+        (ResponseContext(httpx.Response(200, json={"code": 1005})), None, "1005"),
+        (ResponseContext(httpx.Response(200, json={"code": 2002})), None, None),
+        (ResponseContext(httpx.Response(200, json={"video": {}})), None, None),
+    ],
+)
+def test_classify(context, error, expected):
+    assert classify(context, error) == expected
+
+
+def test_retry_budget_is_a_ratio_of_requests() -> None:
+    budget = RetryBudget(ratio=0.5, reserve=1)
+    assert budget.withdraw()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+
+
+def test_circuit_breaker_opens_probes_and_closes() -> None:
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    breaker.record(healthy=False)
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record(healthy=False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert 0 < breaker.delay() <= 0.05
+
+    time.sleep(0.05)
+    assert breaker.delay() == 0
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Other requests wait for the probe
+    assert breaker.delay() > 0
+    breaker.record(healthy=False)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.timeout == 0.1
+
+    time.sleep(0.1)
+    assert breaker.delay() == 0
+    breaker.record(healthy=True)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.delay() == 0
+    assert breaker.n_opened == 2
+
+
+def test_crawler_retries_failed_requests(video_api: Callable) -> None:
+    requested: List[int] = []
+    failures = [None, httpx.Response(502, text="bad gateway"), httpx.Response(200, text="<")]
+    policy = RetryPolicy(base_delay=0)
+    handler = video_api(requested=requested, respond=flaky(failures))
+    crawler = sync_crawler(handler, retry_policy=policy)
+
+    records = crawler.crawl(VideoIdAscendingGenerator(seed=VideoId("1231"), limit=2))
+
+    assert len(records) == 2
+    assert len(requested) == 8
+    assert policy.stats()["retries"] == {"transport": 2, "5xx": 2, "decode": 2}
+    assert policy.stats()["breaker"] == CircuitBreaker.CLOSED
+
+
+def test_crawler_stops_after_max_attempts(video_api: Callable) -> None:
+    requested: List[int] = []
+    failures = [httpx.Response(500, text="error")] * 10
+    policy = RetryPolicy(max_attempts=3, base_delay=0)
+    handler = video_api(requested=requested, respond=flaky(failures))
+    crawler = sync_crawler(handler, retry_policy=policy)
+
+    records = crawler.crawl(VideoIdAscendingGenerator(seed=VideoId("1231"), limit=5))
+
+    assert records == []
+    assert len(requested) == 3
+    assert policy.exhausted == 1
+
+
+def test_retry_budget_bounds_retries_across_requests(video_api: Callable) -> None:
+    requested: List[int] = []
+    failures = [httpx.Response(503, text="unavailable")] * 10
+    policy = RetryPolicy(max_attempts=10, base_delay=0, budget=RetryBudget(reserve=2))
+    handler = video_api(requested=requested, respond=flaky(failures))
+    crawler = sync_crawler(handler, retry_policy=policy)
+
+    with pytest.raises(RetriesExhausted) as exc_info:
+        crawler.request("/", params={"video_id": "1231"})
+    assert exc_info.value.reason == "5xx"
+    assert "budget" in exc_info.value.msg
+    assert len(requested) == 3
+    assert policy.budget_denied == 1
+
+
+def test_crawler_honors_retry_after(video_api: Callable) -> None:
+    requested: List[int] = []
+    failures = [httpx.Response(429, headers={"Retry-After": "7"}, json={})]
+    policy = RetryPolicy()
+    handler = video_api(requested=requested, respond=flaky(failures))
+    crawler = sync_crawler(handler, retry_policy=policy)
+
+    with patch("crawler.retry.time.sleep") as sleep:
+        context = crawler.request("/", params={"video_id": "1231"})
+
+    sleep.assert_called_once_with(7.0)
+    assert context.payload["video"]["video_id"] == "1231"
+    assert policy.retries == {"429": 1}
+
+
+def test_rate_limited_responses_are_left_to_callbacks(video_api: Callable) -> None:
+    requested: List[int] = []
+    failures = [httpx.Response(200, json={"code": 1005})] * 10
+    policy = RetryPolicy(max_attempts=2, base_delay=0)
+    crawler = sync_crawler(
+        video_api(requested=requested, respond=flaky(failures)),
+        callbacks=[TooManyRequestStopper()],
+        retry_policy=policy,
+    )
+
+    records = crawler.crawl(VideoIdAscendingGenerator(seed=VideoId("1231"), limit=5))
+
+    assert records == []
+    assert len(requested) == 2
+    assert policy.retries == {"1005": 1}
+
+
+@pytest.mark.parametrize(
+    "response",
+    [httpx.Response(429, text="<html>Too Many Requests</html>"), httpx.Response(429, json={})],
+)
+def test_rate_limited_status_stops_after_max_attempts(
+    video_api: Callable, response: httpx.Response
+) -> None:
+    requested: List[int] = []
+    policy = RetryPolicy(max_attempts=1)
+    crawler = sync_crawler(
+        video_api(requested=requested, respond=flaky([response] * 10)),
+        callbacks=[TooManyRequestStopper()],
+        retry_policy=policy,
+    )
+
+    records = crawler.crawl(VideoIdAscendingGenerator(seed=VideoId("1231"), limit=5))
+
+    assert records == []
+    assert len(requested) == 1
+    assert policy.exhausted == 1
+
+
+def test_circuit_breaker_pauses_async_crawler(video_api: Callable) -> None:
+    requested: List[int] = []
+    failures = [None, None]
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05, max_reset_timeout=0.1)
+    policy = RetryPolicy(base_delay=0, budget=RetryBudget(reserve=20), breaker=breaker)
+    crawler = AsyncCrawler(max_concurrency=4, retry_policy=policy)
+    crawler.aclient = httpx.AsyncClient(
+        base_url="https://api.xyz.com",
+        transport=httpx.MockTransport(video_api(requested=requested, respond=flaky(failures))),
+    )
+
+    generator = VideoIdAscendingGenerator(seed=VideoId("1231"), limit=8)
+    start = time.perf_counter()
+    records = asyncio.run(crawler.crawl(generator))
+
+    assert len(records) == 8
+    assert breaker.n_opened >= 1
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert time.perf_counter() - start >= 0.05
+    assert policy.retries["transport"] == 16
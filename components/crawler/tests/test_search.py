@@ -0,0 +1,122 @@
+import asyncio
+from typing import Dict, List
+
+import httpx
+import pytest
+
+from crawler.callbacks.stopping import StopCrawlException
+from crawler.core import AsyncCrawler, Crawler
+from crawler.search import SearchPagination
+
+
+def page(search_payload: Dict, video_ids: List[int]) -> Dict:
+    video = search_payload["videos"][0]["video"]
+    return {"videos": [{"video": {**video, "video_id": str(i)}} for i in video_ids]}
+
+
+def test_pagination_stops_on_short_page(search_payload: Dict) -> None:
+    pagination = SearchPagination()
+    assert len(pagination.read(page(search_payload, [1, 2, 3]))) == 3
+    assert not pagination.done
+    # Video 3 shifted to the second page
+    assert len(pagination.read(page(search_payload, [3, 4, 5]))) == 2
+    assert pagination.duplicates == 1
+    assert not pagination.done
+    pagination.read(page(search_payload, [6]))
+    assert pagination.done
+
+
+def test_pagination_stops_on_empty_page() -> None:
+    pagination = SearchPagination()
+    assert pagination.read({"code": 2001, "message": "No videos found!"}) == []
+    assert pagination.done
+
+
+def test_pagination_raises_on_error_page(search_payload: Dict) -> None:
+    pagination = SearchPagination()
+    pagination.read(page(search_payload, [1, 2, 3]))
+    with pytest.raises(StopCrawlException) as exc_info:
+        pagination.read({"code": 1005, "message": "Too many requests."})
+    assert exc_info.value.msg == "Search page 2 failed: Too many requests. (1005)"
+    assert not pagination.done
+
+
+def api(search_payload: Dict, n_results: int, requested: List[int]):
+    """Search api of `n_results` videos, 4 per page"""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        number = int(request.url.params["page"])
+        requested.append(number)
+        video_ids = range(4 * (number - 1), min(4 * number, n_results))
+        return httpx.Response(200, json=page(search_payload, list(video_ids)))
+
+    return handler
+
+
+def test_crawler_search_stops_early(search_payload: Dict) -> None:
+    requested: List[int] = []
+    crawler = Crawler()
+    transport = httpx.MockTransport(api(search_payload, 14, requested))
+    crawler.client = httpx.Client(base_url="https://api.xyz.com", transport=transport)
+    records = crawler.search(n_pages=10_000)
+
+    assert [record["id"] for record in records] == [str(i) for i in range(14)]
+    assert requested == [1, 2, 3, 4]
+
+
+@pytest.mark.parametrize("n_results", [14, 16])
+def test_async_crawler_search_stops_early(search_payload: Dict, n_results: int) -> None:
+    requested: List[int] = []
+    handler = api(search_payload, n_results, requested)
+
+    async def slow(request: httpx.Request) -> httpx.Response:
+        # Later pages may complete first
+        await asyncio.sleep(0.001 * (int(request.url.params["page"]) % 3))
+        return handler(request)
+
+    crawler = AsyncCrawler()
+    crawler.aclient = httpx.AsyncClient(
+        base_url="https://api.xyz.com", transport=httpx.MockTransport(slow)
+    )
+
+    async def search() -> List[Dict]:
+        records = crawler.iter_search(n_pages=None, window=3)
+        return [record async for record in records]
+
+    records = asyncio.run(search())
+
+    assert [record["id"] for record in records] == [str(i) for i in range(n_results)]
+    assert len(requested) <= 5 + 3 + 2
+
+
+def test_crawlers_search_raises_on_error_page(search_payload: Dict) -> None:
+    requested: List[int] = []
+    handler = api(search_payload, 14, requested)
+
+    def failing(request: httpx.Request) -> httpx.Response:
+        if request.url.params["page"] == "2":
+            return httpx.Response(200, json={"code": 1003, "message": "Invalid page."})
+        return handler(request)
+
+    crawler = Crawler()
+    crawler.client = httpx.Client(
+        base_url="https://api.xyz.com", transport=httpx.MockTransport(failing)
+    )
+    records: List[Dict] = []
+    with pytest.raises(StopCrawlException):
+        records.extend(crawler.iter_search(n_pages=None))
+    assert requested == [1]
+
+    acrawler = AsyncCrawler()
+    acrawler.aclient = httpx.AsyncClient(
+        base_url="https://api.xyz.com", transport=httpx.MockTransport(failing)
+    )
+
+    async def search() -> None:
+        async for record in acrawler.iter_search(n_pages=None, window=2):
+            records.append(record)
+
+    with pytest.raises(StopCrawlException):
+        asyncio.run(search())
+    # Only the videos of the pages before the error
+    assert [record["id"] for record in records] == [str(i) for i in range(4)] * 2
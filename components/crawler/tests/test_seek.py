@@ -0,0 +1,97 @@
+from typing import Dict
+from unittest.mock import MagicMock
+
+import pendulum
+import pytest
+
+from crawler.callbacks.stopping import StopCrawlException
+from crawler.core import BaseCrawler
+from crawler.responses import ResponseContext
+from crawler.seek import PublicationDateSeeker
+from crawler.videos import VideoId, VideoIdDescendingGenerator
+
+ORIGIN = pendulum.datetime(2024, 1, 1)
+LATEST = 100_000
+
+
+def published_at(value: int) -> pendulum.DateTime:
+    return ORIGIN.add(minutes=value)
+
+
+def payload(params: Dict) -> Dict:
+    if params["data"] == BaseCrawler.SEARCH_RESOURCE:
+        return {"videos": [{"video": {"video_id": f"{value}1"}} for value in (LATEST - 3, LATEST)]}
+    value = VideoId(params["video_id"]).numerical_value
+    if value > LATEST or value % 10 in (3, 4, 5):
+        return {"code": 2002}
+    return {"video": {"publish_date": published_at(value).to_iso8601_string()}}
+
+
+@pytest.fixture
+def crawler() -> MagicMock:
+    crawler = MagicMock(params={})
+    crawler.SEARCH_RESOURCE = BaseCrawler.SEARCH_RESOURCE
+    crawler.VIDEO_BY_ID_RESOURCE = BaseCrawler.VIDEO_BY_ID_RESOURCE
+    crawler.request.side_effect = lambda _, params: ResponseContext(
+        MagicMock(), payload=payload(params), params=params
+    )
+    return crawler
+
+
+def test_seek_finds_window_in_few_probes(crawler: MagicMock) -> None:
+    seeker = PublicationDateSeeker(crawler)
+    start, stop = seeker.range(since=published_at(40_000), until=published_at(41_004))
+
+    assert (start, stop) == (40_000, 41_006)
+    assert seeker.probes < 100
+
+
+def test_seek_without_until_ends_after_latest(crawler: MagicMock) -> None:
+    seeker = PublicationDateSeeker(crawler)
+    assert seeker.range(since=published_at(LATEST - 100)) == (LATEST - 100, LATEST + 1)
+
+
+def test_seek_generator_follows_direction(crawler: MagicMock) -> None:
+    seeker = PublicationDateSeeker(crawler)
+    id_generator = seeker.generator(
+        since=published_at(500), until=published_at(510), ascending=False
+    )
+
+    assert isinstance(id_generator, VideoIdDescendingGenerator)
+    assert [video_id.numerical_value for video_id in id_generator] == list(range(509, 499, -1))
+
+
+def test_seek_raises_on_empty_window(crawler: MagicMock) -> None:
+    with pytest.raises(ValueError):
+        PublicationDateSeeker(crawler).generator(since=published_at(LATEST + 10))
+
+
+def test_seek_stops_on_too_many_requests(crawler: MagicMock) -> None:
+    crawler.request.side_effect = lambda _, params: ResponseContext(
+        MagicMock(), payload={"code": 1005}, params=params
+    )
+    with pytest.raises(StopCrawlException):
+        PublicationDateSeeker(crawler).range(since=ORIGIN)
+
+
+def test_seek_steps_over_hole_below_stop(crawler: MagicMock) -> None:
+    # No video published between 69_900 and 70_099, right below the stop of the window
+    hole = range(69_900, 70_100)
+    crawler.request.side_effect = lambda _, params: ResponseContext(
+        MagicMock(),
+        payload=(
+            {"code": 2002}
+            if params.get("video_id") and VideoId(params["video_id"]).numerical_value in hole
+            else payload(params)
+        ),
+        params=params,
+    )
+    seeker = PublicationDateSeeker(crawler)
+
+    window = seeker.range(since=published_at(40_000), until=published_at(70_000))
+    assert window == (40_000, 70_100)
+    # Binary search steps landing in the hole probe it densely, then at doubling distances
+    assert seeker.probes < 500
+
+    id_generator = seeker.generator(since=published_at(40_000), until=published_at(70_000))
+    assert id_generator.limit == 30_100
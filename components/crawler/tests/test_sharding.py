@@ -0,0 +1,134 @@
+import asyncio
+import json
+import multiprocessing
+from pathlib import Path
+from typing import Dict, List
+from unittest.mock import MagicMock, patch
+
+import pyarrow.parquet as pq
+import pytest
+
+from crawler.callbacks.stopping import StopCrawlException, TooManyRequestStopper
+from crawler.responses import ResponseContext
+from crawler.sharding import ShardedCrawl, SharedStop, merge_parquet, split_range
+from crawler.sinks import ParquetSink
+from crawler.videos import VideoId, VideoIdAscendingGenerator, VideoIdDescendingGenerator
+
+
+def values(generators) -> List[List[int]]:
+    return [[video_id.numerical_value for video_id in generator] for generator in generators]
+
+
+def test_split_range_in_contiguous_shards():
+    generator = VideoIdAscendingGenerator(seed=VideoId("1231"), limit=10)
+    assert values(split_range(generator, 3)) == [
+        [123, 124, 125, 126],
+        [127, 128, 129],
+        [130, 131, 132],
+    ]
+
+    generator = VideoIdDescendingGenerator(seed=VideoId("1231"), limit=5)
+    assert values(split_range(generator, 2)) == [[122, 121, 120], [119, 118]]
+
+
+def test_split_range_in_interleaved_shards():
+    generator = VideoIdAscendingGenerator(seed=VideoId("1231"), limit=5)
+    shards = split_range(generator, 2, interleaved=True)
+    assert [len(shard) for shard in shards] == [3, 2]
+    assert values(shards) == [[123, 125, 127], [124, 126]]
+
+
+def test_split_range_requires_bounded_range():
+    with pytest.raises(ValueError):
+        split_range(VideoIdAscendingGenerator(seed=VideoId("1231")), 2)
+
+
+def test_shared_stop_propagates_stops():
+    stop_event = multiprocessing.Event()
+    callback = SharedStop(TooManyRequestStopper(), stop_event)
+    assert not callback.ordered
+
+    callback.on_response(ResponseContext(MagicMock(), payload={"video": {}}))
+    with pytest.raises(StopCrawlException):
+        callback.on_response(ResponseContext(MagicMock(), payload={"code": 1005}))
+    assert stop_event.is_set()
+
+    other = SharedStop(TooManyRequestStopper(), stop_event)
+    with pytest.raises(StopCrawlException):
+        other.on_response(ResponseContext(MagicMock(), payload={"video": {}}))
+
+
+@patch("crawler.core.AsyncClient")
+def test_sharded_crawl_merges_shards(
+    client_mock: MagicMock, crawl_payload: Dict[str, Dict], tmp_path: Path
+) -> None:
+    async def get(*args, **kwargs):
+        response = MagicMock()
+        response.content = json.dumps(crawl_payload).encode()
+        return response
+
+    client_mock.return_value.get = get
+    output = tmp_path / "videos.parquet"
+    generator = VideoIdAscendingGenerator(seed=VideoId("1231"), limit=20)
+    crawl = ShardedCrawl(
+        split_range(generator, 3),
+        str(output),
+        context=multiprocessing.get_context("fork"),
+        max_concurrency=2,
+    )
+
+    assert crawl.run(poll_interval=0.01) == 20
+    assert pq.read_table(output).num_rows == 20
+    assert sum(crawl.counters) == 20
+    assert list(tmp_path.iterdir()) == [output]
+
+
+@patch("crawler.core.AsyncClient")
+def test_sharded_crawl_propagates_rate_limit_stop(
+    client_mock: MagicMock, crawl_payload: Dict[str, Dict], tmp_path: Path
+) -> None:
+    async def get(*args, params, **kwargs):
+        await asyncio.sleep(0.005)
+        response = MagicMock()
+        limited = VideoId(params["video_id"]).numerical_value >= 1000
+        response.content = json.dumps({"code": 1005} if limited else crawl_payload).encode()
+        return response
+
+    client_mock.return_value.get = get
+    generator = VideoIdAscendingGenerator(seed=VideoId.from_numerical(0), limit=2000)
+    crawl = ShardedCrawl(
+        split_range(generator, 2),
+        str(tmp_path / "videos.parquet"),
+        callbacks=[TooManyRequestStopper()],
+        context=multiprocessing.get_context("fork"),
+        max_concurrency=1,
+        max_attempts=1,
+    )
+
+    # The first shard would crawl its 1000 ids alone if the stop was not propagated
+    assert crawl.run(poll_interval=0.01) < 1000
+    assert crawl.stop_event.is_set()
+
+
+@patch("crawler.sharding.Progress")
+def test_sharded_crawl_progress_completes(progress_mock: MagicMock, tmp_path: Path) -> None:
+    generator = VideoIdAscendingGenerator(seed=VideoId("1231"), limit=20)
+    assert ShardedCrawl(split_range(generator, 2), str(tmp_path / "videos.parquet")).total == 20
+    # Sparse shards skip most of their range
+    sparse = ShardedCrawl(split_range(generator, 2, sparse=True), str(tmp_path / "videos.parquet"))
+    assert sparse.total is None
+
+    crawl = ShardedCrawl(split_range(generator, 2), str(tmp_path / "videos.parquet"))
+    crawl.counters[0], crawl.counters[1] = 4, 3
+    crawl.monitor([MagicMock(exitcode=0, **{"is_alive.return_value": False})], 0)
+    # Stopped early, after 7 of the 20 ids
+    task = progress_mock.return_value.add_task.return_value
+    progress_mock.return_value.update.assert_called_with(task, total=7, completed=7)
+
+
+def test_merge_skips_missing_shards(tmp_path: Path) -> None:
+    with ParquetSink(str(tmp_path / "a.parquet")):
+        pass
+    output = str(tmp_path / "merged.parquet")
+    assert merge_parquet([str(tmp_path / "a.parquet"), str(tmp_path / "b.parquet")], output) == 0
+    assert pq.read_table(output).num_rows == 0
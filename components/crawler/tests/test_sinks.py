@@ -0,0 +1,216 @@
+import asyncio
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+from unittest.mock import Mock
+
+import pyarrow.parquet as pq
+import pytest
+
+from crawler.callbacks.stopping import StopCrawlException
+from crawler.sinks import RECORD_SCHEMA, MongoSink, ParquetPartsSink, ParquetSink
+
+
+@pytest.fixture
+def record() -> Dict:
+    return {
+        "id": "103576261",
+        "published_on": "2024-01-01",
+        "published_at": "2024-01-01T12:00:00Z",
+        "title": "xyz",
+        "duration": "5:22",
+        "views": 8920,
+        "rating": 86.6667,
+        "ratings": 15,
+        "thumbs": ["https://xyz.com/1.jpg"],
+        "tags": ["xyz", "xy-z"],
+        "url": "https://www.xyz.com/103576261",
+    }
+
+
+def test_parquet_sink_flushes_row_groups(tmp_path: Path, record: Dict) -> None:
+    output = tmp_path / "videos.parquet"
+    with ParquetSink(str(output), row_group_size=2) as sink:
+        for _ in range(5):
+            sink.write(record)
+
+    parquet_file = pq.ParquetFile(output)
+    assert parquet_file.schema_arrow == RECORD_SCHEMA
+    assert parquet_file.metadata.num_row_groups == 3
+    assert parquet_file.read().to_pylist() == [record] * 5
+
+
+def test_parquet_sink_flushes_on_interval(tmp_path: Path, record: Dict) -> None:
+    sink = ParquetSink(str(tmp_path / "videos.parquet"), flush_interval=0)
+    sink.write(record)
+    assert sink.buffer == []
+    sink.close()
+
+
+def test_parquet_sink_closes_on_stop(tmp_path: Path, record: Dict) -> None:
+    output = tmp_path / "videos.parquet"
+    with pytest.raises(StopCrawlException):
+        with ParquetSink(str(output)) as sink:
+            sink.write(record)
+            raise StopCrawlException("stop")
+
+    assert pq.read_table(output).num_rows == 1
+
+
+def test_parquet_parts_sink_commits_complete_parts(tmp_path: Path, record: Dict) -> None:
+    on_commit = Mock()
+    sink = ParquetPartsSink(str(tmp_path), rows_per_file=2)
+    sink.on_commit.append(on_commit)
+    for _ in range(3):
+        sink.write(record)
+
+    assert sorted(path.name for path in tmp_path.glob("part-*")) == ["part-00000.parquet"]
+    assert on_commit.call_count == 1
+
+    sink.close()
+    assert on_commit.call_count == 2
+    assert pq.read_table(tmp_path).num_rows == 3
+    assert ParquetPartsSink(str(tmp_path)).n_parts == 2
+
+
+class SlowCollection:
+    """Collection acknowledging a `bulk_write` after `latency` seconds, failing the `fail` first"""
+
+    def __init__(self, latency: float, fail: int = 0) -> None:
+        self.latency = latency
+        self.fail = fail
+        self.documents: Dict[str, Dict] = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def bulk_write(self, operations: List, ordered: bool = True) -> None:
+        assert not ordered
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
+            failed, self.fail = self.fail > 0, self.fail - 1
+        if failed:
+            raise RuntimeError("write failed")
+        self.documents.update((document["id"], document) for document in operations)
+
+
+class DocumentSink(MongoSink):
+    def operation(self, record: Dict) -> Dict:
+        return record
+
+
+def test_mongo_sink_bounds_batches_in_flight(record: Dict) -> None:
+    collection = SlowCollection(latency=0.02)
+    on_commit = Mock()
+    sink = DocumentSink(collection, batch_size=2, max_in_flight=2, commit_every=6)
+    sink.on_commit.append(on_commit)
+
+    with sink:
+        for i in range(11):
+            sink.write({**record, "id": str(i)})
+        assert collection.max_in_flight == 2
+        assert sink.waited > 0
+        # Every 6 records sent, once they are acknowledged
+        assert on_commit.call_count == 1
+        assert sink.written >= 6
+
+    assert on_commit.call_count == 2
+    assert sink.written == 11
+    assert sink.batches == 6
+    assert sorted(collection.documents, key=int) == [str(i) for i in range(11)]
+
+
+def test_mongo_sink_raises_failed_batch(record: Dict) -> None:
+    sink = DocumentSink(SlowCollection(latency=0, fail=1), batch_size=1)
+    sink.write(record)
+    with pytest.raises(RuntimeError, match="write failed"):
+        sink.close()
+
+
+def test_mongo_sink_never_commits_after_a_failed_batch(record: Dict) -> None:
+    collection = SlowCollection(latency=0.01, fail=1)
+    on_commit = Mock()
+    sink = DocumentSink(collection, batch_size=2, commit_every=None)
+    sink.on_commit.append(on_commit)
+
+    with pytest.raises(RuntimeError, match="write failed"):
+        with sink:
+            for i in range(4):
+                sink.write({**record, "id": str(i)})
+    with pytest.raises(RuntimeError, match="write failed"):
+        sink.commit()
+
+    # Ids 0 and 1 are lost: their records must not be reported durable
+    assert sorted(collection.documents) == ["2", "3"]
+    on_commit.assert_not_called()
+
+
+def test_mongo_sink_commits_once(record: Dict) -> None:
+    on_commit = Mock()
+    sink = DocumentSink(SlowCollection(latency=0), batch_size=10, commit_every=2)
+    sink.on_commit.append(on_commit)
+
+    for i in range(3):
+        sink.write({**record, "id": str(i)})
+    # Sending the buffer reaches commit_every, without committing a second time
+    sink.commit()
+    assert on_commit.call_count == 1
+    asyncio.run(sink.awrite({**record, "id": "3"}))
+    asyncio.run(sink.aclose())
+    assert on_commit.call_count == 2
+
+
+def test_mongo_sink_awaits_batches_off_the_event_loop(record: Dict) -> None:
+    collection = SlowCollection(latency=0.1)
+    sink = DocumentSink(collection, batch_size=1, max_in_flight=1)
+    ticks = []
+
+    async def tick() -> None:
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def write() -> None:
+        ticker = asyncio.create_task(tick())
+        async with sink:
+            for i in range(5):
+                await sink.awrite({**record, "id": str(i)})
+        ticker.cancel()
+
+    asyncio.run(write())
+
+    assert sink.waited > 0.2
+    assert sorted(collection.documents, key=int) == [str(i) for i in range(5)]
+    # The loop kept running while the sink was saturated
+    assert len(ticks) > 20
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.08
+
+
+def test_mongo_sink_upserts_into_mongod(record: Dict) -> None:
+    pymongo = pytest.importorskip("pymongo")
+    uri = os.environ.get("MONGODB_URI", "mongodb://localhost:27017")
+    client = pymongo.MongoClient(uri, serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except pymongo.errors.PyMongoError:
+        pytest.skip(f"No mongod at {uri}")
+    collection = client["crawler_test"]["videos"]
+    collection.drop()
+
+    with MongoSink(collection, batch_size=3) as sink:
+        for i in range(5):
+            sink.write({**record, "id": str(i)})
+    # Crawled again: replaced, not duplicated
+    with MongoSink(collection, batch_size=3) as sink:
+        for i in range(5):
+            sink.write({**record, "id": str(i), "views": 10})
+
+    assert collection.count_documents({}) == 5
+    assert collection.find_one({"_id": "3"})["views"] == 10
+    client.drop_database("crawler_test")
@@ -0,0 +1,73 @@
+import asyncio
+import hashlib
+from contextlib import aclosing
+from pathlib import Path
+from typing import List
+
+import httpx
+
+from crawler.thumbnails import StoredThumbnail, Thumbnail, ThumbnailStore, aThumbnailsContent
+
+
+IMAGES = {
+    "https://xyz.com/1.jpg": b"\xff\xd8" + b"1" * 100_000,
+    "https://xyz.com/2.jpg": b"\xff\xd8" + b"2" * 10,
+    # Same image under another url
+    "https://cdn.xyz.com/1.jpg": b"\xff\xd8" + b"1" * 100_000,
+}
+
+
+def downloader(requests: List[str]) -> aThumbnailsContent:
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(str(request.url))
+        if str(request.url) not in IMAGES:
+            return httpx.Response(404)
+        return httpx.Response(200, content=IMAGES[str(request.url)])
+
+    thumbnails = aThumbnailsContent(max_concurrency=2)
+    thumbnails.aclient = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return thumbnails
+
+
+def test_save_thumbnails_by_content(tmp_path: Path) -> None:
+    requests: List[str] = []
+    store = ThumbnailStore(str(tmp_path))
+    urls = [*IMAGES, "https://xyz.com/404.jpg"]
+    saved = downloader(requests).save(urls, store)
+
+    assert sorted(saved) == sorted(
+        (url, hashlib.sha256(content).hexdigest(), len(content)) for url, content in IMAGES.items()
+    )
+    assert len(list((tmp_path / "objects").rglob("*"))) == 2 * 2
+    for url, content in IMAGES.items():
+        stored = store.lookup(url)
+        assert store.thumbnail(stored.hash).hash == Thumbnail(content).hash
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_save_skips_stored_urls(tmp_path: Path) -> None:
+    requests: List[str] = []
+    downloader(requests).save(IMAGES, ThumbnailStore(str(tmp_path)))
+    assert len(requests) == 3
+
+    saved = downloader(requests).save(IMAGES, ThumbnailStore(str(tmp_path)))
+    assert len(requests) == 3
+    assert len(saved) == 3
+
+
+def test_istore_pulls_urls_lazily(tmp_path: Path) -> None:
+    pulled = []
+
+    def urls():
+        for i in range(20):
+            pulled.append(i)
+            yield "https://xyz.com/2.jpg"
+
+    async def first() -> StoredThumbnail:
+        thumbnails = downloader([])
+        async with aclosing(thumbnails.istore(urls(), ThumbnailStore(str(tmp_path)))) as stored:
+            async for thumbnail in stored:
+                return thumbnail
+
+    assert asyncio.run(first()).size == len(IMAGES["https://xyz.com/2.jpg"])
+    assert len(pulled) < 20
@@ -1,3 +1,4 @@
+import json
 from typing import Dict
 from unittest.mock import MagicMock, patch
 
@@ -20,10 +21,10 @@ def test_preprocess_search_tags():
     assert actual == expected
 
 
-@patch("crawler.core.pendulum")
 @patch("crawler.core.Client")
-def test_selection_crawl_preprocess(client: MagicMock, pendulum: MagicMock) -> None:
+def test_selection_crawl_preprocess(client: MagicMock, crawl_payload: Dict[str, Dict]) -> None:
     crawl_preprocess = MagicMock()
+    client.return_value.get.return_value.content = json.dumps(crawl_payload).encode()
     search_preprocess = MagicMock()
     Crawler.TAGS_PROCESSORS = {
         Crawler.SEARCH_RESOURCE: search_preprocess,
@@ -35,14 +36,11 @@ def test_selection_crawl_preprocess(client: MagicMock, pendulum: MagicMock) -> N
     crawl_preprocess.assert_called_once()
 
 
-@patch("crawler.core.pendulum")
 @patch("crawler.core.Client")
-def test_selection_search_preprocess(
-    client: MagicMock, pendulum: MagicMock, search_payload: Dict[str, Dict]
-) -> None:
+def test_selection_search_preprocess(client: MagicMock, search_payload: Dict[str, Dict]) -> None:
     crawl_preprocess = MagicMock()
     search_preprocess = MagicMock()
-    client.return_value.get.return_value.json.return_value = search_payload
+    client.return_value.get.return_value.content = json.dumps(search_payload).encode()
     Crawler.TAGS_PROCESSORS = {
         Crawler.SEARCH_RESOURCE: search_preprocess,
         Crawler.VIDEO_BY_ID_RESOURCE: crawl_preprocess,
@@ -0,0 +1,114 @@
+import asyncio
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from crawler.core import AsyncCrawler, Crawler
+from crawler.metrics import Metrics
+from crawler.thumbnails import aThumbnailsContent
+from crawler.transport import Connections, DnsCache
+
+
+@pytest.fixture
+def server() -> Iterator[str]:
+    """Keep-alive HTTP server answering after 0.05 seconds"""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(handler) -> None:
+            time.sleep(0.05)
+            handler.send_response(200)
+            handler.send_header("Content-Length", "2")
+            handler.end_headers()
+            handler.wfile.write(b"ok")
+
+        def log_message(handler, *args) -> None:
+            pass
+
+    http_server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    http_server.daemon_threads = True
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{http_server.server_address[1]}"
+    http_server.shutdown()
+    http_server.server_close()
+
+
+def test_dns_cache_reuses_addresses() -> None:
+    lookups: List[str] = []
+
+    def getaddrinfo(host, port, **kwargs):
+        lookups.append(host)
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("10.0.0.1", port))]
+
+    dns = DnsCache(ttl=60)
+    with patch("socket.getaddrinfo", getaddrinfo):
+        assert dns.resolve("api.xyz.com", 443) == "10.0.0.1"
+        assert dns.resolve("api.xyz.com", 443) == "10.0.0.1"
+        dns.forget("api.xyz.com", 443)
+        dns.resolve("api.xyz.com", 443)
+        dns.ttl = 0
+        dns.forget("api.xyz.com", 443)
+        dns.resolve("api.xyz.com", 443)
+        dns.resolve("api.xyz.com", 443)
+    assert lookups == ["api.xyz.com"] * 4
+
+
+def test_client_reuses_connections(server: str) -> None:
+    metrics = Metrics()
+    client = Connections(metrics=metrics).client("api", base_url=server)
+
+    for _ in range(3):
+        assert client.get("/").text == "ok"
+
+    assert metrics.phases["api", "connect"].count == 1
+    assert metrics.phases["api", "pool_wait"].count == 3
+    assert metrics.phases["api", "server"].count == 3
+    assert metrics.phases["api", "server"].sum >= 3 * 0.05
+    text = metrics.prometheus()
+    assert 'crawler_request_phase_seconds_count{client="api",phase="pool_wait"} 3' in text
+    assert metrics.snapshot()["phases"]["api:connect"]["count"] == 1
+
+
+def test_pool_wait_is_measured_apart(server: str) -> None:
+    async def run(max_connections: int) -> Metrics:
+        metrics = Metrics()
+        connections = Connections(metrics=metrics)
+        async with connections.aclient("api", max_connections, base_url=server) as client:
+            # Warm up the event loop and the server
+            await client.get("/")
+            metrics.phases.clear()
+            await asyncio.gather(*(client.get("/") for _ in range(4)))
+        return metrics
+
+    queued = asyncio.run(run(max_connections=1))
+    pooled = asyncio.run(run(max_connections=4))
+
+    # 3 requests queued behind 1, 2 and 3 others of 0.05 seconds
+    assert queued.phases["api", "pool_wait"].sum >= 6 * 0.05
+    assert pooled.phases["api", "pool_wait"].sum < queued.phases["api", "pool_wait"].sum / 2
+    assert queued.phases["api", "server"].count == pooled.phases["api", "server"].count == 4
+
+
+def test_clients_pools_are_sized_by_host(server: str) -> None:
+    connections = Connections(max_connections=3, keepalive_expiry=60)
+    assert AsyncCrawler(max_concurrency=7, connections=connections).transport.limits == (
+        httpx.Limits(max_connections=7, max_keepalive_connections=7, keepalive_expiry=60)
+    )
+    assert Crawler(connections=connections).transport.limits.max_connections == 3
+
+    thumbnails = aThumbnailsContent(max_concurrency=5, connections=connections, progress=False)
+    port = server.rsplit(":", 1)[1]
+    contents = thumbnails.download([f"{server}/1.jpg", f"http://localhost:{port}/2.jpg"])
+
+    assert contents == [b"ok", b"ok"]
+    transport = thumbnails.aclient._transport
+    assert len(transport.apools) == 2
+    assert transport.limits.max_connections == 5
@@ -1,4 +1,12 @@
-from crawler.videos import VideoId, VideoIdAscendingGenerator, VideoIdDescendingGenerator
+import random
+from typing import List, Set
+
+from crawler.videos import (
+    VideoId,
+    VideoIdAscendingGenerator,
+    VideoIdDescendingGenerator,
+    VideoIdSparseGenerator,
+)
 
 
 def test_video_id_numerical_value():
@@ -41,3 +49,58 @@ def test_descending_video_id_gen():
     ]
     actual = [video_id for video_id in generator]
     assert actual == expected
+
+
+def crawl_sparse(generator: VideoIdSparseGenerator, exists: Set[int], lag: int = 0) -> List[int]:
+    """Walk `generator`, reporting each id `lag` ids late, until it stays exhausted"""
+    generated = []
+    while True:
+        in_flight: List[VideoId] = []
+        n_generated = len(generated)
+        for video_id in generator:
+            generated.append(video_id.numerical_value)
+            in_flight.append(video_id)
+            if len(in_flight) > lag:
+                reported = in_flight.pop(0)
+                generator.feedback(reported, found=reported.numerical_value in exists)
+        for reported in in_flight:
+            generator.feedback(reported, found=reported.numerical_value in exists)
+        if len(generated) == n_generated:
+            return generated
+
+
+def dense_region(start: int, stop: int, density: float = 0.7) -> Set[int]:
+    rng = random.Random(start)
+    return {value for value in range(start, stop) if rng.random() < density}
+
+
+def test_sparse_video_id_gen_strides_over_gaps():
+    exists = dense_region(1000, 1200) | dense_region(50_000, 52_000)
+    generator = VideoIdSparseGenerator(seed=VideoId.from_numerical(0), limit=60_000)
+    generated = crawl_sparse(generator, exists)
+
+    assert exists <= set(generated)
+    assert len(generated) == len(set(generated))
+    assert len(generated) < 3_000
+
+
+def test_sparse_video_id_gen_handles_late_feedback():
+    exists = dense_region(30_000, 40_000)
+    generator = VideoIdSparseGenerator(seed=VideoId.from_numerical(0), limit=60_000)
+    generated = crawl_sparse(generator, exists, lag=50)
+
+    assert exists <= set(generated)
+    assert len(generated) == len(set(generated))
+    assert len(generated) < 11_000
+
+
+def test_sparse_video_id_gen_descending():
+    exists = dense_region(300, 700)
+    generator = VideoIdSparseGenerator(
+        seed=VideoId.from_numerical(1000), ascending=False, limit=1000
+    )
+    generated = crawl_sparse(generator, exists)
+
+    assert generated[0] == 999
+    assert exists <= set(generated)
+    assert len(generated) < 600